@@ -1,3 +1,20 @@
-from .hap import Hap as Hap
-from .hap import Status as Status
-from .main import Hapless as Hapless
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .hap import Hap as Hap
+    from .hap import Status as Status
+    from .main import Hapless as Hapless
+
+
+def __getattr__(name: str):
+    # NOTE: defer imports, so `from hapless import config` does not pull
+    # in the whole package
+    if name in ("Hap", "Status"):
+        from . import hap
+
+        return getattr(hap, name)
+    if name == "Hapless":
+        from .main import Hapless
+
+        return Hapless
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
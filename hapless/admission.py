@@ -0,0 +1,149 @@
+import os
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional
+
+import psutil
+
+from hapless.procs import is_same_process, probe_processes
+from hapless.utils import file_lock, logger
+
+if TYPE_CHECKING:
+    from hapless.hap import RunOptions
+
+LOADAVG_PATH = "/proc/loadavg"
+MEMINFO_PATH = "/proc/meminfo"
+ADMISSION_RULES = ("when_load_below", "when_free_mem_above", "max_running_per_user")
+ADMISSION_LOCK_FILENAME = ".admission.lock"
+CHECK_INTERVAL = 1.0
+# NOTE: once a hap is held back, limits have to be cleared by this margin
+HYSTERESIS = 0.1
+
+
+def has_admission_rules(run_options: Optional["RunOptions"]) -> bool:
+    return any(rule in (run_options or {}) for rule in ADMISSION_RULES)
+
+
+def read_load() -> float:
+    """
+    One minute load average or the number of currently runnable tasks,
+    whichever is higher, so the haps started just now are counted right away.
+    """
+    try:
+        with open(LOADAVG_PATH, "rb") as f:
+            fields = f.read().split()
+    except FileNotFoundError:
+        return os.getloadavg()[0]
+    # NOTE: runnable tasks include the one reading the file
+    runnable = int(fields[3].split(b"/")[0]) - 1
+    return max(float(fields[0]), runnable)
+
+
+def read_available_memory() -> int:
+    """
+    Memory available for starting new processes without swapping, in bytes.
+    """
+    try:
+        with open(MEMINFO_PATH, "rb") as f:
+            for line in f:
+                if line.startswith(b"MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return psutil.virtual_memory().available
+
+
+def count_running_haps(hapless_dir: Path, uid: int) -> int:
+    """
+    Number of haps of the user which have been started, have not finished yet
+    and still have their process alive, so a hap whose wrapper has died does
+    not keep its slot forever.
+    """
+    started: Dict[int, float] = {}
+    with os.scandir(hapless_dir) as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            path = Path(entry.path)
+            try:
+                if entry.stat().st_uid != uid or (path / "rc").exists():
+                    continue
+                with open(path / "pid") as f:
+                    pid = int(f.read())
+                started[pid] = (path / "pid").stat().st_mtime
+            except (FileNotFoundError, ValueError):
+                continue
+    procs = probe_processes(started)
+    return sum(
+        1
+        for pid, proc in procs.items()
+        if is_same_process(proc.create_time, started[pid])
+    )
+
+
+class Admission:
+    """
+    Decides whether a hap is allowed to start given the state of the machine.
+    Once the hap has been held back it is only admitted with some margin
+    below the limits, so a machine sitting right at a limit does not let the
+    waiting haps in one by one as soon as it moves a bit.
+    """
+
+    def __init__(self, hapless_dir: Path, run_options: "RunOptions") -> None:
+        self.hapless_dir = hapless_dir
+        self.run_options = run_options
+        self.held = False
+
+    def check(self) -> Optional[str]:
+        """
+        Reason for the hap to wait or None if it is allowed to start.
+        """
+        margin = HYSTERESIS if self.held else 0.0
+        max_load = self.run_options.get("when_load_below")
+        if max_load is not None:
+            load = read_load()
+            if load >= max_load * (1 - margin):
+                return f"load {load:.2f} is not below {max_load:g}"
+
+        min_memory = self.run_options.get("when_free_mem_above")
+        if min_memory is not None:
+            memory = read_available_memory()
+            if memory <= min_memory * (1 + margin):
+                return f"free memory {memory} is not above {min_memory} bytes"
+
+        max_running = self.run_options.get("max_running_per_user")
+        if max_running is not None:
+            running = count_running_haps(self.hapless_dir, os.getuid())
+            if running >= max_running:
+                return f"{running} haps of the user are running already"
+        return None
+
+
+@contextmanager
+def admitted(
+    hapless_dir: Path,
+    run_options: "RunOptions",
+    on_hold: Optional[Callable[[str], None]] = None,
+    interval: float = CHECK_INTERVAL,
+) -> Iterator[None]:
+    """
+    Block until the hap passes admission and keep others from being admitted
+    until the block is over, so the hap started within it is taken into
+    account by the next check. `on_hold` is called on every failed check.
+    """
+    admission = Admission(hapless_dir, run_options)
+    lock_path = hapless_dir / ADMISSION_LOCK_FILENAME
+    while True:
+        with file_lock(lock_path):
+            reason = admission.check()
+            if reason is None:
+                yield
+                return
+        logger.debug(f"Hap is held back: {reason}")
+        admission.held = True
+        if on_hold is not None:
+            on_hold(reason)
+        # NOTE: spread the checks of many waiting haps over time
+        time.sleep(interval * random.uniform(0.5, 1.5))
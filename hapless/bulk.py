@@ -0,0 +1,92 @@
+import itertools
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, TextIO, TypedDict
+
+SPEC_KEYS = {"cmd", "name", "env", "workdir"}
+
+
+class _RequiredHapSpec(TypedDict):
+    cmd: str
+
+
+class HapSpec(_RequiredHapSpec, total=False):
+    """
+    Description of a hap to be created in bulk.
+    """
+
+    name: str
+    env: Dict[str, str]
+    workdir: str
+
+
+def parse_spec(line: str) -> HapSpec:
+    """
+    Parse either a plain command or a JSON object describing the hap.
+    Environment from the spec extends the current one.
+    """
+    if not line.startswith("{"):
+        return {"cmd": line}
+
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("spec should be a JSON object")
+    unknown = set(data) - SPEC_KEYS
+    if unknown:
+        raise ValueError(f"unknown keys {', '.join(sorted(unknown))}")
+    if not isinstance(data.get("cmd"), str) or not data["cmd"].strip():
+        raise ValueError("spec should contain a command to run")
+
+    spec: HapSpec = {"cmd": data["cmd"]}
+    if data.get("name") is not None:
+        spec["name"] = f"{data['name']}"
+    if data.get("workdir") is not None:
+        spec["workdir"] = f"{data['workdir']}"
+    if data.get("env") is not None:
+        if not isinstance(data["env"], dict):
+            raise ValueError("env should be a JSON object")
+        extra_env = {f"{key}": f"{value}" for key, value in data["env"].items()}
+        spec["env"] = {**os.environ, **extra_env}
+    return spec
+
+
+def read_specs(stream: TextIO) -> Iterator[HapSpec]:
+    """
+    Read specs line by line skipping empty lines and comments.
+    """
+    for lineno, raw_line in enumerate(stream, start=1):
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield parse_spec(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid spec on line {lineno}: {e}") from e
+
+
+def expand_matrix(
+    specs: Iterable[HapSpec],
+    matrix: Dict[str, List[str]],
+) -> Iterator[HapSpec]:
+    """
+    Produce a spec for every combination of the matrix values replacing
+    `{key}` placeholders within the command. Names get values as a suffix.
+    """
+    if not matrix:
+        yield from specs
+        return
+
+    keys = list(matrix)
+    pattern = re.compile(r"\{(" + "|".join(map(re.escape, keys)) + r")\}")
+    combinations = list(itertools.product(*(matrix[key] for key in keys)))
+    for spec in specs:
+        for values in combinations:
+            params = dict(zip(keys, values))
+            expanded = spec.copy()
+            expanded["cmd"] = pattern.sub(
+                lambda m, params=params: params[m.group(1)], spec["cmd"]
+            )
+            if "name" in spec:
+                expanded["name"] = "-".join([spec["name"], *values])
+            yield expanded
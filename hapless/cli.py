@@ -1,6 +1,8 @@
 import sys
+from fnmatch import fnmatch
+from pathlib import Path
 from shlex import join as shlex_join
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, TextIO, Tuple, cast
 
 import click
 
@@ -12,9 +14,24 @@ from hapless.cli_utils import (
     hap_argument_optional,
     hapless,
 )
-from hapless.formatters import JSONFormatter, TableFormatter
-from hapless.hap import Status
-from hapless.utils import isatty, logger, validate_signal
+from hapless.status import Status
+from hapless.utils import (
+    isatty,
+    logger,
+    validate_cpus,
+    validate_ionice,
+    validate_matrix,
+    validate_pattern,
+    validate_queue,
+    validate_signal,
+    validate_size,
+    validate_time,
+)
+
+if TYPE_CHECKING:
+    from hapless.bulk import HapSpec
+    from hapless.hap import RunOptions
+    from hapless.logfiles import LogOptions
 
 
 @click.group(invoke_without_command=True)
@@ -35,8 +52,32 @@ def cli(ctx, verbose: bool, json_output: bool):
 @click.option(
     "--json", "json_output", is_flag=True, default=False, help="Output in JSON format."
 )
-def status(hap_alias: Optional[str], verbose: bool, json_output: bool):
-    _status(hap_alias, verbose, json_output=json_output)
+@click.option(
+    "-w",
+    "--watch",
+    type=click.FloatRange(min=0.1),
+    is_flag=False,
+    flag_value=1.0,
+    metavar="[INTERVAL]",
+    help="Refresh the status in place every interval, 1 second by default.",
+)
+@click.option(
+    "-r",
+    "--resources",
+    is_flag=True,
+    default=False,
+    help="Show CPU and memory used by the whole process tree of running haps.",
+)
+def status(
+    hap_alias: Optional[str],
+    verbose: bool,
+    json_output: bool,
+    watch: Optional[float],
+    resources: bool,
+):
+    _status(
+        hap_alias, verbose, json_output=json_output, watch=watch, resources=resources
+    )
 
 
 @cli.command(short_help="Same as a status.")
@@ -45,17 +86,56 @@ def status(hap_alias: Optional[str], verbose: bool, json_output: bool):
 @click.option(
     "--json", "json_output", is_flag=True, default=False, help="Output in JSON format."
 )
-def show(hap_alias: Optional[str], verbose: bool, json_output: bool):
-    _status(hap_alias, verbose, json_output=json_output)
+@click.option(
+    "-w",
+    "--watch",
+    type=click.FloatRange(min=0.1),
+    is_flag=False,
+    flag_value=1.0,
+    metavar="[INTERVAL]",
+    help="Refresh the status in place every interval, 1 second by default.",
+)
+@click.option(
+    "-r",
+    "--resources",
+    is_flag=True,
+    default=False,
+    help="Show CPU and memory used by the whole process tree of running haps.",
+)
+def show(
+    hap_alias: Optional[str],
+    verbose: bool,
+    json_output: bool,
+    watch: Optional[float],
+    resources: bool,
+):
+    _status(
+        hap_alias, verbose, json_output=json_output, watch=watch, resources=resources
+    )
 
 
 def _status(
     hap_alias: Optional[str] = None,
     verbose: bool = False,
     json_output: bool = False,
+    watch: Optional[float] = None,
+    resources: bool = False,
 ):
-    formatter_cls = JSONFormatter if json_output else TableFormatter
-    formatter = formatter_cls(verbose=verbose)
+    from hapless.formatters import Formatter, JSONFormatter, TableFormatter
+
+    if resources and json_output:
+        raise click.UsageError("Cannot use --resources with --json")
+    if watch is not None:
+        if hap_alias is not None or json_output:
+            raise click.UsageError("Use --watch only to show the status of all haps")
+        return hapless.watch_stats(
+            TableFormatter(verbose=verbose, resources=resources), interval=watch
+        )
+
+    if json_output:
+        formatter: Formatter = JSONFormatter(verbose=verbose)
+    else:
+        formatter = TableFormatter(verbose=verbose, resources=resources)
     if hap_alias is not None:
         hap = get_or_exit(hap_alias)
         hapless.show(hap, formatter=formatter)
@@ -64,13 +144,292 @@ def _status(
         hapless.stats(haps, formatter=formatter)
 
 
-@cli.command(short_help="Output logs for a hap.")
+@cli.command(short_help="Show running haps using the most resources.")
+@click.option("-v", "--verbose", is_flag=True, default=False)
+@click.option(
+    "-s",
+    "--sort",
+    type=click.Choice(["cpu", "memory"]),
+    default="cpu",
+    show_default=True,
+    help="Order haps by CPU usage or by memory of their process trees.",
+)
+@click.option(
+    "-i",
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=2.0,
+    show_default=True,
+    help="Refresh the view every interval in seconds.",
+)
+def top(verbose: bool, sort: str, interval: float):
+    from hapless.formatters import TableFormatter
+
+    formatter = TableFormatter(verbose=verbose, resources=True, sort=sort)
+    hapless.watch_stats(formatter, interval=interval, active_only=True)
+
+
+@cli.command(short_help="Show resource usage sampled for a hap.")
+@hap_argument
+def stats(hap_alias: str):
+    hap = get_or_exit(hap_alias)
+    hapless.show_samples(hap)
+
+
+@cli.command("is-running", short_help="Check whether a hap is running.")
 @hap_argument
+def is_running(hap_alias: str):
+    """
+    Exit with zero code if the hap is running and with non-zero otherwise.
+    Prints nothing, so it is suitable for scripting.
+    """
+    hap = hapless.get_hap(hap_alias)
+    if hap is None or hap.status != Status.RUNNING:
+        sys.exit(1)
+
+
+@cli.command(short_help="Print number of haps.")
+@click.option(
+    "-s",
+    "--status",
+    "statuses",
+    multiple=True,
+    type=click.Choice([status.value for status in Status]),
+    help="Count only haps with the given status.",
+)
+def count(statuses: Tuple[str, ...]):
+    haps = hapless.get_haps(accessible_only=False)
+    if statuses:
+        from hapless.hap import load_snapshots
+
+        snapshots = load_snapshots(haps)
+        haps = [hap for hap, s in zip(haps, snapshots) if s.status.value in statuses]
+    click.echo(len(haps))
+
+
+@cli.command(short_help="Output logs for haps.")
+@click.argument("hap_aliases", metavar="hap", nargs=-1)
 @click.option("-f", "--follow", is_flag=True, default=False)
 @click.option("-e", "--stderr", is_flag=True, default=False)
-def logs(hap_alias: str, follow: bool, stderr: bool):
-    hap = get_or_exit(hap_alias)
-    hapless.logs(hap, stderr=stderr, follow=follow)
+@click.option(
+    "-a",
+    "--all",
+    "all_haps",
+    is_flag=True,
+    default=False,
+    help="Output logs for all haps, only active ones when following.",
+)
+@click.option(
+    "--name-glob",
+    metavar="PATTERN",
+    help="Output logs for haps with names matching the pattern, e.g. 'etl-*'.",
+)
+@click.option(
+    "--merge",
+    is_flag=True,
+    default=False,
+    help="Interleave stdout and stderr of the haps in the order it was captured.",
+)
+@click.option(
+    "-n",
+    "--lines",
+    type=click.IntRange(min=0),
+    help="Output only the last lines of the log.",
+)
+@click.option(
+    "-c",
+    "--bytes",
+    "nbytes",
+    type=click.IntRange(min=0),
+    help="Output only the last bytes of the log.",
+)
+@click.option(
+    "--offset",
+    type=click.IntRange(min=0),
+    help="Output the log starting from the byte offset.",
+)
+@click.option(
+    "--length",
+    type=click.IntRange(min=0),
+    help="Output at most this number of bytes.",
+)
+@click.option(
+    "--since",
+    callback=validate_time,
+    help="Output the log written after this time, e.g. 03:10 or 15m ago.",
+)
+@click.option(
+    "--until",
+    callback=validate_time,
+    help="Output the log written before this time.",
+)
+@click.option(
+    "--from-line",
+    type=click.IntRange(min=1),
+    help="Output the log starting from the line number.",
+)
+@click.option(
+    "--raw",
+    is_flag=True,
+    default=False,
+    help="Copy log bytes as is, default when output is not a terminal.",
+)
+def logs(
+    hap_aliases: Tuple[str, ...],
+    follow: bool,
+    stderr: bool,
+    all_haps: bool,
+    name_glob: Optional[str],
+    merge: bool,
+    lines: Optional[int],
+    nbytes: Optional[int],
+    offset: Optional[int],
+    length: Optional[int],
+    since: Optional[float],
+    until: Optional[float],
+    from_line: Optional[int],
+    raw: bool,
+):
+    if hap_aliases and all_haps:
+        raise click.BadOptionUsage(
+            "all_haps", "Cannot use --all flag while hap id provided"
+        )
+
+    if name_glob is not None and (hap_aliases or all_haps):
+        raise click.BadOptionUsage(
+            "name_glob", "Cannot use --name-glob with --all flag or hap id"
+        )
+
+    if not hap_aliases and not all_haps and name_glob is None:
+        raise click.BadArgumentUsage("Provide hap alias to show logs for")
+
+    ranges = {
+        "--lines": lines,
+        "--bytes": nbytes,
+        "--offset/--length": offset if length is None else length,
+        "--since/--until/--from-line": next(
+            (value for value in (since, until, from_line) if value is not None), None
+        ),
+    }
+    given = [option for option, value in ranges.items() if value is not None]
+    if len(given) > 1:
+        raise click.UsageError(f"Options {' and '.join(given)} are mutually exclusive")
+    if given and follow:
+        raise click.UsageError(f"Cannot use {given[0]} while following logs")
+    if merge and (given or follow):
+        option = given[0] if given else "--follow"
+        raise click.UsageError(f"Cannot use {option} with --merge")
+
+    options = {
+        key: value
+        for key, value in dict(
+            lines=lines,
+            nbytes=nbytes,
+            offset=offset,
+            length=length,
+            since=since,
+            until=until,
+            from_line=from_line,
+            raw=raw or None,
+        ).items()
+        if value is not None
+    }
+    if len(hap_aliases) == 1 and not merge:
+        hap = get_or_exit(hap_aliases[0])
+        return hapless.logs(hap, stderr=stderr, follow=follow, **options)
+
+    if all_haps or name_glob is not None:
+        haps = hapless.get_haps()
+        if name_glob is not None:
+            haps = [hap for hap in haps if fnmatch(hap.name, name_glob)]
+        if follow:
+            from hapless.hap import load_snapshots
+
+            snapshots = load_snapshots(haps)
+            haps = [hap for hap, s in zip(haps, snapshots) if s.active]
+    else:
+        haps = [get_or_exit(hap_alias) for hap_alias in hap_aliases]
+
+    if not haps:
+        console.error("No haps to show logs for")
+        sys.exit(1)
+
+    if follow:
+        hapless.follow_logs(haps, stderr=stderr)
+    elif merge:
+        hapless.merge_logs(haps, stderr=stderr)
+    else:
+        for hap in haps:
+            hapless.logs(hap, stderr=stderr, **options)
+
+
+@cli.command(short_help="Search logs of haps for a pattern.")
+@click.argument("pattern", callback=validate_pattern)
+@click.option(
+    "-s",
+    "--status",
+    "statuses",
+    multiple=True,
+    type=click.Choice([status.value for status in Status]),
+    help="Search only haps with the given status.",
+)
+@click.option(
+    "--name-glob",
+    metavar="PATTERN",
+    help="Search only haps with names matching the pattern, e.g. 'etl-*'.",
+)
+@click.option("-e", "--stderr", is_flag=True, default=False)
+@click.option("-i", "--ignore-case", is_flag=True, default=False)
+@click.option(
+    "-l",
+    "--files-with-matches",
+    is_flag=True,
+    default=False,
+    help="Print only ids of the haps with matching lines.",
+)
+@click.option(
+    "-c",
+    "--count",
+    "count_only",
+    is_flag=True,
+    default=False,
+    help="Print only number of matching lines for each hap.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Number of processes searching logs, number of CPUs by default.",
+)
+def grep(
+    pattern: str,
+    statuses: Tuple[str, ...],
+    name_glob: Optional[str],
+    stderr: bool,
+    ignore_case: bool,
+    files_with_matches: bool,
+    count_only: bool,
+    jobs: Optional[int],
+):
+    if files_with_matches and count_only:
+        raise click.UsageError("Options -l and -c are mutually exclusive")
+
+    haps = hapless.get_haps()
+    if name_glob is not None:
+        haps = [hap for hap in haps if fnmatch(hap.name, name_glob)]
+    if statuses:
+        from hapless.hap import load_snapshots
+
+        snapshots = load_snapshots(haps)
+        haps = [hap for hap, s in zip(haps, snapshots) if s.status.value in statuses]
+
+    mode = "files" if files_with_matches else "count" if count_only else "lines"
+    found = hapless.grep(
+        haps, pattern, stderr=stderr, ignore_case=ignore_case, mode=mode, jobs=jobs
+    )
+    # NOTE: same as grep, exit code is 1 when nothing matched
+    if not found:
+        sys.exit(1)
 
 
 @cli.command(short_help="Output error logs for a hap.")
@@ -124,8 +483,223 @@ def cleanall():
     default=False,
     help="Verify command launched does not fail immediately.",
 )
-def run(cmd: Tuple[str, ...], name: str, check: bool):
-    hap = hapless.get_hap(name)
+@click.option(
+    "--from-file",
+    type=click.File("r"),
+    help=(
+        "Run every command from the file (use - for stdin). Each line is either "
+        "a command or a JSON object with cmd, name, env and workdir keys."
+    ),
+)
+@click.option(
+    "--matrix",
+    multiple=True,
+    callback=validate_matrix,
+    metavar="KEY=V1,V2",
+    help="Run a hap for each value replacing {KEY} within the command.",
+)
+@click.option(
+    "--stagger",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    help="Delay in seconds between launches of multiple haps.",
+)
+@click.option(
+    "--max-in-flight",
+    type=click.IntRange(min=1),
+    help="Maximum number of haps from the batch running at the same time.",
+)
+@click.option(
+    "--log-mode",
+    type=click.Choice(list(config.LOG_MODES)),
+    default="file",
+    show_default=True,
+    help="Write output to files, a fixed-size ring buffer file or discard it.",
+)
+@click.option(
+    "--log-size",
+    callback=validate_size,
+    metavar="SIZE",
+    help="Size of the ring buffer file, 16M by default.",
+)
+@click.option(
+    "--log-max-size",
+    callback=validate_size,
+    metavar="SIZE",
+    help="Rotate log files once they grow over the size, e.g. 64M.",
+)
+@click.option(
+    "--log-keep",
+    type=click.IntRange(min=0),
+    help=(
+        f"Number of rotated log segments to keep, {config.LOG_DEFAULT_KEEP} by default."
+    ),
+)
+@click.option(
+    "--log-compress",
+    type=click.Choice(list(config.LOG_COMPRESS_SUFFIXES)),
+    help="Compress rotated log segments.",
+)
+@click.option(
+    "--log-timestamps",
+    is_flag=True,
+    default=False,
+    help="Index output by time to use with logs --since/--until.",
+)
+@click.option(
+    "--sample-interval",
+    type=click.FloatRange(min=0.5),
+    metavar="SECONDS",
+    help="Record CPU and memory usage of the hap at the interval, see hap stats.",
+)
+@click.option(
+    "--cpus",
+    callback=validate_cpus,
+    metavar="LIST",
+    help="Run the hap only on the given CPUs, e.g. 0-3,6.",
+)
+@click.option(
+    "--nice",
+    type=click.IntRange(min=-20, max=19),
+    help="Scheduling priority of the hap, from -20 (highest) to 19 (lowest).",
+)
+@click.option(
+    "--ionice",
+    callback=validate_ionice,
+    metavar="CLASS[:LEVEL]",
+    help="IO scheduling class (realtime, best-effort, idle) and level 0-7.",
+)
+@click.option(
+    "--oom-score-adj",
+    type=click.IntRange(min=-1000, max=1000),
+    help="Make the hap more (up to 1000) or less likely to be killed on OOM.",
+)
+@click.option(
+    "--max-memory",
+    callback=validate_size,
+    metavar="SIZE",
+    help="Limit address space of every process of the hap, e.g. 2G.",
+)
+@click.option(
+    "--max-cpu-time",
+    type=click.IntRange(min=1),
+    metavar="SECONDS",
+    help="Limit CPU time of every process of the hap.",
+)
+@click.option(
+    "--queue",
+    callback=validate_queue,
+    metavar="NAME",
+    help="Wait in the queue for a free slot instead of starting right away.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    help="Number of haps from the queue running at once, CPU count by default.",
+)
+@click.option(
+    "--priority",
+    type=int,
+    help="Queued haps with higher priority are started first.",
+)
+@click.option(
+    "--when-load-below",
+    type=click.FloatRange(min=0, min_open=True),
+    metavar="LOAD",
+    help="Wait to start the hap until load average of the machine is lower.",
+)
+@click.option(
+    "--when-free-mem-above",
+    callback=validate_size,
+    metavar="SIZE",
+    help="Wait to start the hap until there is more available memory, e.g. 4G.",
+)
+@click.option(
+    "--max-running-per-user",
+    type=click.IntRange(min=1),
+    metavar="COUNT",
+    help="Wait to start the hap while the user has as many haps running.",
+)
+@click.option(
+    "--spread",
+    is_flag=True,
+    default=False,
+    help="Pin haps of the batch to a single CPU each, taken round-robin.",
+)
+def run(
+    cmd: Tuple[str, ...],
+    name: str,
+    check: bool,
+    from_file: Optional[TextIO],
+    matrix: Dict[str, List[str]],
+    stagger: float,
+    max_in_flight: Optional[int],
+    log_mode: str,
+    log_size: Optional[int],
+    log_max_size: Optional[int],
+    log_keep: Optional[int],
+    log_compress: Optional[str],
+    log_timestamps: bool,
+    sample_interval: Optional[float],
+    cpus: Optional[List[int]],
+    nice: Optional[int],
+    ionice: Optional[str],
+    oom_score_adj: Optional[int],
+    max_memory: Optional[int],
+    max_cpu_time: Optional[int],
+    spread: bool,
+    queue: Optional[str],
+    concurrency: Optional[int],
+    priority: Optional[int],
+    when_load_below: Optional[float],
+    when_free_mem_above: Optional[int],
+    max_running_per_user: Optional[int],
+):
+    log_options = _get_log_options(
+        log_mode, log_size, log_max_size, log_keep, log_compress, log_timestamps
+    )
+    run_options = _get_run_options(
+        sample_interval,
+        cpus=cpus,
+        nice=nice,
+        ionice=ionice,
+        oom_score_adj=oom_score_adj,
+        max_memory=max_memory,
+        max_cpu_time=max_cpu_time,
+        queue=queue,
+        priority=priority,
+        when_load_below=when_load_below,
+        when_free_mem_above=when_free_mem_above,
+        max_running_per_user=max_running_per_user,
+    )
+    _check_queue_options(queue, concurrency, priority, check, stagger, max_in_flight)
+    from hapless.admission import has_admission_rules
+
+    if check and has_admission_rules(run_options):
+        # NOTE: held back hap might not be started within the check timeout
+        raise click.BadOptionUsage(
+            "check", "Cannot use --check together with admission rules"
+        )
+    if queue is not None and concurrency is not None:
+        hapless.get_queue(queue).set_concurrency(concurrency)
+    if from_file is not None or matrix:
+        return _run_many(
+            cmd,
+            name,
+            from_file,
+            matrix,
+            stagger,
+            max_in_flight,
+            log_options,
+            run_options,
+            spread,
+        )
+    if spread:
+        raise click.BadOptionUsage(
+            "spread", "Use --spread with --from-file or --matrix"
+        )
+
+    hap = hapless.get_hap(name) if name is not None else None
     if hap is not None:
         console.error(f"Hap with such name already exists: {hap}")
         return sys.exit(1)
@@ -136,7 +710,177 @@ def run(cmd: Tuple[str, ...], name: str, check: bool):
     if not cmd_escaped:
         console.error("You have to provide a command to run")
         return sys.exit(1)
-    hapless.run_command(cmd_escaped, name=name, check=check)
+    try:
+        hapless.run_command(
+            cmd_escaped,
+            name=name,
+            check=check,
+            log_options=log_options,
+            run_options=run_options,
+        )
+    except FileExistsError as e:
+        # NOTE: the same name might be claimed concurrently after the check above
+        console.error(f"{e}")
+        return sys.exit(1)
+
+
+def _get_log_options(
+    mode: str,
+    size: Optional[int],
+    max_size: Optional[int],
+    keep: Optional[int],
+    compress: Optional[str],
+    timestamps: bool = False,
+) -> Optional["LogOptions"]:
+    file_options = {
+        "--log-max-size": max_size,
+        "--log-keep": keep,
+        "--log-compress": compress,
+        "--log-timestamps": timestamps or None,
+    }
+    if mode != "file":
+        given = [option for option, value in file_options.items() if value is not None]
+        if given:
+            raise click.BadOptionUsage(
+                "log_mode", f"Cannot use {given[0]} with {mode} log mode"
+            )
+    if mode == "null" and size is not None:
+        raise click.BadOptionUsage(
+            "log_size", "Cannot use --log-size with null log mode"
+        )
+    if mode == "null":
+        return {"mode": mode}
+    if mode == "ring":
+        return {"mode": mode, "size": size or config.LOG_DEFAULT_RING_SIZE}
+
+    if size is not None:
+        raise click.BadOptionUsage("log_size", "Use --log-size with ring log mode")
+    if timestamps:
+        # NOTE: index offsets are only valid within a single log file
+        if max_size is not None:
+            raise click.BadOptionUsage(
+                "log_timestamps", "Cannot use --log-timestamps with --log-max-size"
+            )
+        return {"mode": mode, "timestamps": True}
+    if max_size is None:
+        if keep is not None or compress is not None:
+            raise click.BadOptionUsage(
+                "log_max_size", "Provide --log-max-size to rotate log files"
+            )
+        return None
+
+    log_options: "LogOptions" = {"mode": mode, "max_size": max_size}
+    if keep is not None:
+        log_options["keep"] = keep
+    if compress is not None:
+        from hapless.logfiles import check_compression
+
+        try:
+            check_compression(compress)
+        except RuntimeError as e:
+            raise click.BadParameter(f"{e}", param_hint="--log-compress")
+        log_options["compress"] = compress
+    return log_options
+
+
+def _get_run_options(
+    sample_interval: Optional[float] = None,
+    cpus: Optional[List[int]] = None,
+    nice: Optional[int] = None,
+    ionice: Optional[str] = None,
+    oom_score_adj: Optional[int] = None,
+    max_memory: Optional[int] = None,
+    max_cpu_time: Optional[int] = None,
+    queue: Optional[str] = None,
+    priority: Optional[int] = None,
+    when_load_below: Optional[float] = None,
+    when_free_mem_above: Optional[int] = None,
+    max_running_per_user: Optional[int] = None,
+) -> Optional["RunOptions"]:
+    options = {
+        "sample_interval": sample_interval,
+        "cpus": cpus,
+        "nice": nice,
+        "ionice": ionice,
+        "oom_score_adj": oom_score_adj,
+        "max_memory": max_memory,
+        "max_cpu_time": max_cpu_time,
+        "queue": queue,
+        "priority": priority,
+        "when_load_below": when_load_below,
+        "when_free_mem_above": when_free_mem_above,
+        "max_running_per_user": max_running_per_user,
+    }
+    run_options = {key: value for key, value in options.items() if value is not None}
+    return cast("RunOptions", run_options) or None
+
+
+def _check_queue_options(
+    queue: Optional[str],
+    concurrency: Optional[int],
+    priority: Optional[int],
+    check: bool,
+    stagger: float,
+    max_in_flight: Optional[int],
+) -> None:
+    if queue is None:
+        if concurrency is not None or priority is not None:
+            raise click.BadOptionUsage(
+                "queue", "Provide --queue to use --concurrency or --priority"
+            )
+        return
+    # NOTE: queued haps are started later, queue itself limits the launches
+    conflicting = {
+        "--check": check,
+        "--stagger": stagger,
+        "--max-in-flight": max_in_flight,
+    }
+    for option, value in conflicting.items():
+        if value:
+            raise click.BadOptionUsage("queue", f"Cannot use {option} with --queue")
+
+
+def _run_many(
+    cmd: Tuple[str, ...],
+    name: Optional[str],
+    from_file: Optional[TextIO],
+    matrix: Dict[str, List[str]],
+    stagger: float,
+    max_in_flight: Optional[int],
+    log_options: Optional["LogOptions"],
+    run_options: Optional["RunOptions"],
+    spread: bool = False,
+):
+    if from_file is not None and (cmd or name):
+        raise click.BadOptionUsage(
+            "from_file", "Cannot use --from-file together with a command or a name"
+        )
+    from hapless.bulk import expand_matrix, read_specs
+
+    try:
+        if from_file is not None:
+            specs: List["HapSpec"] = list(read_specs(from_file))
+        else:
+            spec: "HapSpec" = {"cmd": shlex_join(cmd).strip()}
+            if name is not None:
+                spec["name"] = name
+            specs = [spec] if spec["cmd"] else []
+    except ValueError as e:
+        console.error(f"{e}")
+        return sys.exit(1)
+
+    specs = list(expand_matrix(specs, matrix))
+    if not specs:
+        console.error("You have to provide a command to run")
+        return sys.exit(1)
+    hapless.run_many(
+        specs,
+        stagger=stagger,
+        max_in_flight=max_in_flight,
+        log_options=log_options,
+        run_options=run_options,
+        spread=spread,
+    )
 
 
 @cli.command(short_help="Pause a specific hap.")
@@ -198,7 +942,11 @@ def rename(hap_alias: str, new_name: str):
     if same_name_hap is not None:
         console.print(f"Hap with such name already exists: {same_name_hap}")
         return sys.exit(1)
-    hapless.rename_hap(hap, new_name)
+    try:
+        hapless.rename_hap(hap, new_name)
+    except FileExistsError as e:
+        console.error(f"{e}")
+        return sys.exit(1)
 
 
 @cli.command("__internal_wrap_hap", hidden=True)
@@ -219,5 +967,18 @@ def _wrap_hap(hap_alias: str) -> None:
     hapless._wrap_subprocess(hap)
 
 
+@cli.command("__internal_launcher", hidden=True)
+@click.argument("state_dir", type=click.Path(file_okay=False, path_type=Path))
+def _launcher(state_dir: Path) -> None:
+    if isatty() and not config.DEBUG:
+        logger.critical("Internal command is not supposed to be run manually")
+        return sys.exit(1)
+
+    from hapless.launcher import Launcher
+    from hapless.main import Hapless
+
+    Launcher(Hapless(hapless_dir=state_dir, quiet=True)).serve()
+
+
 if __name__ == "__main__":
     cli()
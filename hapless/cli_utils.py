@@ -1,14 +1,29 @@
 import sys
+from typing import TYPE_CHECKING, cast
 
 import click
 
-from hapless import Hap, Hapless, config
+from hapless import config
+from hapless.utils import LazyObject
 
-hapless = Hapless(hapless_dir=config.HAPLESS_DIR)
-console = hapless.ui
+if TYPE_CHECKING:
+    from hapless.hap import Hap
+    from hapless.main import Hapless
+    from hapless.ui import ConsoleUI
 
 
-def get_or_exit(hap_alias: str) -> Hap:
+def _get_hapless() -> "Hapless":
+    from hapless.main import Hapless
+
+    return Hapless(hapless_dir=config.HAPLESS_DIR)
+
+
+# NOTE: state directory is touched only by the commands actually using it
+hapless = cast("Hapless", LazyObject(_get_hapless))
+console = cast("ConsoleUI", LazyObject(lambda: hapless.ui))
+
+
+def get_or_exit(hap_alias: str) -> "Hap":
     hap = hapless.get_hap(hap_alias)
     if hap is None:
         console.error(f"No such hap: {hap_alias}")
@@ -1,9 +1,36 @@
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
 
-import environ
 
-env = environ.Env()
+class Env:
+    """
+    Read typed settings from environment variables.
+    Accepts the same values as django-environ without the cost of importing it.
+    """
+
+    TRUE_STRINGS = ("true", "on", "ok", "y", "yes", "1")
+
+    def __call__(self, var: str, cast: Callable[[str], Any] = str, default=None):
+        value = os.environ.get(var)
+        if value is None:
+            return default
+        return cast(value)
+
+    def bool(self, var: str, default: bool = False) -> bool:
+        value = os.environ.get(var)
+        if value is None:
+            return default
+        return value.strip().lower() in self.TRUE_STRINGS
+
+    def int(self, var: str, default: int = 0) -> int:
+        return self(var, cast=int, default=default)
+
+    def str(self, var: str, default: Optional[str] = None) -> Optional[str]:
+        return self(var, default=default)
+
+
+env = Env()
 
 DEBUG = env.bool("HAPLESS_DEBUG", default=False)
 
@@ -13,6 +40,8 @@ COLOR_MAIN = "#fdca40"
 COLOR_ACCENT = "#3aaed8"
 COLOR_ERROR = "#f64740"
 STATUS_COLORS = {
+    "queued": COLOR_ACCENT,
+    "waiting": COLOR_ACCENT,
     "running": "#f79824",
     "paused": "#f6efee",
     "success": "#4aad52",
@@ -30,5 +59,18 @@ TRUNCATE_LENGTH = 36
 RESTART_DELIM = "@"
 
 NO_FORK = env.bool("HAPLESS_NO_FORK", default=False)
+LAUNCHER = env.bool("HAPLESS_LAUNCHER", default=False)
+LAUNCHER_IDLE_TIMEOUT = env.int("HAPLESS_LAUNCHER_IDLE_TIMEOUT", default=300)
+SUPERVISOR = env.bool("HAPLESS_SUPERVISOR", default=False)
 
 REDIRECT_STDERR = env.bool("HAPLESS_REDIRECT_STDERR", default=False)
+
+# NOTE: defined here, so the cli can offer them without importing log handling
+LOG_MODES = ("file", "ring", "null")
+LOG_DEFAULT_KEEP = 5
+LOG_DEFAULT_RING_SIZE = 16 << 20
+LOG_COMPRESS_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+BACKEND_FS = "fs"
+BACKEND_SQLITE = "sqlite"
+STATE_BACKEND = env.str("HAPLESS_STATE_BACKEND", default=BACKEND_FS)
@@ -0,0 +1,125 @@
+import ctypes
+import os
+import select
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import psutil
+
+from hapless.utils import logger
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        # NOTE: symbols of libc are already loaded into the interpreter
+        _libc = ctypes.CDLL(None, use_errno=True)
+    return _libc
+
+
+class PollingWatch:
+    """
+    Fallback for the platforms without inotify, just sleeps for a while.
+    """
+
+    def wait(self, timeout: float) -> None:
+        time.sleep(max(timeout, 0))
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class DirectoryWatch(PollingWatch):
+    """
+    Wake up as soon as any file is created, written or moved within directories.
+    """
+
+    def __init__(self, paths: Iterable[Path], mask: int = WATCH_MASK) -> None:
+        libc = _get_libc()
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "Cannot initialize inotify")
+        for path in paths:
+            if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+                errno = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno, f"Cannot watch {path}")
+        self._fd: Optional[int] = fd
+
+    def wait(self, timeout: float) -> None:
+        if self._fd is None:
+            raise ValueError("Watch is closed already")
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if ready:
+            # Only the fact of a change matters, callers check the files themselves
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def watch_directories(
+    paths: Iterable[Path], mask: int = WATCH_MASK
+) -> Union[DirectoryWatch, PollingWatch]:
+    try:
+        if hasattr(_get_libc(), "inotify_init1"):
+            return DirectoryWatch(paths, mask=mask)
+    except OSError as e:
+        # e.g. limit of watches is reached
+        logger.warning(f"Cannot use inotify, falling back to polling: {e}")
+    return PollingWatch()
+
+
+def wait_exited(proc: psutil.Process, timeout: Optional[float] = None) -> bool:
+    """
+    Block until the process exits and return whether it did within the timeout.
+    Uses pidfd when available, so there is no polling involved.
+    """
+    if not hasattr(os, "pidfd_open"):
+        return _poll_exited(proc, timeout)
+
+    try:
+        pidfd = os.pidfd_open(proc.pid)
+    except ProcessLookupError:
+        return True
+    except OSError as e:
+        logger.warning(f"Cannot use pidfd, falling back to polling: {e}")
+        return _poll_exited(proc, timeout)
+
+    try:
+        # NOTE: pid might have been reused before the descriptor was opened
+        if not proc.is_running():
+            return True
+        ready, _, _ = select.select([pidfd], [], [], timeout)
+        return bool(ready)
+    finally:
+        os.close(pidfd)
+
+
+def _poll_exited(proc: psutil.Process, timeout: Optional[float]) -> bool:
+    try:
+        proc.wait(timeout=timeout)
+    except psutil.TimeoutExpired:
+        return False
+    return True
@@ -0,0 +1,142 @@
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, cast
+
+import psutil
+
+from hapless.events import (
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_MODIFY,
+    IN_MOVED_TO,
+    watch_directories,
+)
+from hapless.hap import Hap
+from hapless.logfiles import RingReader, open_log, tail_offset
+
+FOLLOW_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+TAIL_LINES = 10
+
+
+class LogFile:
+    """
+    Reads lines appended to a log file since the last read.
+    """
+
+    def __init__(self, hap: Hap, path: Path, lines: int = TAIL_LINES) -> None:
+        self.hap = hap
+        self.path = path
+        self._file: Optional[BinaryIO] = None
+        self._buffer = b""
+        if self._open():
+            self._file.seek(tail_offset(self._file, lines))
+
+    def _open(self) -> bool:
+        try:
+            self._file = open_log(self.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _rotated(self) -> bool:
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            # NOTE: new file is not created yet
+            return False
+        return current.st_ino != os.fstat(self._file.fileno()).st_ino
+
+    def _read_ring(self, ring: RingReader) -> bytes:
+        # NOTE: offsets of the reader are fixed on opening, so reopen it to see
+        # the new output and skip whatever was consumed already
+        if not self._open():
+            self._file = ring
+            return b""
+        fresh = cast(RingReader, self._file)
+        fresh.seek(max(ring.base + ring.tell() - fresh.base, 0))
+        ring.close()
+        return fresh.read()
+
+    def read(self) -> List[str]:
+        if self._file is None and not self._open():
+            return []
+        if not isinstance(self._file, RingReader) and not self._file.tell():
+            # Empty file might be turned into a ring log by the wrapper meanwhile
+            self._file.close()
+            if not self._open():
+                return []
+        if isinstance(self._file, RingReader):
+            data = self._buffer + self._read_ring(self._file)
+        else:
+            data = self._buffer + self._file.read()
+        if self._rotated():
+            # Whatever was written before the rotation goes first
+            data += self._file.read()
+            self._file.close()
+            self._file = None
+            if self._open():
+                data += self._file.read()
+        *lines, self._buffer = data.split(b"\n")
+        return [line.decode(errors="replace") for line in lines]
+
+    def flush(self) -> List[str]:
+        """
+        Return the last line even if it is not terminated with a newline.
+        """
+        lines = self.read()
+        if self._buffer:
+            lines.append(self._buffer.decode(errors="replace"))
+            self._buffer = b""
+        return lines
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class LogFollower:
+    """
+    Stream new lines from log files of several haps until all of them finish.
+    """
+
+    def __init__(
+        self,
+        haps: List[Hap],
+        stderr: bool = False,
+        lines: int = TAIL_LINES,
+        interval: float = 0.5,
+    ) -> None:
+        self.haps = haps
+        self.interval = interval
+        self._logs = [
+            LogFile(hap, hap.stderr_path if stderr else hap.stdout_path, lines=lines)
+            for hap in haps
+        ]
+
+    @staticmethod
+    def _is_finished(hap: Hap) -> bool:
+        if hap._rc_file.exists():
+            return True
+        # NOTE: parent might have been killed before writing the return code
+        pid = hap.pid
+        return pid is not None and not psutil.pid_exists(pid)
+
+    def __iter__(self) -> Iterator[Tuple[Hap, str]]:
+        paths = {hap.path for hap in self.haps}
+        try:
+            with watch_directories(paths, mask=FOLLOW_MASK) as watch:
+                while True:
+                    # NOTE: check before reading to get the output written last
+                    finished = all(self._is_finished(hap) for hap in self.haps)
+                    for log in self._logs:
+                        read = log.flush if finished else log.read
+                        for line in read():
+                            yield log.hap, line
+                    if finished:
+                        return
+                    # Timeout only covers haps exiting without any file changes
+                    watch.wait(self.interval)
+        finally:
+            for log in self._logs:
+                log.close()
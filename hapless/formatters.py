@@ -2,7 +2,8 @@ import abc
 import json
 from importlib.metadata import version
 from itertools import filterfalse
-from typing import List
+from signal import Signals
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
 from rich import box
 from rich.console import Group, RenderableType
@@ -11,7 +12,21 @@ from rich.table import Table
 from rich.text import Text
 
 from hapless import config
-from hapless.hap import Hap, Status
+from hapless.hap import (
+    ExitRecord,
+    Hap,
+    HapSnapshot,
+    RunOptions,
+    Status,
+    load_snapshots,
+    probe_usage,
+)
+from hapless.procs import TreeUsage
+from hapless.queues import QueuePosition, get_queue_positions
+from hapless.scheduling import format_cpus
+
+if TYPE_CHECKING:
+    from hapless.sampling import Samples
 
 
 class Formatter(abc.ABC):
@@ -36,66 +51,175 @@ class TableFormatter(Formatter):
     Formats Hap objects as a rich table.
     """
 
-    def _get_status_text(self, status: Status) -> Text:
-        color = config.STATUS_COLORS.get(status, "dim")
+    def __init__(
+        self,
+        verbose: bool = False,
+        resources: bool = False,
+        sort: Optional[str] = None,
+    ):
+        super().__init__(verbose=verbose)
+        self.resources = resources
+        self.sort = sort
+
+    def _get_status_text(
+        self,
+        status: Status,
+        position: Optional[QueuePosition] = None,
+        held: bool = False,
+    ) -> Text:
+        # NOTE: queued hap is an unbound one waiting for a free slot
+        # and waiting one is an unbound hap held back by admission rules
+        value = status.value
+        if position is not None:
+            value = "queued"
+        elif held and status == Status.UNBOUND:
+            value = "waiting"
+        color = config.STATUS_COLORS.get(value, "dim")
         status_text = Text()
         status_text.append(config.ICON_STATUS, style=color)
-        status_text.append(f" {status.value}")
+        status_text.append(f" {value}")
+        if position is not None:
+            status_text.append(f" {position.position}/{position.depth}", style="dim")
         return status_text
 
+    @staticmethod
+    def _get_queue_positions(
+        snapshots: List[HapSnapshot],
+    ) -> Dict[str, QueuePosition]:
+        unbound = [s for s in snapshots if s.status == Status.UNBOUND]
+        if not unbound:
+            return {}
+        return get_queue_positions(unbound[0].path.parent)
+
+    def _add_run_option_rows(self, table: Table, run_options: RunOptions) -> None:
+        # NOTE: only needed for the output, so import is deferred
+        import humanize
+
+        if "cpus" in run_options:
+            table.add_row("CPUs:", format_cpus(run_options["cpus"]))
+        if "nice" in run_options:
+            table.add_row("Nice:", f"{run_options['nice']}")
+        if "ionice" in run_options:
+            table.add_row("IO priority:", run_options["ionice"])
+        if "oom_score_adj" in run_options:
+            table.add_row("OOM score adj:", f"{run_options['oom_score_adj']}")
+        if "max_memory" in run_options:
+            max_memory = humanize.naturalsize(run_options["max_memory"], binary=True)
+            table.add_row("Memory limit:", max_memory)
+        if "max_cpu_time" in run_options:
+            table.add_row("CPU time limit:", f"{run_options['max_cpu_time']}s")
+        if "when_load_below" in run_options:
+            table.add_row("Start when load:", f"< {run_options['when_load_below']:g}")
+        if "when_free_mem_above" in run_options:
+            min_memory = humanize.naturalsize(
+                run_options["when_free_mem_above"], binary=True
+            )
+            table.add_row("Start when free memory:", f"> {min_memory}")
+        if "max_running_per_user" in run_options:
+            table.add_row(
+                "Max running per user:", f"{run_options['max_running_per_user']}"
+            )
+
+    def _add_exit_rows(self, table: Table, exit_record: ExitRecord) -> None:
+        # NOTE: only needed for the output, so import is deferred
+        import humanize
+
+        max_rss = humanize.naturalsize(exit_record["max_rss"], binary=True)
+        table.add_row("Peak memory:", max_rss)
+        table.add_row(
+            "CPU time:",
+            f"{exit_record['user_time']:.2f}s user, "
+            f"{exit_record['system_time']:.2f}s system",
+        )
+        table.add_row(
+            "Context switches:",
+            f"{exit_record['voluntary_switches']} voluntary, "
+            f"{exit_record['involuntary_switches']} involuntary",
+        )
+        sig = exit_record["signal"]
+        if sig is not None:
+            try:
+                table.add_row("Signal:", Signals(sig).name)
+            except ValueError:
+                # NOTE: real-time signals have no names
+                table.add_row("Signal:", f"{sig}")
+
     def format_one(self, hap: Hap) -> Group:
+        snapshot = hap.snapshot()
         status_table = Table(show_header=False, show_footer=False, box=box.SIMPLE)
 
-        status_text = self._get_status_text(hap.status)
+        position = self._get_queue_positions([snapshot]).get(snapshot.hid)
+        status_text = self._get_status_text(
+            snapshot.status, position, held=snapshot.held_reason is not None
+        )
         status_table.add_row("Status:", status_text)
+        if position is not None:
+            status_table.add_row(
+                "Queue:",
+                f"{position.queue} ({position.position} of {position.depth})",
+            )
+        if snapshot.held_reason is not None and snapshot.status == Status.UNBOUND:
+            status_table.add_row("Held back:", snapshot.held_reason)
 
-        status_table.add_row("PID:", f"{hap.pid or '-'}")
+        status_table.add_row("PID:", f"{snapshot.pid or '-'}")
 
-        if hap.rc is not None:
-            status_table.add_row("Return code:", f"{hap.rc}")
+        if snapshot.rc is not None:
+            status_table.add_row("Return code:", f"{snapshot.rc}")
 
-        cmd_text = Text(f"{hap.cmd}", style=f"{config.COLOR_ACCENT} bold")
+        cmd_text = Text(f"{snapshot.cmd}", style=f"{config.COLOR_ACCENT} bold")
         if self.verbose:
             status_table.add_row("")
             status_table.add_row("Command:", cmd_text)
-            status_table.add_row("Working dir:", f"{hap.workdir}")
+            status_table.add_row("Working dir:", f"{snapshot.workdir}")
+            self._add_run_option_rows(status_table, hap.run_options or {})
             status_table.add_row("")
         else:
             status_table.add_row("Command:", cmd_text)
 
-        proc = hap.proc
+        proc = snapshot.proc
         if self.verbose and proc is not None:
-            status_table.add_row("Parent PID:", f"{proc.ppid()}")
-            status_table.add_row("User:", f"{proc.username()}")
+            status_table.add_row("Parent PID:", f"{proc.ppid}")
+            status_table.add_row("User:", f"{proc.username}")
 
-        if self.verbose and hap.redirect_stderr:
+        if self.verbose and snapshot.redirect_stderr:
             # Paths are the same, show one line only
-            status_table.add_row("Logs file:", f"{hap.stdout_path}")
+            status_table.add_row("Logs file:", f"{snapshot.stdout_path}")
 
-        if self.verbose and not hap.redirect_stderr:
-            status_table.add_row("Stdout file:", f"{hap.stdout_path}")
-            status_table.add_row("Stderr file:", f"{hap.stderr_path}")
+        if self.verbose and not snapshot.redirect_stderr:
+            status_table.add_row("Stdout file:", f"{snapshot.stdout_path}")
+            status_table.add_row("Stderr file:", f"{snapshot.stderr_path}")
 
-        start_time = hap.start_time
-        end_time = hap.end_time
+        start_time = snapshot.start_time
+        end_time = snapshot.end_time
         if self.verbose and start_time:
             status_table.add_row("Start time:", f"{start_time}")
 
         if self.verbose and end_time:
             status_table.add_row("End time:", f"{end_time}")
 
-        status_table.add_row("Runtime:", f"{hap.runtime}")
+        status_table.add_row("Runtime:", f"{snapshot.runtime}")
+
+        exit_record = snapshot.exit_record
+        if self.verbose and exit_record is not None:
+            self._add_exit_rows(status_table, exit_record)
+
+        tree = probe_usage([snapshot]).get(snapshot.hid) if self.resources else None
+        if tree is not None:
+            cpu, memory, uss, children = self._get_usage_cells(tree)
+            status_table.add_row("CPU %:", cpu)
+            status_table.add_row("Memory:", f"{memory} (USS {uss})")
+            status_table.add_row("Children:", children)
 
         status_panel = Panel(
             status_table,
             expand=self.verbose,
-            title=f"Hap {config.ICON_HAP}{hap.hid}",
-            subtitle=hap.name,
+            title=f"Hap {config.ICON_HAP}{snapshot.hid}",
+            subtitle=snapshot.name,
         )
         result = Group(status_panel)
 
-        environ = hap.env
-        if self.verbose and environ is not None:
+        environ = hap.env if self.verbose else None
+        if environ is not None:
             env_table = Table(show_header=False, show_footer=False, box=None)
             env_table.add_column("", justify="right")
             env_table.add_column("", justify="left", style=config.COLOR_ACCENT)
@@ -113,6 +237,30 @@ class TableFormatter(Formatter):
         return result
 
     def format_list(self, haps: List[Hap]) -> Table:
+        return self.format_snapshots(load_snapshots(haps))
+
+    def _sort_key(self, usage: Dict[str, TreeUsage]) -> Callable[[HapSnapshot], float]:
+        def key(snapshot: HapSnapshot) -> float:
+            tree = usage.get(snapshot.hid)
+            if tree is None:
+                return -1
+            return tree.cpu_percent if self.sort == "cpu" else tree.rss
+
+        return key
+
+    def format_snapshots(
+        self,
+        snapshots: List[HapSnapshot],
+        usage: Optional[Dict[str, TreeUsage]] = None,
+    ) -> Table:
+        """
+        Table of the haps, resources used by the running ones are shown in
+        resources mode, `usage` is probed right away if not provided.
+        """
+        if (self.resources or self.sort) and usage is None:
+            usage = probe_usage(snapshots)
+        if self.sort and usage is not None:
+            snapshots = sorted(snapshots, key=self._sort_key(usage), reverse=True)
         package_name = __package__ or __name__.split(".")[0]
         package_version = version(package_name)
         table = Table(
@@ -131,39 +279,115 @@ class TableFormatter(Formatter):
         table.add_column("Status")
         table.add_column("RC", justify="right")
         table.add_column("Runtime", justify="right")
+        if self.resources:
+            for column in ("CPU %", "Memory", "USS", "Children"):
+                table.add_column(column, justify="right")
 
+        positions = self._get_queue_positions(snapshots)
         active_haps = 0
-        for hap in haps:
-            active_haps += 1 if hap.active else 0
-            name = Text(hap.name)
-            if hap.restarts:
-                name += Text(f"{config.RESTART_DELIM}{hap.restarts}", style="dim")
+        for snapshot in snapshots:
+            active_haps += 1 if snapshot.active else 0
+            name = Text(snapshot.name)
+            if snapshot.restarts:
+                name += Text(f"{config.RESTART_DELIM}{snapshot.restarts}", style="dim")
             pid_text = (
-                f"{hap.pid}" if hap.active else Text(f"{hap.pid or '-'}", style="dim")
+                f"{snapshot.pid}"
+                if snapshot.active
+                else Text(f"{snapshot.pid or '-'}", style="dim")
             )
             command_text = Text(
-                f"{hap.cmd}", overflow="ellipsis", style=f"{config.COLOR_ACCENT}"
+                f"{snapshot.cmd}", overflow="ellipsis", style=f"{config.COLOR_ACCENT}"
+            )
+            status_text = self._get_status_text(
+                snapshot.status,
+                positions.get(snapshot.hid),
+                held=snapshot.held_reason is not None,
             )
-            status_text = self._get_status_text(hap.status)
             command_text.truncate(config.TRUNCATE_LENGTH)
             row = [
-                f"{hap.hid}",
+                f"{snapshot.hid}",
                 name,
                 pid_text,
                 command_text if self.verbose else None,
-                hap.owner if self.verbose else None,
+                snapshot.owner if self.verbose else None,
                 status_text,
-                f"{hap.rc}" if hap.rc is not None else "",
-                hap.runtime,
+                f"{snapshot.rc}" if snapshot.rc is not None else "",
+                snapshot.runtime,
             ]
+            if self.resources:
+                row += self._get_usage_cells((usage or {}).get(snapshot.hid))
             table.add_row(*filterfalse(lambda x: x is None, row))
 
+        captions = []
         if self.verbose:
             table.title = f"{config.ICON_HAP} {package_name}, {package_version}"
-            table.caption = f"{active_haps} active / {len(haps)} total"
+            captions.append(f"{active_haps} active / {len(snapshots)} total")
+        captions.extend(self._get_queue_captions(positions))
+        table.caption = "\n".join(captions) or None
 
         return table
 
+    @staticmethod
+    def _get_queue_captions(positions: Dict[str, QueuePosition]) -> List[str]:
+        depths: Dict[str, int] = {}
+        for position in positions.values():
+            depths[position.queue] = position.depth
+        return [f"{queue}: {depth} queued" for queue, depth in sorted(depths.items())]
+
+    @staticmethod
+    def _get_usage_cells(tree: Optional[TreeUsage]) -> List[str]:
+        if tree is None:
+            return ["", "", "", ""]
+        # NOTE: only needed for the output, so import is deferred
+        import humanize
+
+        return [
+            f"{tree.cpu_percent:.1f}",
+            humanize.naturalsize(tree.rss, binary=True),
+            humanize.naturalsize(tree.uss, binary=True)
+            if tree.uss is not None
+            else "-",
+            f"{tree.children}",
+        ]
+
+    def format_samples(self, hap: Hap, samples: "Samples") -> Table:
+        # NOTE: only needed for the output, so import is deferred
+        import humanize
+
+        from hapless.sampling import sparkline, summarize
+
+        table = Table(
+            show_header=True,
+            header_style=f"{config.COLOR_MAIN} bold",
+            box=box.HEAVY_EDGE,
+            title=f"Hap {config.ICON_HAP}{hap.hid} ({hap.name})",
+            caption=f"{len(samples)} samples",
+            caption_style="dim",
+            caption_justify="right",
+        )
+        table.add_column("")
+        for column in ("Min", "Avg", "Max", "P95"):
+            table.add_column(column, justify="right")
+        table.add_column("Trend", style=config.COLOR_ACCENT)
+
+        metrics = [
+            ("CPU %", samples.cpu, lambda value: f"{value:.1f}"),
+            (
+                "Memory",
+                samples.rss,
+                lambda value: humanize.naturalsize(value, binary=True),
+            ),
+            ("Threads", samples.threads, lambda value: f"{value:.0f}"),
+        ]
+        for title, values, format_value in metrics:
+            summary = summarize(values)
+            table.add_row(
+                title,
+                *(format_value(summary[key]) for key in ("min", "avg", "max", "p95")),
+                sparkline(values),
+            )
+        return table
+
 
 class JSONFormatter(Formatter):
     """
@@ -174,4 +398,4 @@ class JSONFormatter(Formatter):
         return json.dumps(hap.serialize())
 
     def format_list(self, haps: List[Hap]) -> str:
-        return json.dumps([hap.serialize() for hap in haps])
+        return json.dumps([snapshot.serialize() for snapshot in load_snapshots(haps)])
@@ -0,0 +1,138 @@
+import io
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import BinaryIO, Dict, Generator, Iterator, List, Optional, Pattern, Tuple
+
+from hapless.logfiles import BLOCK_SIZE, get_segments, open_segment
+
+LineMatch = Tuple[int, bytes]
+Search = Generator[LineMatch, None, int]
+
+
+def _count_lines(mm: mmap.mmap, start: int, end: int) -> int:
+    # NOTE: count in blocks to avoid copying huge gaps between the matches at once
+    return sum(
+        mm[pos : min(pos + BLOCK_SIZE, end)].count(b"\n")
+        for pos in range(start, end, BLOCK_SIZE)
+    )
+
+
+def _search_mapped(f: BinaryIO, regex: Pattern[bytes], line_no: int) -> Search:
+    size = os.fstat(f.fileno()).st_size
+    if not size:
+        return line_no
+    with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+        pos = counted = 0
+        while pos < size:
+            match = regex.search(mm, pos)
+            if match is None:
+                break
+            start = mm.rfind(b"\n", 0, match.start()) + 1
+            if start == size:
+                # NOTE: empty match after the trailing newline is not a line
+                break
+            end = mm.find(b"\n", match.start())
+            end = size if end < 0 else end
+            if match.end() > end and regex.search(mm, start, end) is None:
+                # Match spans the newline, while the line alone does not match
+                pos = end + 1
+                continue
+            line_no += _count_lines(mm, counted, start)
+            counted = start
+            yield line_no + 1, mm[start:end]
+            pos = end + 1
+        line_no += _count_lines(mm, counted, size)
+        # NOTE: last line without a newline is still a line
+        return line_no + (mm[size - 1 : size] != b"\n")
+
+
+def _search_stream(f: BinaryIO, regex: Pattern[bytes], line_no: int) -> Search:
+    buffer = b""
+    while True:
+        chunk = f.read(BLOCK_SIZE)
+        if not chunk:
+            break
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            line_no += 1
+            if regex.search(line):
+                yield line_no, line
+    if buffer:
+        line_no += 1
+        if regex.search(buffer):
+            yield line_no, buffer
+    return line_no
+
+
+def iter_matches(path: Path, regex: Pattern[bytes]) -> Iterator[LineMatch]:
+    """
+    Numbered lines of the log matching the pattern, rotated segments included.
+    Plain files are searched in place with mmap, the rest are read in blocks,
+    so the pattern has to be compiled with MULTILINE flag to anchor at lines.
+    """
+    line_no = 0
+    for segment in [*get_segments(path), path]:
+        try:
+            f = open_segment(segment)
+        except FileNotFoundError:
+            continue
+        with f:
+            # NOTE: compressed segments and ring logs have to be decoded first
+            if isinstance(f, io.BufferedReader):
+                line_no = yield from _search_mapped(f, regex, line_no)
+            else:
+                line_no = yield from _search_stream(f, regex, line_no)
+
+
+def grep_log(
+    path: Path, pattern: bytes, flags: int = 0, mode: str = "lines"
+) -> Tuple[int, List[LineMatch]]:
+    """
+    Number of matching lines and the lines themselves. Files mode stops at
+    the first match, count mode does not collect the lines.
+    """
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    count, matches = 0, []
+    for match in iter_matches(path, regex):
+        count += 1
+        if mode == "files":
+            break
+        if mode == "lines":
+            matches.append(match)
+    return count, matches
+
+
+def grep_logs(
+    paths: Dict[str, Path],
+    pattern: bytes,
+    flags: int = 0,
+    mode: str = "lines",
+    jobs: Optional[int] = None,
+) -> Iterator[Tuple[str, int, List[LineMatch]]]:
+    """
+    Search the logs in a process pool yielding results as soon as each log
+    is done, so the order is not preserved.
+    """
+    if jobs == 1 or len(paths) < 2:
+        for key, path in paths.items():
+            count, matches = grep_log(path, pattern, flags, mode)
+            yield key, count, matches
+        return
+
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    futures = {
+        executor.submit(grep_log, path, pattern, flags, mode): key
+        for key, path in paths.items()
+    }
+    try:
+        for future in as_completed(futures):
+            count, matches = future.result()
+            yield futures[future], count, matches
+    finally:
+        # NOTE: do not wait for the rest of the logs when output is abandoned
+        for future in futures:
+            future.cancel()
+        executor.shutdown()
@@ -3,29 +3,514 @@ import os
 import pwd
 import random
 import string
+import sys
 import time
 from datetime import datetime
-from enum import Enum
-from functools import cached_property
+from functools import cached_property, wraps
 from pathlib import Path
-from typing import Dict, Optional, Union, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    TypeVar,
+    Union,
+    cast,
+)
 
-import humanize
 import psutil
 
 from hapless import config
+from hapless.logfiles import LogOptions
+from hapless.procs import (
+    ProcInfo,
+    ResourceMonitor,
+    TreeUsage,
+    is_same_process,
+    probe_processes,
+)
+from hapless.status import Status
 from hapless.utils import allow_missing, get_mtime, logger
 
+if TYPE_CHECKING:
+    from hapless.state import StateIndex
 
-class Status(str, Enum):
-    # Created status
-    UNBOUND = "unbound"
-    # Active statuses
-    PAUSED = "paused"
-    RUNNING = "running"
-    # Finished statuses
-    FAILED = "failed"
-    SUCCESS = "success"
+T = TypeVar("T")
+
+
+# NOTE: files read by the snapshot and the ones it needs modification time for
+SNAPSHOT_FILES = ("pid", "rc", "name", "cmd", "workdir", "exit", "held")
+SNAPSHOT_MTIMES = ("pid", "rc", "stdout.log", "stderr.log")
+
+
+def _format_timestamp(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is not None:
+        return datetime.fromtimestamp(timestamp).strftime(config.DATETIME_FORMAT)
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    # Empty value means the file is being written right now
+    if value is not None and value.strip():
+        return int(value)
+
+
+def _to_exit_record(value: Optional[str]) -> Optional["ExitRecord"]:
+    if value is not None and value.strip():
+        return json.loads(value)
+
+
+def _write_atomic(path: Path, data: str) -> None:
+    # NOTE: readers should never observe the file half-written
+    tmp_file = path.with_name(f".{path.name}.tmp")
+    with open(tmp_file, "w") as f:
+        f.write(data)
+    os.replace(tmp_file, path)
+
+
+def _create_file(path: Path) -> None:
+    # NOTE: unlike touch, keeps modification time of the existing file
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644))
+
+
+def _get_status(
+    pid: Optional[int], rc: Optional[int], proc: Optional[ProcInfo]
+) -> Status:
+    if pid is None and rc is None:
+        # No existing process or no return code from the finished one
+        return Status.UNBOUND
+    if proc is not None:
+        return Status.PAUSED if proc.stopped else Status.RUNNING
+    if rc != 0:
+        return Status.FAILED
+    return Status.SUCCESS
+
+
+class HapSnapshot:
+    """
+    Immutable state of the hap at a given moment.
+    Loaded with a single pass over the hap directory reading every file once,
+    so rendering it does not touch the filesystem anymore.
+    Call `refresh` to get a new snapshot with the current state.
+    """
+
+    __slots__ = (
+        "path",
+        "raw_name",
+        "cmd",
+        "workdir",
+        "pid",
+        "rc",
+        "redirect_stderr",
+        "started_at",
+        "finished_at",
+        "logs_updated_at",
+        "uid",
+        "gid",
+        "exit_record",
+        "held_reason",
+        "status",
+        "proc",
+    )
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        raw_name: Optional[str],
+        cmd: Optional[str],
+        workdir: Optional[Path],
+        pid: Optional[int],
+        rc: Optional[int],
+        redirect_stderr: bool,
+        started_at: Optional[float],
+        finished_at: Optional[float],
+        logs_updated_at: Optional[float],
+        uid: Optional[int],
+        gid: Optional[int],
+        exit_record: Optional["ExitRecord"] = None,
+        held_reason: Optional[str] = None,
+        proc: Optional[ProcInfo] = None,
+    ) -> None:
+        if proc is not None and (
+            rc is not None or not is_same_process(proc.create_time, started_at)
+        ):
+            # Hap has finished, so the process has just reused its pid
+            logger.debug(f"Process {pid} does not belong to hap {path.name}")
+            proc = None
+        values = {
+            "path": path,
+            "raw_name": raw_name,
+            "cmd": cmd,
+            "workdir": workdir,
+            "pid": pid,
+            "rc": rc,
+            "redirect_stderr": redirect_stderr,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "logs_updated_at": logs_updated_at,
+            "uid": uid,
+            "gid": gid,
+            "exit_record": exit_record,
+            "held_reason": held_reason,
+            "status": _get_status(pid, rc, proc),
+            "proc": proc,
+        }
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    @classmethod
+    def load(
+        cls, path: Path, procs: Optional[Dict[int, ProcInfo]] = None
+    ) -> "HapSnapshot":
+        return cls._create(path, cls._read_fields(path), procs)
+
+    @classmethod
+    def _create(
+        cls,
+        path: Path,
+        fields: Dict[str, Any],
+        procs: Optional[Dict[int, ProcInfo]] = None,
+    ) -> "HapSnapshot":
+        pid = fields["pid"]
+        if procs is None:
+            procs = probe_processes(_get_probed_pids([fields]))
+        return cls(path, proc=procs.get(pid) if pid is not None else None, **fields)
+
+    @staticmethod
+    def _read_fields(path: Path) -> Dict[str, Any]:
+        contents: Dict[str, str] = {}
+        mtimes: Dict[str, float] = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.name in SNAPSHOT_FILES:
+                        with open(entry.path) as f:
+                            contents[entry.name] = f.read()
+                    if entry.name in SNAPSHOT_MTIMES:
+                        mtimes[entry.name] = entry.stat().st_mtime
+                except FileNotFoundError:
+                    pass
+        stat = path.stat()
+
+        redirect_stderr = "stderr.log" not in mtimes
+        raw_name = contents.get("name")
+        workdir = contents.get("workdir")
+        return dict(
+            raw_name=raw_name.strip() if raw_name is not None else None,
+            cmd=contents.get("cmd"),
+            workdir=Path(workdir) if workdir is not None else None,
+            pid=_to_int(contents.get("pid")),
+            rc=_to_int(contents.get("rc")),
+            redirect_stderr=redirect_stderr,
+            started_at=mtimes.get("pid"),
+            finished_at=mtimes.get("rc"),
+            logs_updated_at=mtimes.get(
+                "stdout.log" if redirect_stderr else "stderr.log"
+            ),
+            uid=stat.st_uid,
+            gid=stat.st_gid,
+            exit_record=_to_exit_record(contents.get("exit")),
+            held_reason=contents.get("held"),
+        )
+
+    @staticmethod
+    def _record_fields(path: Path, record: Dict[str, Any]) -> Dict[str, Any]:
+        redirect_stderr = record["redirect_stderr"]
+        logs_updated_at = None
+        if record["start_time"] is not None and record["end_time"] is None:
+            # NOTE: only needed to get runtime of the hap finished abnormally
+            logs_updated_at = get_mtime(
+                path / ("stdout.log" if redirect_stderr else "stderr.log")
+            )
+        exit_record = None
+        if record["end_time"] is not None:
+            exit_record = _read_exit_record(path / "exit")
+        held_reason = None
+        if record["pid"] is None:
+            held_reason = _read_text(path / "held")
+        workdir = record["workdir"]
+        return dict(
+            raw_name=record["raw_name"],
+            cmd=record["cmd"],
+            workdir=Path(workdir) if workdir is not None else None,
+            pid=record["pid"],
+            rc=record["rc"],
+            redirect_stderr=redirect_stderr,
+            started_at=record["start_time"],
+            finished_at=record["end_time"],
+            logs_updated_at=logs_updated_at,
+            uid=record["uid"],
+            gid=record["gid"],
+            exit_record=exit_record,
+            held_reason=held_reason,
+        )
+
+    def refresh(self) -> "HapSnapshot":
+        return self.load(self.path)
+
+    @property
+    def hid(self) -> str:
+        return self.path.name
+
+    @property
+    def name(self) -> str:
+        if self.raw_name is None:
+            raise ValueError("Hap state is corrupted")
+        return self.raw_name.split(config.RESTART_DELIM)[0]
+
+    @property
+    def restarts(self) -> int:
+        if self.raw_name is None:
+            raise ValueError("Hap state is corrupted")
+        _, *rest = self.raw_name.rsplit(config.RESTART_DELIM, maxsplit=1)
+        return int(rest[0]) if rest else 0
+
+    @property
+    def active(self) -> bool:
+        return self.status in (Status.RUNNING, Status.PAUSED)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Status.FAILED, Status.SUCCESS)
+
+    @property
+    def stdout_path(self) -> Path:
+        return self.path / "stdout.log"
+
+    @property
+    def stderr_path(self) -> Path:
+        if self.redirect_stderr:
+            return self.stdout_path
+        return self.path / "stderr.log"
+
+    @property
+    def runtime(self) -> str:
+        runtime = 0.0
+        if self.exit_record is not None:
+            runtime = self.exit_record["finished"] - self.exit_record["started"]
+        elif self.proc is not None:
+            runtime = time.time() - self.proc.create_time
+        elif self.started_at is not None:
+            finished_at = self.finished_at or self.logs_updated_at
+            if finished_at is not None:
+                runtime = finished_at - self.started_at
+
+        # NOTE: only needed for the output, so import is deferred
+        import humanize
+
+        return humanize.naturaldelta(runtime)
+
+    @property
+    def start_time(self) -> Optional[str]:
+        return _format_timestamp(self.started_at)
+
+    @property
+    def end_time(self) -> Optional[str]:
+        return _format_timestamp(self.finished_at)
+
+    @property
+    def owner(self) -> str:
+        try:
+            return pwd.getpwuid(cast(int, self.uid)).pw_name
+        except (KeyError, TypeError):
+            return f"{self.uid}:{self.gid}"
+
+    def serialize(self) -> dict:
+        return {
+            "hid": self.hid,
+            "name": self.name,
+            "pid": str(self.pid) if self.pid is not None else None,
+            "rc": str(self.rc) if self.rc is not None else None,
+            "cmd": self.cmd,
+            "workdir": str(self.workdir),
+            "status": self.status.value,
+            "runtime": self.runtime,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "restarts": str(self.restarts),
+            "stdout_file": str(self.stdout_path),
+            "stderr_file": str(self.stderr_path),
+            "exit": self.exit_record,
+        }
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} #{self.hid} {self.status.value}>"
+
+
+def _get_probed_pids(fields: Iterable[Dict[str, Any]]) -> List[int]:
+    # NOTE: process of the finished hap is gone, no need to look for it
+    return [f["pid"] for f in fields if f["pid"] is not None and f["rc"] is None]
+
+
+def load_snapshots(haps: Iterable["Hap"]) -> List[HapSnapshot]:
+    """
+    Load snapshots of all the haps probing their processes in one pass.
+    """
+    fields = [(hap.path, hap._snapshot_fields()) for hap in haps]
+    procs = probe_processes(_get_probed_pids(f for _, f in fields))
+    return [HapSnapshot._create(path, f, procs) for path, f in fields]
+
+
+def probe_usage(
+    snapshots: Iterable[HapSnapshot], monitor: Optional[ResourceMonitor] = None
+) -> Dict[str, TreeUsage]:
+    """
+    Resources used by the whole process trees of the running haps by hap id.
+    """
+    monitor = monitor or ResourceMonitor()
+    procs = {s.hid: s.proc for s in snapshots if s.proc is not None}
+    usage = monitor.probe(procs.values())
+    return {hid: usage[proc.pid] for hid, proc in procs.items() if proc.pid in usage}
+
+
+class SnapshotCache:
+    """
+    Snapshots of all the haps in the state directory kept between refreshes.
+    Only the haps which are not finished yet or which directory has changed
+    are read again, so finished ones cost a single stat call per refresh.
+    """
+
+    # NOTE: directory changed within this time might change again unnoticed
+    # having the same coarse modification time
+    SETTLE_TIME = 1.0
+
+    def __init__(self, hapless_dir: Path) -> None:
+        self.hapless_dir = hapless_dir
+        self._cache: Dict[str, Tuple[Tuple[int, int], HapSnapshot, bool]] = {}
+
+    def refresh(self) -> List[HapSnapshot]:
+        now = time.time()
+        current: Dict[str, Tuple[Tuple[int, int], HapSnapshot, bool]] = {}
+        stale: Dict[str, os.stat_result] = {}
+        with os.scandir(self.hapless_dir) as entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                # NOTE: files are replaced atomically, so restart or rename of
+                # a finished hap changes its directory as well
+                cached = self._cache.get(entry.name)
+                if cached is not None and cached[2] and cached[0] == _dir_key(stat):
+                    current[entry.name] = cached
+                else:
+                    stale[entry.name] = stat
+
+        fields = {}
+        for hid in stale:
+            try:
+                fields[hid] = HapSnapshot._read_fields(self.hapless_dir / hid)
+            except FileNotFoundError:
+                # Hap has been removed meanwhile
+                continue
+        procs = probe_processes(_get_probed_pids(fields.values()))
+        for hid, f in fields.items():
+            snapshot = HapSnapshot._create(self.hapless_dir / hid, f, procs)
+            stat = stale[hid]
+            settled = snapshot.finished and stat.st_mtime < now - self.SETTLE_TIME
+            current[hid] = (_dir_key(stat), snapshot, settled)
+
+        self._cache = current
+        return [current[hid][1] for hid in sorted(current, key=int)]
+
+
+def _dir_key(stat: os.stat_result) -> Tuple[int, int]:
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class RunOptions(TypedDict, total=False):
+    """
+    How the hap process is run, kept in the hap directory to be reused on restart.
+    """
+
+    sample_interval: float
+    cpus: List[int]
+    nice: int
+    ionice: str
+    oom_score_adj: int
+    max_memory: int
+    max_cpu_time: int
+    queue: str
+    priority: int
+    when_load_below: float
+    when_free_mem_above: int
+    max_running_per_user: int
+
+
+class ExitRecord(TypedDict):
+    """
+    Resources used by the hap process and its reaped children, collected
+    when the process is reaped. Timestamps are taken from the monotonic clock.
+    """
+
+    max_rss: int
+    user_time: float
+    system_time: float
+    voluntary_switches: int
+    involuntary_switches: int
+    signal: Optional[int]
+    started: float
+    finished: float
+
+
+def get_exit_record(
+    status: int, rusage: Any, started: float, finished: float
+) -> ExitRecord:
+    """
+    Exit record from the wait status and resource usage returned by `os.wait4`.
+    """
+    # NOTE: maximum resident set size is in kilobytes everywhere but macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "max_rss": rusage.ru_maxrss * scale,
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "voluntary_switches": rusage.ru_nvcsw,
+        "involuntary_switches": rusage.ru_nivcsw,
+        "signal": os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+        "started": started,
+        "finished": finished,
+    }
+
+
+@allow_missing
+def _read_exit_record(path: Path) -> Optional[ExitRecord]:
+    with open(path) as f:
+        return _to_exit_record(f.read())
+
+
+@allow_missing
+def _read_text(path: Path) -> Optional[str]:
+    with open(path) as f:
+        return f.read()
+
+
+def recorded(key: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """
+    Return value from the preloaded index record instead of reading the file.
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @wraps(func)
+        def wrapper(self: "Hap", *args, **kwargs) -> T:
+            record = self._record
+            if record is not None and key in record:
+                return record[key]
+            return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
 
 
 class Hap(object):
@@ -38,12 +523,15 @@ class Hap(object):
         env: Optional[Dict[str, str]] = None,
         workdir: Optional[Union[str, Path]] = None,
         redirect_stderr: bool = False,
+        log_options: Optional[LogOptions] = None,
+        run_options: Optional[RunOptions] = None,
+        index: Optional["StateIndex"] = None,
+        record: Optional[Dict[str, Any]] = None,
     ) -> None:
-        if not hap_path.is_dir():
-            raise ValueError(f"Path {hap_path} is not a directory")
-
         self._hap_path = hap_path
         self._hid: str = hap_path.name
+        self._index = index
+        self._record = record
 
         self._pid_file = hap_path / "pid"
         self._rc_file = hap_path / "rc"
@@ -51,22 +539,73 @@ class Hap(object):
         self._cmd_file = hap_path / "cmd"
         self._workdir_file = hap_path / "workdir"
         self._env_file = hap_path / "env"
+        self._logging_file = hap_path / "logging"
+        self._options_file = hap_path / "options"
+        self._exit_file = hap_path / "exit"
+        self._held_file = hap_path / "held"
 
         self._stdout_path = hap_path / "stdout.log"
         self._stderr_path = hap_path / "stderr.log"
+        self._samples_path = hap_path / "samples"
+
+        if record is not None:
+            # NOTE: record is loaded from the index, so hap is fully initialized
+            return
+
+        if not hap_path.is_dir():
+            raise ValueError(f"Path {hap_path} is not a directory")
 
         self._set_logfiles(redirect_stderr)
+        self._set_log_options(log_options)
+        self._set_run_options(run_options)
         self._set_raw_name(name)
         self._set_command_context(cmd, workdir)
         self._set_env(env)
 
     def set_name(self, name: str):
-        with open(self._name_file, "w") as f:
-            f.write(name)
+        _write_atomic(self._name_file, name)
+        self._sync_index(
+            name=name.split(config.RESTART_DELIM)[0],
+            raw_name=name,
+        )
+
+    def set_return_code(self, rc: int, exit_record: Optional[ExitRecord] = None):
+        # NOTE: waiters wake up as soon as return code appears,
+        # so the exit record has to be in place before that
+        if exit_record is not None:
+            _write_atomic(self._exit_file, json.dumps(exit_record))
+        _write_atomic(self._rc_file, f"{rc}")
+        self._sync_index(
+            rc=rc,
+            status=Status.SUCCESS.value if rc == 0 else Status.FAILED.value,
+            end_time=get_mtime(self._rc_file),
+        )
 
-    def set_return_code(self, rc: int):
-        with open(self._rc_file, "w") as f:
-            f.write(f"{rc}")
+    def set_held_reason(self, reason: Optional[str]) -> None:
+        """
+        Record why the hap is held back from starting, None once it is admitted.
+        """
+        if reason is None:
+            self._held_file.unlink(missing_ok=True)
+        else:
+            _write_atomic(self._held_file, reason)
+
+    def _sync_index(self, **fields: Any) -> None:
+        """
+        Propagate changes written to the hap directory into the state index.
+        """
+        # NOTE: preloaded record is stale after any write, read files instead
+        self._record = None
+        if self._index is None:
+            return
+        try:
+            self._index.update(self.hid, **fields)
+        except KeyError as e:
+            # NOTE: imported here as state module depends on this one
+            from hapless.state import hap_to_record
+
+            logger.warning(f"{e}, indexing it again")
+            self._index.upsert(hap_to_record(self))
 
     def _set_raw_name(self, raw_name: Optional[str]) -> None:
         """
@@ -106,6 +645,11 @@ class Hap(object):
     def _set_pid(self, pid: int):
         with open(self._pid_file, "w") as pid_file:
             pid_file.write(f"{pid}")
+        self._sync_index(
+            pid=pid,
+            status=Status.RUNNING.value,
+            start_time=get_mtime(self._pid_file),
+        )
 
         if not psutil.pid_exists(pid):
             raise RuntimeError(f"Process with pid {pid} is gone")
@@ -114,8 +658,21 @@ class Hap(object):
         if redirect_stderr:
             logger.debug("Process stderr will be redirected to stdout file")
         if not self._stdout_path.exists() and not redirect_stderr:
-            self._stderr_path.touch(exist_ok=True, mode=0o644)
-        self._stdout_path.touch(exist_ok=True, mode=0o644)
+            _create_file(self._stderr_path)
+        _create_file(self._stdout_path)
+
+    def _set_log_options(self, log_options: Optional[LogOptions]) -> None:
+        """
+        Store how the output is written for the first time on hap creation.
+        """
+        if log_options and self.log_options is None:
+            with open(self._logging_file, "w") as f:
+                f.write(json.dumps(log_options))
+
+    def _set_run_options(self, run_options: Optional[RunOptions]) -> None:
+        if run_options and self.run_options is None:
+            with open(self._options_file, "w") as f:
+                f.write(json.dumps(run_options))
 
     def _get_proc_env(self) -> Dict[str, str]:
         proc = self.proc
@@ -159,7 +716,8 @@ class Hap(object):
     # TODO: add extended status to show panel proc.status()
     @property
     def status(self) -> Status:
-        if self.pid is None and self.rc is None:
+        rc = self.rc
+        if self.pid is None and rc is None:
             # No existing process or no return code from the finished one
             return Status.UNBOUND
 
@@ -169,7 +727,7 @@ class Hap(object):
                 return Status.PAUSED
             return Status.RUNNING
 
-        if self.rc != 0:
+        if rc != 0:
             return Status.FAILED
 
         return Status.SUCCESS
@@ -177,27 +735,43 @@ class Hap(object):
     @cached_property
     def proc(self):
         # NOTE: this is cached for the instance lifetime, fits our use case
-        if self.pid is None:
+        pid = self.pid
+        if pid is None or self.rc is not None:
             return
 
         try:
-            return psutil.Process(self.pid)
+            proc = psutil.Process(pid)
+            create_time = proc.create_time()
         except psutil.NoSuchProcess as e:
             logger.warning(f"Cannot find process: {e}")
+            return
+
+        if not is_same_process(create_time, self._started_at()):
+            logger.warning(f"Process {pid} does not belong to hap {self.hid}")
+            return
+        return proc
 
     @property
+    @recorded("cmd")
     @allow_missing
     def cmd(self) -> Optional[str]:
         with open(self._cmd_file) as f:
             return f.read()
 
     @property
-    @allow_missing
     def workdir(self) -> Optional[Path]:
+        if self._record is not None:
+            workdir = self._record["workdir"]
+            return Path(workdir) if workdir is not None else None
+        return self._read_workdir()
+
+    @allow_missing
+    def _read_workdir(self) -> Path:
         with open(self._workdir_file) as f:
             return Path(f.read())
 
     @property
+    @recorded("rc")
     @allow_missing
     def rc(self) -> Optional[int]:
         with open(self._rc_file) as f:
@@ -206,32 +780,44 @@ class Hap(object):
     @property
     def runtime(self) -> str:
         proc = self.proc
-        runtime = 0
-        if proc is not None:
+        exit_record = self.exit_record
+        runtime = 0.0
+        if exit_record is not None:
+            runtime = exit_record["finished"] - exit_record["started"]
+        elif proc is not None:
             runtime = time.time() - proc.create_time()
-        elif self._pid_file.exists():
-            start_time = cast(float, get_mtime(self._pid_file))
+        elif self._started_at() is not None:
+            start_time = cast(float, self._started_at())
             finish_time = cast(
-                float, get_mtime(self._rc_file) or get_mtime(self.stderr_path)
+                float, self._finished_at() or get_mtime(self.stderr_path)
             )
             runtime = finish_time - start_time
 
+        # NOTE: only needed for the output, so import is deferred
+        import humanize
+
         return humanize.naturaldelta(runtime)
 
+    @recorded("start_time")
+    def _started_at(self) -> Optional[float]:
+        return get_mtime(self._pid_file)
+
+    @recorded("end_time")
+    def _finished_at(self) -> Optional[float]:
+        return get_mtime(self._rc_file)
+
     @property
     def start_time(self) -> Optional[str]:
-        if self._pid_file.exists():
-            return datetime.fromtimestamp(os.path.getmtime(self._pid_file)).strftime(
-                config.DATETIME_FORMAT
-            )
+        started_at = self._started_at()
+        if started_at is not None:
+            return datetime.fromtimestamp(started_at).strftime(config.DATETIME_FORMAT)
         logger.info("No start time as hap has not started yet")
 
     @property
     def end_time(self) -> Optional[str]:
-        if self._rc_file.exists():
-            return datetime.fromtimestamp(os.path.getmtime(self._rc_file)).strftime(
-                config.DATETIME_FORMAT
-            )
+        finished_at = self._finished_at()
+        if finished_at is not None:
+            return datetime.fromtimestamp(finished_at).strftime(config.DATETIME_FORMAT)
         logger.info("No end time as hap has not finished yet")
 
     @property
@@ -243,6 +829,7 @@ class Hap(object):
         return self._hid
 
     @property
+    @recorded("pid")
     @allow_missing
     def pid(self) -> Optional[int]:
         with open(self._pid_file) as f:
@@ -261,6 +848,34 @@ class Hap(object):
 
     @property
     @allow_missing
+    def log_options(self) -> Optional[LogOptions]:
+        """
+        Options of the output written by the wrapper, None when the process
+        writes into the log files directly.
+        """
+        with open(self._logging_file) as f:
+            return json.loads(f.read())
+
+    @property
+    @allow_missing
+    def run_options(self) -> Optional[RunOptions]:
+        with open(self._options_file) as f:
+            return json.loads(f.read())
+
+    @property
+    def exit_record(self) -> Optional[ExitRecord]:
+        """
+        Resources used by the process, None until it is reaped by hapless.
+        """
+        return _read_exit_record(self._exit_file)
+
+    @property
+    def held_reason(self) -> Optional[str]:
+        return _read_text(self._held_file)
+
+    @property
+    @recorded("raw_name")
+    @allow_missing
     def raw_name(self) -> Optional[str]:
         with open(self._name_file) as f:
             return f.read().strip()
@@ -303,6 +918,11 @@ class Hap(object):
         return self._stderr_path
 
     @property
+    def samples_path(self) -> Path:
+        return self._samples_path
+
+    @property
+    @recorded("redirect_stderr")
     def redirect_stderr(self) -> bool:
         return not self._stderr_path.exists()
 
@@ -317,32 +937,33 @@ class Hap(object):
 
     @property
     def owner(self) -> str:
-        stat = self.path.stat()
+        if self._record is not None and self._record["uid"] is not None:
+            uid, gid = self._record["uid"], self._record["gid"]
+        else:
+            stat = self.path.stat()
+            uid, gid = stat.st_uid, stat.st_gid
         try:
-            owner = pwd.getpwuid(stat.st_uid).pw_name
+            owner = pwd.getpwuid(uid).pw_name
         except KeyError:
-            owner = f"{stat.st_uid}:{stat.st_gid}"
+            owner = f"{uid}:{gid}"
         return owner
 
+    def _snapshot_fields(self) -> Dict[str, Any]:
+        if self._record is not None:
+            return HapSnapshot._record_fields(self.path, self._record)
+        return HapSnapshot._read_fields(self.path)
+
+    def snapshot(self) -> HapSnapshot:
+        """
+        Load the whole state of the hap at once.
+        """
+        return HapSnapshot._create(self.path, self._snapshot_fields())
+
     def serialize(self) -> dict:
         """
         Serialize hap object into a dictionary.
         """
-        return {
-            "hid": self.hid,
-            "name": self.name,
-            "pid": str(self.pid) if self.pid is not None else None,
-            "rc": str(self.rc) if self.rc is not None else None,
-            "cmd": self.cmd,
-            "workdir": str(self.workdir),
-            "status": self.status.value,
-            "runtime": self.runtime,
-            "start_time": self.start_time,
-            "end_time": self.end_time,
-            "restarts": str(self.restarts),
-            "stdout_file": str(self.stdout_path),
-            "stderr_file": str(self.stderr_path),
-        }
+        return self.snapshot().serialize()
 
     def __str__(self) -> str:
         return f"#{self.hid} ({self.name})"
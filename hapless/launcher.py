@@ -0,0 +1,292 @@
+import fcntl
+import os
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from hapless import config
+from hapless.hap import Hap, Status, get_exit_record
+from hapless.utils import get_exec_path, get_return_code, logger
+
+if TYPE_CHECKING:
+    from hapless.main import Hapless
+
+# NOTE: maximum length of the unix socket path is 108 bytes including null
+MAX_SOCKET_PATH = 100
+CONNECT_TIMEOUT = 5.0
+CONNECT_INTERVAL = 0.01
+# NOTE: silent client must not stall the launcher serving everyone else
+REQUEST_TIMEOUT = 1.0
+
+ACTION_WRAP = "wrap"
+ACTION_SUPERVISE = "supervise"
+
+
+def get_socket_path(hapless_dir: Path) -> Path:
+    # NOTE: state directory might be shared, so launcher belongs to a user
+    return hapless_dir / f"launcher-{os.getuid()}.sock"
+
+
+def get_lock_path(hapless_dir: Path) -> Path:
+    return hapless_dir / f".launcher-{os.getuid()}.lock"
+
+
+class Launcher:
+    """
+    Long-lived process with all the wrapper code already imported.
+    Forks ready-made hap wrappers on request received over a unix socket
+    and exits after being idle for a while.
+    In supervisor mode haps are started as direct children of the launcher
+    itself, so a single process reaps all of them and records return codes.
+    """
+
+    def __init__(
+        self,
+        hapless: "Hapless",
+        idle_timeout: float = config.LAUNCHER_IDLE_TIMEOUT,
+    ) -> None:
+        self.hapless = hapless
+        self.idle_timeout = idle_timeout
+        self.socket_path = get_socket_path(hapless.dir)
+        self._lock_path = get_lock_path(hapless.dir)
+        self._supervised: Dict[int, Tuple[Hap, subprocess.Popen, float]] = {}
+
+    def serve(self) -> None:
+        with open(self._lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Another launcher is already running")
+                return
+
+            # Nobody serves on this socket as we are holding the lock
+            self.socket_path.unlink(missing_ok=True)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            wakeup_r, wakeup_w = socket.socketpair()
+            try:
+                old_umask = os.umask(0o177)
+                try:
+                    server.bind(f"{self.socket_path}")
+                finally:
+                    os.umask(old_umask)
+                server.listen(128)
+                logger.debug(f"Launcher is listening on {self.socket_path}")
+                # NOTE: signal handler only has to wake up the selector
+                wakeup_w.setblocking(False)
+                signal.set_wakeup_fd(wakeup_w.fileno())
+                signal.signal(signal.SIGCHLD, lambda *_: None)
+                self._loop(
+                    server,
+                    wakeup_r,
+                    close_fds=(
+                        server.fileno(),
+                        lock_file.fileno(),
+                        wakeup_r.fileno(),
+                        wakeup_w.fileno(),
+                    ),
+                )
+            finally:
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.set_wakeup_fd(-1)
+                wakeup_r.close()
+                wakeup_w.close()
+                server.close()
+                self.socket_path.unlink(missing_ok=True)
+
+    def _loop(
+        self,
+        server: socket.socket,
+        wakeup: socket.socket,
+        close_fds: Tuple[int, ...],
+    ) -> None:
+        with selectors.DefaultSelector() as selector:
+            selector.register(server, selectors.EVENT_READ)
+            selector.register(wakeup, selectors.EVENT_READ)
+            last_activity = time.monotonic()
+            while True:
+                timeout = None
+                if not self._supervised:
+                    timeout = last_activity + self.idle_timeout - time.monotonic()
+                    if timeout <= 0:
+                        logger.debug("Launcher is idle, exiting")
+                        return
+                for key, _ in selector.select(timeout=timeout):
+                    if key.fileobj is wakeup:
+                        _drain(wakeup)
+                        continue
+                    conn, _ = server.accept()
+                    conn.settimeout(REQUEST_TIMEOUT)
+                    with conn:
+                        try:
+                            self._handle(conn, close_fds=close_fds)
+                        except OSError as e:
+                            logger.error(f"Cannot handle launch request: {e}")
+                    last_activity = time.monotonic()
+                if self._reap_children():
+                    last_activity = time.monotonic()
+
+    def _handle(self, conn: socket.socket, close_fds: Tuple[int, ...]) -> None:
+        uid = _get_peer_uid(conn)
+        if uid is not None and uid != os.getuid():
+            logger.error(f"Rejecting launch request from user {uid}")
+            return
+
+        action, _, hid = _readline(conn).rpartition(" ")
+        action = action or ACTION_WRAP
+        hap = self.hapless.get_hap(hid) if hid.isdigit() else None
+        if (
+            action not in (ACTION_WRAP, ACTION_SUPERVISE)
+            or hap is None
+            or hap.status != Status.UNBOUND
+        ):
+            conn.sendall(f"error Hap {hid} cannot be launched\n".encode())
+            return
+
+        if action == ACTION_SUPERVISE:
+            pid = self._supervise(hap)
+            conn.sendall(f"{pid}\n".encode())
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            # NOTE: wrapper should not hold the socket and the launcher lock
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            for fd in close_fds:
+                os.close(fd)
+            conn.close()
+            os.setsid()
+            self.hapless._wrap_subprocess(hap)
+            os._exit(0)
+        conn.sendall(f"{pid}\n".encode())
+        logger.debug(f"Launched wrapper for hap {hid} with pid {pid}")
+
+    def _supervise(self, hap: Hap) -> int:
+        started = time.monotonic()
+        proc = self.hapless._start_subprocess(hap, new_session=True)
+        self._supervised[proc.pid] = (hap, proc, started)
+        logger.debug(f"Supervising hap {hap.hid} with pid {proc.pid}")
+        return proc.pid
+
+    def _reap_children(self) -> int:
+        """
+        Collect all exited children recording return codes of supervised haps.
+        Returns number of haps finished.
+        """
+        finished = 0
+        while True:
+            try:
+                pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                return finished
+            if pid == 0:
+                return finished
+
+            if pid not in self._supervised:
+                # Forked wrapper takes care of its own hap
+                continue
+            hap, proc, started = self._supervised.pop(pid)
+            retcode = get_return_code(status)
+            exit_record = get_exit_record(status, rusage, started, time.monotonic())
+            # NOTE: let `subprocess` know the child is gone already
+            proc.returncode = retcode
+            finished += 1
+            try:
+                hap.set_return_code(retcode, exit_record)
+            except OSError as e:
+                logger.error(f"Cannot record return code for hap {hap.hid}: {e}")
+
+
+def _drain(conn: socket.socket) -> None:
+    try:
+        while conn.recv(1024, socket.MSG_DONTWAIT):
+            pass
+    except BlockingIOError:
+        pass
+
+
+def _get_peer_uid(conn: socket.socket) -> Optional[int]:
+    """
+    User of the process on the other end of the socket, None if the platform
+    cannot tell. Socket file is only accessible by its owner anyway.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = conn.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", creds)
+        return uid
+    if hasattr(socket, "LOCAL_PEERCRED"):
+        # NOTE: xucred structure on macOS and BSDs starts with version and uid,
+        # SOL_LOCAL level is not exposed by the socket module
+        creds = conn.getsockopt(0, socket.LOCAL_PEERCRED, struct.calcsize("2I"))
+        _, uid = struct.unpack("2I", creds)
+        return uid
+    return None
+
+
+def _readline(conn: socket.socket, limit: int = 1024) -> str:
+    data = b""
+    while not data.endswith(b"\n") and len(data) < limit:
+        chunk = conn.recv(limit)
+        if not chunk:
+            break
+        data += chunk
+    return data.decode().strip()
+
+
+def _request(socket_path: Path, message: str) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(f"{socket_path}")
+        client.sendall(f"{message}\n".encode())
+        response = _readline(client)
+    if not response.isdigit():
+        raise RuntimeError(f"Launcher failed: {response or 'no response'}")
+    return int(response)
+
+
+def start_launcher(hapless_dir: Path) -> None:
+    exec_path = get_exec_path()
+    subprocess.Popen(
+        [f"{exec_path}", "__internal_launcher", f"{hapless_dir}"],
+        start_new_session=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    logger.debug("Started launcher process")
+
+
+def request_launch(
+    hapless_dir: Path, hid: str, supervise: bool = False
+) -> Optional[int]:
+    """
+    Ask launcher to start a wrapper for the hap, starting launcher if needed.
+    With `supervise` the hap is started and reaped by the launcher directly.
+    Returns pid of the wrapper (or the hap) or None when launcher is not available.
+    """
+    action = ACTION_SUPERVISE if supervise else ACTION_WRAP
+    message = f"{action} {hid}"
+    socket_path = get_socket_path(hapless_dir)
+    if len(f"{socket_path}") > MAX_SOCKET_PATH:
+        logger.warning("State directory path is too long for the launcher socket")
+        return None
+
+    try:
+        return _request(socket_path, message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        start_launcher(hapless_dir)
+
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            return _request(socket_path, message)
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(CONNECT_INTERVAL)
+    logger.error("Launcher did not start in time")
+    return None
@@ -0,0 +1,847 @@
+import bisect
+import errno
+import heapq
+import io
+import mmap
+import os
+import re
+import selectors
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    Union,
+    cast,
+)
+
+from hapless import config
+from hapless.utils import logger
+
+BLOCK_SIZE = 64 * 1024
+TAIL_BLOCK_SIZE = 8192
+SENDFILE_CHUNK_SIZE = 1 << 30
+# NOTE: e.g. output is a terminal on older kernels or a pipe on macOS
+SENDFILE_UNSUPPORTED = (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP)
+
+DEFAULT_KEEP = config.LOG_DEFAULT_KEEP
+DEFAULT_RING_SIZE = config.LOG_DEFAULT_RING_SIZE
+COMPRESS_SUFFIXES = config.LOG_COMPRESS_SUFFIXES
+LOG_MODES = config.LOG_MODES
+
+# Ring log starts with a header: magic, capacity, offsets of the oldest byte
+# available and of the end of the output written so far
+RING_MAGIC = b"HAPRING1"
+RING_HEADER = struct.Struct("<8sQQQ")
+RING_HEADER_SIZE = 64
+
+# Index entry tells that the line with the number starts at the byte offset and
+# all the output before it has arrived by the time
+INDEX_ENTRY = struct.Struct("<QQd")
+INDEX_SUFFIX = ".idx"
+INDEX_BYTES = 64 * 1024
+INDEX_INTERVAL = 1.0
+# NOTE: time to drain output left in the pipes once the process has exited
+DRAIN_TIMEOUT = 1.0
+
+
+class LogOptions(TypedDict, total=False):
+    mode: str
+    max_size: int
+    keep: int
+    compress: Optional[str]
+    size: int
+    timestamps: bool
+
+
+def is_pumped(log_options: Optional[LogOptions]) -> bool:
+    """
+    Whether output has to go through the wrapper instead of the files directly.
+    """
+    return bool(log_options) and cast(LogOptions, log_options).get("mode") != "null"
+
+
+def _get_zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Install zstandard package to use zstd compression")
+    return zstandard
+
+
+def check_compression(compress: str) -> None:
+    """
+    Make sure segments can be compressed with the method requested.
+    """
+    if compress not in COMPRESS_SUFFIXES:
+        raise ValueError(f"Unknown compression method {compress}")
+    if compress == "zstd":
+        _get_zstd()
+
+
+def _find_segments(path: Path) -> Dict[int, Path]:
+    pattern = re.compile(rf"^{re.escape(path.name)}\.(\d+)(\.gz|\.zst)?$")
+    segments: Dict[int, Path] = {}
+    try:
+        entries = list(os.scandir(path.parent))
+    except FileNotFoundError:
+        return segments
+    for entry in entries:
+        match = pattern.match(entry.name)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        # NOTE: uncompressed file stays around until its compressed copy is ready
+        if number not in segments or match.group(2) is None:
+            segments[number] = Path(entry.path)
+    return segments
+
+
+def get_segments(path: Path) -> List[Path]:
+    """
+    Rotated segments of the log file from the oldest to the newest one.
+    """
+    segments = _find_segments(path)
+    return [segments[number] for number in sorted(segments)]
+
+
+class RingReader(io.RawIOBase):
+    """
+    Read-only view of the ring log content as if it was a regular file.
+    Offsets are relative to the oldest byte available at the time of opening.
+    """
+
+    def __init__(self, f: BinaryIO, header: Tuple[bytes, int, int, int]) -> None:
+        super().__init__()
+        self._f = f
+        _, self.capacity, self.base, self.end = header
+        self._pos = 0
+        if self.base > 0:
+            self._skip_partial_line()
+
+    def _skip_partial_line(self) -> None:
+        """
+        Oldest line has been partially overwritten once the buffer wrapped around.
+        """
+        while True:
+            chunk = self.read(TAIL_BLOCK_SIZE)
+            if not chunk:
+                break
+            idx = chunk.find(b"\n")
+            if idx >= 0:
+                self.base += self._pos - len(chunk) + idx + 1
+                break
+        self._pos = 0
+
+    @property
+    def size(self) -> int:
+        return self.end - self.base
+
+    def fileno(self) -> int:
+        return self._f.fileno()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.size - self._pos)
+        if size <= 0:
+            return 0
+        pos = (self.base + self._pos) % self.capacity
+        first = min(size, self.capacity - pos)
+        fd = self._f.fileno()
+        data = os.pread(fd, first, RING_HEADER_SIZE + pos)
+        if first < size:
+            data += os.pread(fd, size - first, RING_HEADER_SIZE)
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def open_log(path: Path) -> BinaryIO:
+    """
+    Open the log file for reading, ring logs are read in the order of writing.
+    """
+    f = open(path, "rb")
+    header = f.read(RING_HEADER.size)
+    if len(header) == RING_HEADER.size and header.startswith(RING_MAGIC):
+        return cast(BinaryIO, RingReader(f, RING_HEADER.unpack(header)))
+    f.seek(0)
+    return f
+
+
+def is_ring(path: Path) -> bool:
+    with open_log(path) as f:
+        return isinstance(f, RingReader)
+
+
+def open_segment(path: Path) -> BinaryIO:
+    if path.suffix == ".gz":
+        import gzip
+
+        return cast(BinaryIO, gzip.open(path, "rb"))
+    if path.suffix == ".zst":
+        decompressor = _get_zstd().ZstdDecompressor()
+        return decompressor.stream_reader(open(path, "rb"), closefd=True)
+    return open_log(path)
+
+
+def compress_segment(path: Path, compress: str) -> Path:
+    target = path.with_name(f"{path.name}{COMPRESS_SUFFIXES[compress]}")
+    tmp_file = path.with_name(f".{target.name}.tmp")
+    with open(path, "rb") as src, open(tmp_file, "wb") as dst:
+        if compress == "zstd":
+            _get_zstd().ZstdCompressor().copy_stream(src, dst)
+        else:
+            import gzip
+
+            with gzip.GzipFile(fileobj=dst, mode="wb") as gz:
+                shutil.copyfileobj(src, gz, BLOCK_SIZE)
+    os.replace(tmp_file, target)
+    path.unlink()
+    return target
+
+
+def tail_offset(f: BinaryIO, lines: int) -> int:
+    """
+    Find offset of the last lines of the file by reading it backwards.
+    """
+    end = f.seek(0, os.SEEK_END)
+    if lines <= 0 or not end:
+        return end
+
+    f.seek(end - 1)
+    # NOTE: newline at the very end terminates the last line, so skip it
+    wanted = lines + 1 if f.read(1) == b"\n" else lines
+    pos = end
+    while pos > 0:
+        size = min(TAIL_BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        chunk = f.read(size)
+        idx = len(chunk)
+        while True:
+            idx = chunk.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            wanted -= 1
+            if wanted == 0:
+                return pos + idx + 1
+    return 0
+
+
+def iter_range(
+    path: Path,
+    offset: int = 0,
+    length: Optional[int] = None,
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Read the file in blocks starting at the offset, up to length bytes.
+    """
+    with open_log(path) as f:
+        f.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = block_size if remaining is None else min(block_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def tail_start(
+    path: Path, lines: Optional[int] = None, nbytes: Optional[int] = None
+) -> int:
+    """
+    Offset of the last lines or bytes of the file, beginning if neither is given.
+    """
+    if lines is None and nbytes is None:
+        return 0
+    with open_log(path) as f:
+        if lines is not None:
+            return tail_offset(f, lines)
+        return max(f.seek(0, os.SEEK_END) - cast(int, nbytes), 0)
+
+
+def iter_tail(
+    path: Path,
+    lines: Optional[int] = None,
+    nbytes: Optional[int] = None,
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Read the last lines or bytes of the file, the whole file if neither is given.
+    Only the requested part of the file is ever read.
+    """
+    start = tail_start(path, lines=lines, nbytes=nbytes)
+    return iter_range(path, offset=start, block_size=block_size)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def copy_range(
+    path: Path, out_fd: int, offset: int = 0, length: Optional[int] = None
+) -> int:
+    """
+    Copy part of the file into the descriptor without passing it through Python.
+    Falls back to copying in blocks where `sendfile` cannot be used.
+    """
+    with open(path, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        if length is not None:
+            end = min(end, offset + length)
+        pos = offset
+        use_sendfile = hasattr(os, "sendfile")
+        while pos < end:
+            size = min(end - pos, SENDFILE_CHUNK_SIZE)
+            if use_sendfile:
+                try:
+                    copied = os.sendfile(out_fd, f.fileno(), pos, size)
+                except OSError as e:
+                    if e.errno not in SENDFILE_UNSUPPORTED:
+                        raise
+                    use_sendfile = False
+                    continue
+            else:
+                f.seek(pos)
+                chunk = f.read(min(size, BLOCK_SIZE))
+                _write_all(out_fd, chunk)
+                copied = len(chunk)
+            if not copied:
+                # file has been truncated meanwhile
+                break
+            pos += copied
+    return max(pos - offset, 0)
+
+
+def _iter_segment(path: Path, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    try:
+        f = open_segment(path)
+    except FileNotFoundError:
+        # NOTE: log file is being rotated right now
+        return
+    with f:
+        while True:
+            chunk = f.read(block_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _skip(chunks: Iterator[bytes], offset: int, length: Optional[int]):
+    for chunk in chunks:
+        if offset >= len(chunk):
+            offset -= len(chunk)
+            continue
+        chunk = chunk[offset:]
+        offset = 0
+        if length is not None:
+            chunk = chunk[:length]
+            length -= len(chunk)
+        if chunk:
+            yield chunk
+        if length == 0:
+            return
+
+
+def iter_log(
+    path: Path,
+    lines: Optional[int] = None,
+    nbytes: Optional[int] = None,
+    offset: Optional[int] = None,
+    length: Optional[int] = None,
+    block_size: int = BLOCK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Read the requested part of the log, including its rotated segments.
+    Segments are read only as far back as the requested output reaches.
+    """
+    segments = get_segments(path)
+    if offset is not None or length is not None:
+        if not segments:
+            return iter_range(path, offset or 0, length, block_size=block_size)
+        chunks = (
+            chunk
+            for segment in [*segments, path]
+            for chunk in _iter_segment(segment, block_size)
+        )
+        return _skip(chunks, offset or 0, length)
+
+    if not segments:
+        return iter_tail(path, lines=lines, nbytes=nbytes, block_size=block_size)
+    if lines is None and nbytes is None:
+        return (
+            chunk
+            for segment in [*segments, path]
+            for chunk in _iter_segment(segment, block_size)
+        )
+
+    try:
+        start = tail_start(path, lines=lines, nbytes=nbytes)
+    except FileNotFoundError:
+        start = 0
+    if start > 0:
+        return iter_range(path, start, block_size=block_size)
+
+    # Current file is too short, so prepend the newest segments as needed
+    data = b""
+    for segment in reversed([*segments, path]):
+        data = b"".join(_iter_segment(segment, block_size)) + data
+        if nbytes is not None and len(data) >= nbytes:
+            break
+        if lines is not None and data.count(b"\n") > lines:
+            break
+    if lines is not None:
+        start = tail_offset(io.BytesIO(data), lines)
+    else:
+        start = max(len(data) - cast(int, nbytes), 0)
+    return iter([data[start:]] if len(data) > start else [])
+
+
+def copy_log(
+    path: Path,
+    out_fd: int,
+    lines: Optional[int] = None,
+    nbytes: Optional[int] = None,
+    offset: Optional[int] = None,
+    length: Optional[int] = None,
+) -> None:
+    """
+    Same as `iter_log`, but writes the output straight into the descriptor.
+    """
+    if get_segments(path) or is_ring(path):
+        for chunk in iter_log(path, lines, nbytes, offset, length):
+            _write_all(out_fd, chunk)
+        return
+
+    if offset is not None or length is not None:
+        start = offset or 0
+    else:
+        start = tail_start(path, lines=lines, nbytes=nbytes)
+    copy_range(path, out_fd, offset=start, length=length)
+
+
+class RotatingLog:
+    """
+    Log file which is moved aside into a numbered segment once it grows too big.
+    Only the last `keep` segments are preserved. Segments are compressed in
+    a background thread, so writing the output never waits for it.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_size: int,
+        keep: int = DEFAULT_KEEP,
+        compress: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.keep = keep
+        self.compress = compress
+        # NOTE: unbuffered, so readers see the output right away
+        self._file = open(path, "ab", buffering=0)
+        self._size = self._file.tell()
+        self._lock = threading.Lock()
+        self._pending: List[Path] = []
+        self._compressor: Optional[threading.Thread] = None
+
+    def _write(self, data: bytes) -> None:
+        _write_all(self._file.fileno(), data)
+        self._size += len(data)
+
+    def write(self, data: bytes) -> None:
+        while data:
+            room = max(self.max_size - self._size, 0)
+            if len(data) <= room:
+                self._write(data)
+                return
+            # Keep lines whole unless a single line is longer than the limit
+            cut = data.rfind(b"\n", 0, room) + 1
+            if not cut and not self._size:
+                cut = room
+            if cut:
+                self._write(data[:cut])
+                data = data[cut:]
+            self.rotate()
+
+    def rotate(self) -> None:
+        number = max(_find_segments(self.path), default=0) + 1
+        segment = self.path.with_name(f"{self.path.name}.{number}")
+        self._file.close()
+        os.replace(self.path, segment)
+        self._file = open(self.path, "ab", buffering=0)
+        self._size = 0
+
+        with self._lock:
+            if self.compress is not None:
+                self._pending.append(segment)
+                if self._compressor is None:
+                    self._compressor = threading.Thread(
+                        target=self._compress_pending, daemon=True
+                    )
+                    self._compressor.start()
+            self._prune()
+
+    def _prune(self) -> None:
+        segments = get_segments(self.path)
+        for old_segment in segments[: max(len(segments) - self.keep, 0)]:
+            # NOTE: removed once compressed, as the next pruning comes to it
+            if old_segment not in self._pending:
+                old_segment.unlink()
+
+    def _compress_pending(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._compressor = None
+                    return
+                segment = self._pending[0]
+            try:
+                compress_segment(segment, cast(str, self.compress))
+            except OSError as e:
+                logger.error(f"Cannot compress log segment {segment}: {e}")
+            with self._lock:
+                self._pending.pop(0)
+                self._prune()
+
+    def close(self) -> None:
+        self._file.close()
+        compressor = self._compressor
+        if compressor is not None:
+            compressor.join()
+
+
+class RingLog:
+    """
+    Log file of a fixed size keeping only the latest output in a circular buffer.
+    File is preallocated and written through mmap, so it never grows.
+    """
+
+    def __init__(self, path: Path, size: int) -> None:
+        self.capacity = size
+        total = RING_HEADER_SIZE + size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        header = os.pread(self._fd, RING_HEADER.size, 0)
+        magic, capacity, self._start, self._end = RING_MAGIC, size, 0, 0
+        if len(header) == RING_HEADER.size and os.fstat(self._fd).st_size == total:
+            magic, capacity, self._start, self._end = RING_HEADER.unpack(header)
+        if magic != RING_MAGIC or capacity != size:
+            self._start, self._end = 0, 0
+        if os.fstat(self._fd).st_size != total:
+            # NOTE: header goes first, so readers never mistake the file for
+            # a regular one while it is being extended
+            header = RING_HEADER.pack(RING_MAGIC, size, self._start, self._end)
+            os.pwrite(self._fd, header, 0)
+            os.ftruncate(self._fd, total)
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(self._fd, 0, total)
+                except OSError:
+                    # NOTE: e.g. not supported by the filesystem, file is sparse
+                    pass
+        self._mm = mmap.mmap(self._fd, total)
+        self._write_header()
+
+    def _write_header(self) -> None:
+        RING_HEADER.pack_into(
+            self._mm, 0, RING_MAGIC, self.capacity, self._start, self._end
+        )
+
+    def write(self, data: bytes) -> None:
+        if len(data) > self.capacity:
+            self._end += len(data) - self.capacity
+            data = data[-self.capacity :]
+        pos = self._end % self.capacity
+        first = min(len(data), self.capacity - pos)
+        self._mm[RING_HEADER_SIZE + pos : RING_HEADER_SIZE + pos + first] = data[:first]
+        if first < len(data):
+            rest = len(data) - first
+            self._mm[RING_HEADER_SIZE : RING_HEADER_SIZE + rest] = data[first:]
+        self._end += len(data)
+        self._start = max(self._start, self._end - self.capacity)
+        self._write_header()
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+
+def get_index_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}{INDEX_SUFFIX}")
+
+
+class TimestampedLog:
+    """
+    Log file with a sparse index of the output arrival times written next to it.
+    Entries are added at line boundaries once enough bytes or time have passed
+    since the previous one.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        index_bytes: int = INDEX_BYTES,
+        index_interval: float = INDEX_INTERVAL,
+    ) -> None:
+        self.index_bytes = index_bytes
+        self.index_interval = index_interval
+        self._file = open(path, "ab", buffering=0)
+        self._index = open(get_index_path(path), "ab", buffering=0)
+        self._size = self._file.tell()
+        self._lines = 0
+        if self._size:
+            self._lines = sum(chunk.count(b"\n") for chunk in iter_range(path))
+        self._indexed_offset = 0
+        self._indexed_at = 0.0
+
+    def write(self, data: bytes) -> None:
+        now = time.time()
+        _write_all(self._file.fileno(), data)
+        start = self._size
+        self._size += len(data)
+        newlines = data.count(b"\n")
+        if not newlines:
+            return
+        self._lines += newlines
+        offset = start + data.rfind(b"\n") + 1
+        if (
+            offset - self._indexed_offset >= self.index_bytes
+            or now - self._indexed_at >= self.index_interval
+        ):
+            self._index.write(INDEX_ENTRY.pack(offset, self._lines, now))
+            self._indexed_offset, self._indexed_at = offset, now
+
+    def close(self) -> None:
+        self._file.close()
+        self._index.close()
+
+
+def read_index(path: Path) -> Optional[List[Tuple[int, int, float]]]:
+    """
+    Entries of the timestamps index of the log file, None if there is no index.
+    """
+    try:
+        with open(get_index_path(path), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # NOTE: the last entry might be written partially at the moment
+    data = data[: len(data) - len(data) % INDEX_ENTRY.size]
+    return list(INDEX_ENTRY.iter_unpack(data))
+
+
+def _skip_lines(path: Path, offset: int, count: int) -> int:
+    """
+    Offset of the line which is `count` lines after the one starting at offset.
+    """
+    pos = offset
+    if count <= 0:
+        return pos
+    for chunk in iter_log(path, offset=offset):
+        idx = -1
+        while count > 0:
+            idx = chunk.find(b"\n", idx + 1)
+            if idx < 0:
+                break
+            count -= 1
+        if not count:
+            return pos + idx + 1
+        pos += len(chunk)
+    return pos
+
+
+def find_range(
+    path: Path,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    from_line: Optional[int] = None,
+) -> Tuple[int, Optional[int]]:
+    """
+    Find offset and length of the part of the log by the time it was written
+    or by the line number, counting from 1.
+    Only the index is searched, so the log itself is not scanned. Time range
+    is as precise as the index is dense, lines on the edges are included.
+    """
+    entries = read_index(path)
+    if entries is None and (since is not None or until is not None):
+        raise ValueError("Log has no timestamps, run hap with --log-timestamps")
+    entries = entries or []
+    offsets = [entry[0] for entry in entries]
+    stamps = [entry[2] for entry in entries]
+
+    start, end = 0, None
+    if from_line is not None:
+        target = max(from_line - 1, 0)
+        idx = bisect.bisect_right([entry[1] for entry in entries], target) - 1
+        base_offset, base_line = (0, 0) if idx < 0 else entries[idx][:2]
+        start = _skip_lines(path, base_offset, target - base_line)
+    if since is not None:
+        # everything before this entry has arrived earlier than requested
+        idx = bisect.bisect_left(stamps, since) - 1
+        if idx >= 0:
+            start = max(start, offsets[idx])
+    if until is not None:
+        idx = bisect.bisect_right(stamps, until)
+        if idx < len(entries):
+            end = offsets[idx]
+    if end is None:
+        return start, None
+    return start, max(end - start, 0)
+
+
+def iter_timed_lines(
+    path: Path, block_size: int = BLOCK_SIZE
+) -> Iterator[Tuple[float, bytes]]:
+    """
+    Lines of the log without newlines along with the time they were captured by.
+    Output missing from the timestamps index, e.g. of the haps started without
+    it, is stamped with the modification time of its file.
+    """
+    entries = read_index(path) or []
+    pos, idx = 0, 0
+    for segment in [*get_segments(path), path]:
+        try:
+            mtime = os.stat(segment).st_mtime
+        except FileNotFoundError:
+            continue
+        buffer = b""
+        for chunk in _iter_segment(segment, block_size):
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                pos += len(line) + 1
+                while idx < len(entries) and entries[idx][0] < pos:
+                    idx += 1
+                yield (entries[idx][2] if idx < len(entries) else mtime), line
+        if buffer:
+            pos += len(buffer)
+            yield mtime, buffer
+
+
+def merge_logs(paths: List[Path]) -> Iterator[Tuple[int, bytes]]:
+    """
+    Lines of several logs in the order they were captured, along with the index
+    of the log they come from. Only one chunk of every log is held in memory.
+    """
+
+    def _stream(number: int, path: Path) -> Iterator[Tuple[float, int, bytes]]:
+        for ts, line in iter_timed_lines(path):
+            yield ts, number, line
+
+    streams = [_stream(number, path) for number, path in enumerate(paths)]
+    # NOTE: merge is stable, so lines captured at the same time keep the order
+    for _, number, line in heapq.merge(*streams, key=lambda item: item[0]):
+        yield number, line
+
+
+LogWriter = Union[RotatingLog, RingLog, TimestampedLog]
+
+
+def get_log_writer(path: Path, log_options: LogOptions) -> LogWriter:
+    if log_options.get("mode") == "ring":
+        return RingLog(path, size=log_options.get("size", DEFAULT_RING_SIZE))
+    if log_options.get("timestamps"):
+        return TimestampedLog(path)
+    return RotatingLog(
+        path,
+        max_size=log_options["max_size"],
+        keep=log_options.get("keep", DEFAULT_KEEP),
+        compress=log_options.get("compress"),
+    )
+
+
+def _has_exited(pid: int) -> bool:
+    """
+    Check if the child process has exited without reaping it, so the caller
+    is still able to collect its exit status and resource usage.
+    """
+    if not hasattr(os, "waitid"):
+        # NOTE: not available on macOS, exited child stays a zombie until reaped
+        import psutil
+
+        try:
+            return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return True
+    try:
+        info = os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+    except ChildProcessError:
+        return True
+    # NOTE: some platforms return an empty structure instead of None
+    return info is not None and info.si_pid != 0
+
+
+def pump_output(
+    proc: subprocess.Popen,
+    outputs: Dict[BinaryIO, LogWriter],
+    interval: float = 0.5,
+) -> None:
+    """
+    Copy output of the process from its pipes into the logs until it exits.
+    Waiting for the process is left to the caller.
+    """
+    selector = selectors.DefaultSelector()
+    for pipe, log in outputs.items():
+        selector.register(pipe, selectors.EVENT_READ, log)
+
+    exited_at: Optional[float] = None
+    next_check = time.monotonic() + interval
+    try:
+        while selector.get_map():
+            events = selector.select(timeout=0 if exited_at is not None else interval)
+            for key, _ in events:
+                data = os.read(key.fd, BLOCK_SIZE)
+                if data:
+                    key.data.write(data)
+                else:
+                    selector.unregister(key.fileobj)
+            now = time.monotonic()
+            if exited_at is not None:
+                # NOTE: descendants might keep the pipes open and keep writing
+                # after the process has exited, so only drain what is there
+                if not events or now - exited_at > DRAIN_TIMEOUT:
+                    break
+            elif not events or now >= next_check:
+                # NOTE: checked even when output keeps coming all the time
+                next_check = now + interval
+                if _has_exited(proc.pid):
+                    exited_at = now
+    finally:
+        selector.close()
+        for pipe, log in outputs.items():
+            pipe.close()
+            log.close()
@@ -1,20 +1,73 @@
+import codecs
 import getpass
 import os
+import re
 import shutil
 import subprocess
 import sys
 import tempfile
+import time
+from contextlib import contextmanager
+from functools import cached_property
+from itertools import cycle
 from pathlib import Path
 from signal import Signals, strsignal
-from typing import Dict, List, Optional, Union, cast
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 
 import psutil
 
 from hapless import config
-from hapless.formatters import Formatter
-from hapless.hap import Hap, Status
-from hapless.ui import ConsoleUI
-from hapless.utils import get_exec_path, kill_proc_tree, logger, wait_created
+from hapless.admission import admitted, has_admission_rules
+from hapless.bulk import HapSpec
+from hapless.events import wait_exited
+from hapless.hap import (
+    ExitRecord,
+    Hap,
+    RunOptions,
+    SnapshotCache,
+    Status,
+    get_exit_record,
+)
+from hapless.launcher import request_launch
+from hapless.logfiles import (
+    LogOptions,
+    copy_log,
+    find_range,
+    get_log_writer,
+    is_pumped,
+    iter_log,
+    merge_logs,
+    pump_output,
+)
+from hapless.names import NameIndex
+from hapless.queues import JobQueue
+from hapless.scheduling import get_available_cpus, get_preexec_fn
+from hapless.state import StateIndex, hap_to_record
+from hapless.utils import (
+    file_lock,
+    get_exec_path,
+    get_return_code,
+    kill_proc_tree,
+    logger,
+    wait_created,
+)
+
+if TYPE_CHECKING:
+    from hapless.formatters import Formatter, TableFormatter
+    from hapless.ui import ConsoleUI
 
 
 class Hapless:
@@ -23,8 +76,9 @@ class Hapless:
         hapless_dir: Optional[Union[Path, str]] = None,
         *,
         quiet: bool = False,
+        backend: Optional[str] = None,
     ):
-        self.ui = ConsoleUI(disable=quiet)
+        self._quiet = quiet
         user = getpass.getuser()
         default_dir = Path(tempfile.gettempdir()) / "hapless"
 
@@ -41,12 +95,71 @@ class Hapless:
             sys.exit(1)
 
         self._hapless_dir = hapless_dir
+        self._index = self._get_index(backend or config.STATE_BACKEND)
+        self._names = NameIndex(hapless_dir, get_names_map=self._get_hap_names_map)
         logger.debug(f"Initialized within {self._hapless_dir} dir")
 
-    def stats(self, haps: List[Hap], formatter: Formatter):
+    @cached_property
+    def ui(self) -> "ConsoleUI":
+        # NOTE: rich takes a while to import, so do it only when printing
+        from hapless.ui import ConsoleUI
+
+        return ConsoleUI(disable=self._quiet)
+
+    def _get_index(self, backend: str) -> Optional[StateIndex]:
+        if backend == config.BACKEND_FS:
+            return None
+        if backend != config.BACKEND_SQLITE:
+            raise ValueError(f"Unknown state backend: {backend}")
+
+        index = StateIndex(self._hapless_dir)
+        if not index.path.exists():
+            # NOTE: import directory-per-hap state created without the index
+            self._migrate(index)
+        return index
+
+    def _migrate(self, index: StateIndex) -> None:
+        haps = [Hap(self._hapless_dir / dir) for dir in self._get_hap_dirs()]
+        index.upsert_many(map(hap_to_record, haps))
+        logger.debug(f"Imported {len(haps)} haps into the state index")
+
+    def _load_hap(self, hid: str) -> Hap:
+        return Hap(self._hapless_dir / hid, index=self._index)
+
+    def stats(self, haps: List[Hap], formatter: "Formatter"):
         self.ui.stats(haps, formatter=formatter)
 
-    def show(self, hap: Hap, formatter: Formatter):
+    def watch_stats(
+        self,
+        formatter: "TableFormatter",
+        interval: float = 1.0,
+        active_only: bool = False,
+    ):
+        """
+        Refresh the haps table every interval until interrupted. Snapshots are
+        cached, so only running and changed haps are read on every refresh.
+        """
+        cache = SnapshotCache(self._hapless_dir)
+        try:
+            self.ui.watch_stats(
+                cache, formatter=formatter, interval=interval, active_only=active_only
+            )
+        except KeyboardInterrupt:
+            pass
+
+    def show_samples(self, hap: Hap) -> None:
+        """
+        Print summary of the resources used by the hap over its lifetime.
+        """
+        from hapless.sampling import Samples
+
+        samples = Samples.read(hap.samples_path)
+        if not samples:
+            self.ui.error("No samples recorded, run hap with --sample-interval")
+            sys.exit(1)
+        self.ui.show_samples(hap, samples)
+
+    def show(self, hap: Hap, formatter: "Formatter"):
         self.ui.show_one(hap, formatter=formatter)
 
     @property
@@ -69,20 +182,58 @@ class Hapless:
         return names
 
     def _get_next_hap_id(self) -> str:
-        dirs = self._get_hap_dirs()
-        next_num = 1 if not dirs else int(dirs[-1]) + 1
-        return f"{next_num}"
+        return self._reserve_hap_ids()[0]
+
+    def _reserve_hap_ids(self, count: int = 1) -> List[str]:
+        """
+        Reserve consecutive hap ids using a counter file shared between processes.
+        State directory is scanned only when the counter is missing or broken.
+        """
+        counter_file = self._hapless_dir / ".next_hid"
+        with file_lock(self._hapless_dir / ".next_hid.lock"):
+            try:
+                next_num = int(counter_file.read_text())
+            except (FileNotFoundError, ValueError):
+                dirs = self._get_hap_dirs()
+                next_num = 1 if not dirs else int(dirs[-1]) + 1
+            counter_file.write_text(f"{next_num + count}")
+        return [f"{num}" for num in range(next_num, next_num + count)]
+
+    def _make_hap_dir(self, hid: Optional[str] = None) -> Path:
+        if hid is not None:
+            hap_dir = self._hapless_dir / f"{hid}"
+            hap_dir.mkdir()
+            return hap_dir
+
+        while True:
+            hap_dir = self._hapless_dir / self._get_next_hap_id()
+            try:
+                hap_dir.mkdir()
+                return hap_dir
+            except FileExistsError:
+                # NOTE: id was taken by the hap created with an explicit id
+                logger.debug(f"Hap directory {hap_dir} already exists, retrying")
 
     def get_hap(self, hap_alias: str) -> Optional[Hap]:
-        dirs = self._get_hap_dirs()
         # Check by hap id
-        if hap_alias in dirs:
-            return Hap(self._hapless_dir / hap_alias)
+        if hap_alias.isdigit() and (self._hapless_dir / hap_alias).is_dir():
+            return self._load_hap(hap_alias)
 
         # Check by hap name
-        names_map = self._get_hap_names_map()
-        if hap_alias in names_map:
-            return Hap(self._hapless_dir / names_map[hap_alias])
+        hid = self._names.get(hap_alias)
+        hap = self._load_named_hap(hap_alias, hid)
+        if hid is not None and hap is None:
+            # NOTE: index is out of sync with the state directory
+            logger.warning(f"Name index entry for {hap_alias} is stale, rebuilding")
+            self._names.rebuild()
+            hap = self._load_named_hap(hap_alias, self._names.get(hap_alias))
+        return hap
+
+    def _load_named_hap(self, name: str, hid: Optional[str]) -> Optional[Hap]:
+        if hid is None or not (self._hapless_dir / hid).is_dir():
+            return None
+        hap = self._load_hap(hid)
+        return hap if hap.raw_name is not None and hap.name == name else None
 
     def _get_all_haps(self) -> List[Hap]:
         """
@@ -93,11 +244,38 @@ class Hapless:
         if not self._hapless_dir.exists():
             return haps
 
+        if self._index is not None:
+            return self._get_indexed_haps()
+
         for dir in self._get_hap_dirs():
-            hap_path = self._hapless_dir / dir
-            haps.append(Hap(hap_path))
+            haps.append(self._load_hap(dir))
         return haps
 
+    def _get_indexed_haps(self) -> List[Hap]:
+        """
+        Build haps from the index records, reconciling index with directories
+        created or removed without it.
+        """
+        index = cast(StateIndex, self._index)
+        records = {record["hid"]: record for record in index.all()}
+        dirs = self._get_hap_dirs()
+
+        missing = [self._load_hap(dir) for dir in dirs if dir not in records]
+        if missing:
+            logger.debug(f"Adding {len(missing)} haps missing from the index")
+            index.upsert_many(map(hap_to_record, missing))
+            records.update((hap.hid, index.get(hap.hid)) for hap in missing)
+
+        stale = set(records) - set(dirs)
+        if stale:
+            logger.debug(f"Removing {len(stale)} stale haps from the index")
+            index.delete(stale)
+
+        return [
+            Hap(self._hapless_dir / dir, index=self._index, record=records[dir])
+            for dir in dirs
+        ]
+
     def get_haps(self, accessible_only=True) -> List[Hap]:
         """
         Get all haps that are managable by the current user.
@@ -119,31 +297,200 @@ class Hapless:
         name: Optional[str] = None,
         *,
         redirect_stderr: Optional[bool] = None,
+        log_options: Optional[LogOptions] = None,
+        run_options: Optional[RunOptions] = None,
     ) -> Hap:
-        hid = hid or self._get_next_hap_id()
-        hap_dir = self._hapless_dir / f"{hid}"
-        hap_dir.mkdir()
+        hap = self._init_hap(
+            self._make_hap_dir(hid),
+            cmd=cmd,
+            env=env,
+            workdir=workdir,
+            name=name,
+            redirect_stderr=redirect_stderr,
+            log_options=log_options,
+            run_options=run_options,
+        )
+        if self._index is not None:
+            self._index.upsert(hap_to_record(hap))
+        return hap
+
+    def create_haps(
+        self,
+        specs: Sequence[HapSpec],
+        log_options: Optional[LogOptions] = None,
+        run_options: Optional[RunOptions] = None,
+        spread: bool = False,
+    ) -> List[Hap]:
+        """
+        Create haps for all the specs in one pass reserving their ids at once.
+        Specs with names already taken are reported and skipped.
+        With `spread` set each hap is pinned to a single CPU taken round-robin
+        from the ones given within run options or available to the process.
+        """
+        cpus = cycle((run_options or {}).get("cpus") or get_available_cpus())
+        haps = []
+        for spec, hid in zip(specs, self._reserve_hap_ids(len(specs))):
+            hap_run_options = run_options
+            if spread:
+                hap_run_options = cast(
+                    RunOptions, {**(run_options or {}), "cpus": [next(cpus)]}
+                )
+            try:
+                hap_dir = self._make_hap_dir(hid)
+            except FileExistsError:
+                hap_dir = self._make_hap_dir()
+            try:
+                hap = self._init_hap(
+                    hap_dir,
+                    cmd=spec["cmd"],
+                    env=spec.get("env"),
+                    workdir=spec.get("workdir"),
+                    name=spec.get("name"),
+                    log_options=log_options,
+                    run_options=hap_run_options,
+                )
+            except FileExistsError as e:
+                self.ui.error(f"{e}")
+                continue
+            haps.append(hap)
+
+        if self._index is not None and haps:
+            self._index.upsert_many(map(hap_to_record, haps))
+        return haps
+
+    def _init_hap(
+        self,
+        hap_dir: Path,
+        cmd: str,
+        env: Optional[Dict[str, str]] = None,
+        workdir: Optional[Union[str, Path]] = None,
+        name: Optional[str] = None,
+        redirect_stderr: Optional[bool] = None,
+        log_options: Optional[LogOptions] = None,
+        run_options: Optional[RunOptions] = None,
+    ) -> Hap:
+        if name is not None:
+            try:
+                self._names.claim(name.split(config.RESTART_DELIM)[0], hap_dir.name)
+            except FileExistsError:
+                shutil.rmtree(hap_dir, ignore_errors=True)
+                raise
         if redirect_stderr is None:
             redirect_stderr = config.REDIRECT_STDERR
         if workdir is None or not Path(workdir).exists():
             workdir = os.getcwd()
         if env is None:
             env = dict(os.environ)
-        return Hap(
+        hap = Hap(
             hap_dir,
             name=name,
             cmd=cmd,
             env=env,
             workdir=workdir,
             redirect_stderr=redirect_stderr,
+            log_options=log_options,
+            run_options=run_options,
+            index=self._index,
         )
+        if name is None:
+            self._names.set(hap.name, hap.hid)
+        return hap
 
     def _wrap_subprocess(self, hap: Hap):
+        log_options = hap.log_options
+        run_options = hap.run_options or {}
+        sample_interval = run_options.get("sample_interval")
+        with self._admitted(hap, run_options):
+            started = time.monotonic()
+            proc = self._start_subprocess(hap, capture=is_pumped(log_options))
+        sampler = None
+        if sample_interval:
+            from hapless.sampling import Sampler
+
+            sampler = Sampler(proc.pid, hap.samples_path, sample_interval)
+            sampler.start()
+        if is_pumped(log_options):
+            self._pump_logs(hap, proc, cast(LogOptions, log_options))
+        retcode, exit_record = self._wait_subprocess(proc, started)
+        if sampler is not None:
+            sampler.stop()
+        hap.set_return_code(retcode, exit_record)
+        queue = run_options.get("queue")
+        if queue is not None:
+            # NOTE: slot of the hap is free now, so the next one can be started
+            self.dispatch(self.get_queue(queue))
+
+    @contextmanager
+    def _admitted(self, hap: Hap, run_options: RunOptions) -> Iterator[None]:
+        """
+        Keep the hap unbound until the machine is ready to run it.
+        """
+        if not has_admission_rules(run_options):
+            yield
+            return
+
+        queue = run_options.get("queue")
+
+        def on_hold(reason: str) -> None:
+            if hap.held_reason is None:
+                logger.info(f"Hap {hap} is held back: {reason}")
+            hap.set_held_reason(reason)
+            if queue is not None:
+                # NOTE: waiting hap keeps its slot, so it is not queued again
+                self.get_queue(queue).touch(hap.hid)
+
+        with admitted(self._hapless_dir, run_options, on_hold=on_hold):
+            yield
+        hap.set_held_reason(None)
+
+    @staticmethod
+    def _wait_subprocess(
+        proc: subprocess.Popen, started: float
+    ) -> Tuple[int, Optional[ExitRecord]]:
+        """
+        Reap the process collecting its resource usage along the way.
+        """
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            # NOTE: process has been reaped elsewhere, so its usage is lost
+            return proc.wait(), None
+        finished = time.monotonic()
+        # NOTE: let `subprocess` know the child is gone already
+        proc.returncode = get_return_code(status)
+        return proc.returncode, get_exit_record(status, rusage, started, finished)
+
+    def _pump_logs(
+        self, hap: Hap, proc: subprocess.Popen, log_options: LogOptions
+    ) -> None:
+        outputs = {
+            cast(BinaryIO, proc.stdout): get_log_writer(hap.stdout_path, log_options)
+        }
+        if proc.stderr is not None:
+            outputs[proc.stderr] = get_log_writer(hap.stderr_path, log_options)
+        pump_output(proc, outputs)
+
+    def _start_subprocess(
+        self, hap: Hap, *, new_session: bool = False, capture: bool = False
+    ) -> subprocess.Popen:
+        """
+        Start hap command in a child process of the current one and bind
+        hap to it. Waiting for the child is up to the caller.
+        With `capture` set the output is available through the pipes instead
+        of being written into the log files directly.
+        """
+        stdout_pipe: Union[int, IO] = subprocess.PIPE
+        stderr_pipe: Union[int, IO] = subprocess.PIPE
+        if hap.redirect_stderr:
+            stderr_pipe = subprocess.STDOUT
         try:
-            stdout_pipe = open(hap.stdout_path, "w")
-            stderr_pipe = stdout_pipe
-            if not hap.redirect_stderr:
-                stderr_pipe = open(hap.stderr_path, "w")
+            if not capture and (hap.log_options or {}).get("mode") == "null":
+                stdout_pipe = stderr_pipe = subprocess.DEVNULL
+            elif not capture:
+                stdout_pipe = open(hap.stdout_path, "w")
+                stderr_pipe = stdout_pipe
+                if not hap.redirect_stderr:
+                    stderr_pipe = open(hap.stderr_path, "w")
             shell_exec = os.getenv("SHELL")
             if shell_exec is not None:
                 logger.debug(f"Using {shell_exec} to run hap")
@@ -155,18 +502,19 @@ class Hapless:
                 executable=shell_exec,
                 stdout=stdout_pipe,
                 stderr=stderr_pipe,
+                start_new_session=new_session,
+                preexec_fn=get_preexec_fn(hap.run_options),
             )
-
-            pid = proc.pid
-            logger.debug(f"Attaching hap {hap} to pid {pid}")
-            hap.bind(pid)
-
-            retcode = proc.wait()
         finally:
-            stdout_pipe.close()
-            stderr_pipe.close()
+            # NOTE: child process has its own copies of the descriptors
+            for pipe in (stdout_pipe, stderr_pipe):
+                if not isinstance(pipe, int):
+                    pipe.close()
 
-        hap.set_return_code(retcode)
+        pid = proc.pid
+        logger.debug(f"Attaching hap {hap} to pid {pid}")
+        hap.bind(pid)
+        return proc
 
     def _check_fast_failure(self, hap: Hap) -> None:
         timeout = config.FAILFAST_TIMEOUT
@@ -193,8 +541,13 @@ class Hapless:
             )
         else:
             # non-zero return code
+            if (hap.log_options or {}).get("mode") == "null":
+                self.ui.error("Hap exited too quickly, its output is discarded")
+                sys.exit(1)
             self.ui.error("Hap exited too quickly. stderr message:")
-            self.ui.print(hap.stderr_path.read_text())
+            # NOTE: ring log is not a plain text file, so read it as logs do
+            stderr = b"".join(iter_log(hap.stderr_path))
+            self.ui.print(stderr.decode(errors="replace"))
             sys.exit(1)
 
     def run_hap(
@@ -214,20 +567,184 @@ class Hapless:
             self._wrap_subprocess(hap)
             return
 
+        queue = (hap.run_options or {}).get("queue")
+        if queue is not None:
+            self.enqueue([hap], self.get_queue(queue))
+            return
+
         self.ui.print(f"{config.ICON_INFO} Launching", hap)
-        # TODO: or sys.platform == "win32"
-        if config.NO_FORK:
-            logger.debug("Forking is disabled, running using spawn")
-            self._run_via_spawn(hap)
-        else:
-            logger.debug("Running hap using fork")
-            self._run_via_fork(hap)
+        self._launch(hap)
 
         logger.debug(f"Parent process continues with pid {os.getpid()}")
         if check:
             self._check_fast_failure(hap)
 
-    def _run_via_spawn(self, hap: Hap) -> None:
+    def run_many(
+        self,
+        specs: Iterable[HapSpec],
+        *,
+        stagger: float = 0.0,
+        max_in_flight: Optional[int] = None,
+        log_options: Optional[LogOptions] = None,
+        run_options: Optional[RunOptions] = None,
+        spread: bool = False,
+    ) -> List[Hap]:
+        """
+        Create haps for all the specs at once and launch them one by one.
+        Waits `stagger` seconds between launches and keeps at most
+        `max_in_flight` haps of this batch running at the same time.
+        """
+        haps = self.create_haps(
+            list(specs),
+            log_options=log_options,
+            run_options=run_options,
+            spread=spread,
+        )
+        queue = (run_options or {}).get("queue")
+        if queue is not None:
+            self.enqueue(haps, self.get_queue(queue))
+            return haps
+
+        in_flight: List[Hap] = []
+        for num, hap in enumerate(haps):
+            if num and stagger:
+                time.sleep(stagger)
+            while max_in_flight is not None and len(in_flight) >= max_in_flight:
+                self._wait_child()
+                in_flight = [h for h in in_flight if not h._rc_file.exists()]
+            self._launch(hap)
+            in_flight.append(hap)
+            self._reap_children()
+
+        self.ui.print(
+            f"{config.ICON_INFO} Launched {len(haps)} haps",
+            style=f"{config.COLOR_MAIN} bold",
+        )
+        return haps
+
+    def get_queue(self, name: str) -> JobQueue:
+        return JobQueue(self._hapless_dir, name)
+
+    def enqueue(self, haps: List[Hap], queue: JobQueue) -> None:
+        """
+        Put the haps into the queue and start as many as there are free slots.
+        """
+        queue.push(haps)
+        if len(haps) == 1:
+            self.ui.print(f"{config.ICON_INFO} Queued", haps[0], f"into {queue.name}")
+        else:
+            self.ui.print(
+                f"{config.ICON_INFO} Queued {len(haps)} haps into {queue.name}",
+                style=f"{config.COLOR_MAIN} bold",
+            )
+        self.dispatch(queue)
+
+    def dispatch(self, queue: JobQueue) -> List[Hap]:
+        """
+        Start the next haps from the queue while it has free slots.
+        Called whenever a hap is queued or a queued one finishes, so there is
+        no process watching the queue in between.
+        """
+
+        def get_status(hid: str) -> Optional[Status]:
+            hap = self.get_hap(hid)
+            return hap.status if hap is not None else None
+
+        started = []
+        try:
+            hids = queue.claim(get_status)
+        except OSError as e:
+            logger.error(f"Cannot dispatch haps from {queue.name} queue: {e}")
+            return started
+        for hid in hids:
+            hap = self.get_hap(hid)
+            if hap is None:
+                continue
+            logger.debug(f"Dispatching hap {hap} from {queue.name} queue")
+            self._launch(hap)
+            started.append(hap)
+        self._reap_children()
+        return started
+
+    @staticmethod
+    def _needs_wrapper(hap: Hap) -> bool:
+        run_options = hap.run_options or {}
+        # NOTE: wrapper starts the next queued hap once its own one finishes
+        # and holds the hap back until it passes admission
+        return (
+            is_pumped(hap.log_options)
+            or bool(run_options.get("sample_interval"))
+            or "queue" in run_options
+            or has_admission_rules(run_options)
+        )
+
+    def _launch(self, hap: Hap) -> int:
+        """
+        Start the hap and return pid of the process taking care of it.
+        """
+        # NOTE: supervisor neither pumps output nor samples the haps it runs
+        if config.SUPERVISOR and not self._needs_wrapper(hap):
+            pid = self._run_via_supervisor(hap)
+            if pid is not None:
+                return pid
+            logger.warning("Supervisor is not available, running using wrapper")
+
+        # TODO: or sys.platform == "win32"
+        if config.NO_FORK and config.LAUNCHER:
+            logger.debug("Forking is disabled, running using launcher")
+            return self._run_via_launcher(hap)
+
+        if config.NO_FORK:
+            logger.debug("Forking is disabled, running using spawn")
+            return self._run_via_spawn(hap)
+
+        logger.debug("Running hap using fork")
+        return self._run_via_fork(hap)
+
+    @staticmethod
+    def _wait_child() -> None:
+        try:
+            os.waitpid(-1, 0)
+        except ChildProcessError:
+            # NOTE: children might be already reaped by `subprocess` module
+            time.sleep(0.1)
+
+    @staticmethod
+    def _reap_children() -> None:
+        """
+        Collect exited wrappers, so launching many haps leaves no zombies.
+        """
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+    def _run_via_supervisor(self, hap: Hap) -> Optional[int]:
+        try:
+            pid = request_launch(self._hapless_dir, hap.hid, supervise=True)
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Cannot launch via supervisor: {e}")
+            return None
+        if pid is not None:
+            logger.debug(f"Supervisor started hap with pid {pid}")
+        return pid
+
+    def _run_via_launcher(self, hap: Hap) -> int:
+        try:
+            pid = request_launch(self._hapless_dir, hap.hid)
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Cannot launch via launcher: {e}")
+            pid = None
+        if pid is None:
+            logger.warning("Launcher is not available, running using spawn")
+            return self._run_via_spawn(hap)
+        logger.debug(f"Launcher started wrapper with pid {pid}")
+        return pid
+
+    def _run_via_spawn(self, hap: Hap) -> int:
         exec_path = get_exec_path()
         proc = subprocess.Popen(
             [f"{exec_path}", "__internal_wrap_hap", f"{hap.hid}"],
@@ -238,8 +755,9 @@ class Hapless:
         )
         logger.debug(f"Running subprocess in child with pid {proc.pid}")
         logger.debug(f"Using executable at {exec_path}")
+        return proc.pid
 
-    def _run_via_fork(self, hap: Hap) -> None:
+    def _run_via_fork(self, hap: Hap) -> int:
         pid = os.fork()
         if pid == 0:
             os.setsid()
@@ -248,6 +766,7 @@ class Hapless:
             # NOTE: to prevent deadlocks in multi-threaded environments
             # https://docs.python.org/3/library/os.html#os._exit
             os._exit(0)
+        return pid
 
     def run_command(
         self,
@@ -259,6 +778,8 @@ class Hapless:
         check: bool = False,
         *,
         redirect_stderr: Optional[bool] = None,
+        log_options: Optional[LogOptions] = None,
+        run_options: Optional[RunOptions] = None,
         blocking: bool = False,
     ) -> None:
         """
@@ -272,6 +793,8 @@ class Hapless:
             hid=hid,
             name=name,
             redirect_stderr=redirect_stderr,
+            log_options=log_options,
+            run_options=run_options,
         )
         self.run_hap(hap, check=check, blocking=blocking)
 
@@ -293,31 +816,172 @@ class Hapless:
             self.ui.error(f"Cannot resume. Hap {hap} is not suspended")
             sys.exit(1)
 
-    def logs(self, hap: Hap, stderr: bool = False, follow: bool = False):
+    def logs(
+        self,
+        hap: Hap,
+        stderr: bool = False,
+        follow: bool = False,
+        *,
+        lines: Optional[int] = None,
+        nbytes: Optional[int] = None,
+        offset: Optional[int] = None,
+        length: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        from_line: Optional[int] = None,
+        raw: Optional[bool] = None,
+    ):
+        """
+        Output logs of the hap. Raw mode copies bytes as is without decoding,
+        by default it is used when output is not a terminal.
+        Time range and line number are looked up in the timestamps index.
+        """
         filepath = hap.stderr_path if stderr else hap.stdout_path
         if follow:
             self.ui.print(
                 f"{config.ICON_INFO} Streaming {filepath} file...",
                 style=f"{config.COLOR_MAIN} bold",
             )
-            return subprocess.run(["tail", "-f", filepath])
+            return self.follow_logs([hap], stderr=stderr, prefixed=False)
 
-        text = filepath.read_text()
-        if not text:
+        if since is not None or until is not None or from_line is not None:
+            try:
+                offset, length = find_range(
+                    filepath, since=since, until=until, from_line=from_line
+                )
+            except ValueError as e:
+                self.ui.error(f"{e}")
+                sys.exit(1)
+
+        log_range: Dict[str, Optional[int]] = dict(
+            lines=lines, nbytes=nbytes, offset=offset, length=length
+        )
+        if raw is None:
+            raw = not self.ui.console.is_terminal
+        if raw:
+            return self._dump_raw(filepath, **log_range)
+
+        chunks = iter_log(filepath, **log_range)
+
+        # NOTE: blocks might split multibyte characters, so decode incrementally
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        last_chunk = b""
+        for chunk in chunks:
+            if not last_chunk:
+                self.ui.print(
+                    f"{config.ICON_INFO} Showing logs at {filepath}",
+                    style=f"{config.COLOR_MAIN} bold",
+                )
+            last_chunk = chunk
+            self.ui.print_plain(decoder.decode(chunk), end="")
+
+        if not last_chunk:
             self.ui.error("No logs found")
             return
+        end = "" if last_chunk.endswith(b"\n") else "\n"
+        self.ui.print_plain(decoder.decode(b"", final=True), end=end)
 
-        self.ui.print(
-            f"{config.ICON_INFO} Showing logs at {filepath}",
-            style=f"{config.COLOR_MAIN} bold",
-        )
-        self.ui.print_plain(text)
+    def _dump_raw(self, filepath: Path, **log_range: Optional[int]) -> None:
+        if self.ui.disable:
+            return
+        out = self.ui.console.file
+        out.flush()
+        try:
+            fd = out.fileno()
+        except (AttributeError, OSError, ValueError):
+            # NOTE: output is replaced with an in-memory stream
+            buffer = getattr(out, "buffer", None)
+            for chunk in iter_log(filepath, **log_range):
+                if buffer is not None:
+                    buffer.write(chunk)
+                else:
+                    out.write(chunk.decode(errors="replace"))
+            return
+
+        try:
+            copy_log(filepath, fd, **log_range)
+        except BrokenPipeError:
+            # Reader has gone away, e.g. output is piped into `head`
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, fd)
+
+    def follow_logs(
+        self, haps: List[Hap], stderr: bool = False, prefixed: bool = True
+    ) -> None:
+        """
+        Print new log lines of all the haps until every one of them finishes.
+        """
+        from hapless.follow import LogFollower
+
+        width = max(len(hap.name) for hap in haps)
+        prefixes = {hap.hid: f"{hap.name:<{width}} |" for hap in haps}
+        try:
+            for hap, line in LogFollower(haps, stderr=stderr):
+                if prefixed:
+                    self.ui.print_prefixed(prefixes[hap.hid], line)
+                else:
+                    self.ui.print_plain(line)
+        except KeyboardInterrupt:
+            pass
+
+    def merge_logs(self, haps: List[Hap], stderr: bool = False) -> None:
+        """
+        Print output of the haps interleaved in the order it was captured.
+        Lines of stderr are marked with `!` instead of `|` after the hap name.
+        """
+        width = max(len(hap.name) for hap in haps)
+        kinds = (True,) if stderr else (False, True)
+        streams = [(hap, err) for hap in haps for err in kinds]
+        paths = [hap.stderr_path if err else hap.stdout_path for hap, err in streams]
+        prefixes = [
+            f"{hap.name:<{width}} {'!' if err else '|'}" for hap, err in streams
+        ]
+        for number, line in merge_logs(paths):
+            self.ui.print_prefixed(prefixes[number], line.decode(errors="replace"))
+
+    def grep(
+        self,
+        haps: List[Hap],
+        pattern: str,
+        *,
+        stderr: bool = False,
+        ignore_case: bool = False,
+        mode: str = "lines",
+        jobs: Optional[int] = None,
+    ) -> bool:
+        """
+        Print lines of the haps logs matching the regular expression as
+        `hid:line:text`, only hap ids in files mode or `hid:count` in count mode.
+        Return whether anything has matched.
+        """
+        from hapless.grep import grep_logs
+
+        paths = {
+            hap.hid: hap.stderr_path if stderr else hap.stdout_path for hap in haps
+        }
+        flags = re.IGNORECASE if ignore_case else 0
+        found = False
+        for hid, count, matches in grep_logs(
+            paths, pattern.encode(), flags=flags, mode=mode, jobs=jobs
+        ):
+            found = found or count > 0
+            if mode == "count":
+                self.ui.print_plain(f"{hid}:{count}")
+            elif mode == "files" and count:
+                self.ui.print_plain(hid)
+            for line_no, line in matches:
+                self.ui.print_plain(f"{hid}:{line_no}:{line.decode(errors='replace')}")
+        return found
 
     def _clean_haps(self, filter_haps) -> int:
         haps = list(filter(filter_haps, self.get_haps()))
+        names = {hap.name: hap.hid for hap in haps}
         for hap in haps:
             logger.debug(f"Removing {hap.path}")
             shutil.rmtree(hap.path, ignore_errors=True)
+        if self._index is not None and haps:
+            self._index.delete(hap.hid for hap in haps)
+        self._names.remove_many(names)
         return len(haps)
 
     def _clean_one(self, hap: Hap):
@@ -378,14 +1042,14 @@ class Hapless:
             hap.restarts,
             hap.redirect_stderr,
         )
-        if hap.active:
+        log_options, run_options = hap.log_options, hap.run_options
+        proc = hap.proc
+        if proc is not None:
             self.kill([hap], verbose=False)
+            # NOTE: blocks on the process exit instead of polling its status
+            wait_exited(proc)
 
         hap_killed = cast(Hap, self.get_hap(hid))
-        while hap_killed.active:
-            # NOTE: re-read is required as `proc` is a cached property
-            hap_killed = cast(Hap, self.get_hap(hid))
-
         rc_exists = wait_created(hap_killed._rc_file, timeout=1)
         if not rc_exists:
             logger.error(
@@ -403,6 +1067,8 @@ class Hapless:
             hid=hid,
             name=name,
             redirect_stderr=redirect_stderr,
+            log_options=log_options,
+            run_options=run_options,
         )
 
     def rename_hap(self, hap: Hap, new_name: str):
@@ -410,6 +1076,10 @@ class Hapless:
             f"{config.ICON_INFO} Renamed [{config.COLOR_ACCENT}]{hap.name}[/] "
             f"to [{config.COLOR_MAIN} bold]{new_name}[/]"
         )
+        old_name = hap.name
+        self._names.claim(new_name, hap.hid)
+        if old_name != new_name:
+            self._names.remove(old_name, hap.hid)
         if hap.restarts:
             new_name = f"{new_name}{config.RESTART_DELIM}{hap.restarts}"
         hap.set_name(new_name)
@@ -0,0 +1,153 @@
+import errno
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.parse import quote
+
+from hapless import config
+from hapless.utils import file_lock, logger
+
+# NOTE: keep some room below NAME_MAX for temporary suffixes
+MAX_ENTRY_LENGTH = 200
+
+
+class NameIndex:
+    """
+    Persistent name -> hap id index kept within the state directory.
+    Each entry is a symlink named after the hap pointing to its id, so lookup
+    is a single `readlink` and updates are atomic renames of a single entry.
+    """
+
+    DIRNAME = "names"
+    LOCK_FILENAME = ".names.lock"
+
+    def __init__(
+        self,
+        hapless_dir: Path,
+        get_names_map: Callable[[], Dict[str, str]],
+    ) -> None:
+        self._hapless_dir = hapless_dir
+        self._dir = hapless_dir / self.DIRNAME
+        self._lock_path = hapless_dir / self.LOCK_FILENAME
+        self._get_names_map = get_names_map
+
+    @property
+    def path(self) -> Path:
+        return self._dir
+
+    @staticmethod
+    def _entry(name: str) -> str:
+        # Dots are encoded as well to never clash with `.` and `..` entries
+        entry = quote(name, safe="").replace(".", "%2E")
+        if len(entry) > MAX_ENTRY_LENGTH:
+            entry = f"%{hashlib.sha1(name.encode()).hexdigest()}"
+        return entry
+
+    def _ensure(self) -> None:
+        if not self._dir.is_dir():
+            self.rebuild(force=False)
+
+    def get(self, name: str) -> Optional[str]:
+        self._ensure()
+        try:
+            return os.readlink(self._dir / self._entry(name))
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            # Not a symlink, someone has tampered with the index
+            logger.warning(f"Name index entry for {name} is corrupted")
+            self.rebuild()
+            return self.get(name)
+
+    def set(self, name: str, hid: str) -> None:
+        """
+        Point name to the hap id replacing any previous value.
+        """
+        self._ensure()
+        entry = self._dir / self._entry(name)
+        tmp_entry = self._dir / f".{self._entry(name)[:MAX_ENTRY_LENGTH]}.{os.getpid()}"
+        try:
+            tmp_entry.unlink()
+        except FileNotFoundError:
+            pass
+        os.symlink(hid, tmp_entry)
+        os.replace(tmp_entry, entry)
+
+    def claim(self, name: str, hid: str) -> None:
+        """
+        Atomically point name to the hap id unless it is taken by another hap.
+        """
+        self._ensure()
+        entry = self._dir / self._entry(name)
+        try:
+            os.symlink(hid, entry)
+            return
+        except FileExistsError:
+            pass
+
+        # Entry might be left from the hap removed bypassing the index
+        with file_lock(self._lock_path):
+            try:
+                owner: Optional[str] = os.readlink(entry)
+            except OSError:
+                owner = None
+            if owner is not None and owner != hid and self._is_owner(owner, name):
+                raise FileExistsError(f"Hap with such name already exists: {name}")
+            logger.debug(f"Replacing stale name index entry for {name}")
+            self.set(name, hid)
+
+    def _is_owner(self, hid: str, name: str) -> bool:
+        hap_path = self._hapless_dir / hid
+        if not hap_path.is_dir():
+            return False
+        try:
+            raw_name = (hap_path / "name").read_text().strip()
+        except FileNotFoundError:
+            raw_name = ""
+        if not raw_name:
+            # Hap is being created right now and has not written its name yet
+            return True
+        return raw_name.split(config.RESTART_DELIM)[0] == name
+
+    def remove(self, name: str, hid: Optional[str] = None) -> None:
+        """
+        Remove the name, optionally only when it still points to the hap id.
+        """
+        entry = self._dir / self._entry(name)
+        try:
+            if hid is not None and os.readlink(entry) != hid:
+                return
+            entry.unlink()
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    def remove_many(self, names: Dict[str, str]) -> None:
+        for name, hid in names.items():
+            self.remove(name, hid)
+
+    def rebuild(self, force: bool = True) -> None:
+        """
+        Recreate the whole index from the names stored in hap directories.
+        """
+        with file_lock(self._lock_path):
+            if not force and self._dir.is_dir():
+                # Index has been created concurrently while waiting for the lock
+                return
+            names_map = self._get_names_map()
+            tmp_dir = self._dir.with_name(f".{self.DIRNAME}.{os.getpid()}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            tmp_dir.mkdir()
+            for name, hid in names_map.items():
+                os.symlink(hid, tmp_dir / self._entry(name))
+
+            old_dir = self._dir.with_name(f".{self.DIRNAME}.old.{os.getpid()}")
+            shutil.rmtree(old_dir, ignore_errors=True)
+            if self._dir.exists():
+                os.replace(self._dir, old_dir)
+            os.replace(tmp_dir, self._dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        logger.debug(f"Rebuilt name index with {len(names_map)} entries")
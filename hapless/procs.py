@@ -0,0 +1,361 @@
+import os
+import pwd
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import psutil
+
+from hapless.utils import logger
+
+PROC_DIR = "/proc"
+# NOTE: process start time is derived from the boot time with a second
+# precision, so allow some slack when comparing it with the file timestamps
+START_TIME_TOLERANCE = 1.0
+
+
+class ProcInfo:
+    """
+    Details of a running process collected in a single pass.
+    """
+
+    __slots__ = ("pid", "ppid", "stopped", "create_time", "username")
+
+    def __init__(
+        self,
+        pid: int,
+        ppid: int,
+        stopped: bool,
+        create_time: float,
+        username: str,
+    ) -> None:
+        self.pid = pid
+        self.ppid = ppid
+        self.stopped = stopped
+        self.create_time = create_time
+        self.username = username
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} pid={self.pid} ppid={self.ppid}>"
+
+
+def is_same_process(create_time: float, started_at: Optional[float]) -> bool:
+    """
+    Hap records its pid right after the process is created, so a process
+    created later than that has merely reused the pid.
+    """
+    if started_at is None:
+        return True
+    return create_time <= started_at + START_TIME_TOLERANCE
+
+
+def _get_username(uid: int, cache: Dict[int, str]) -> str:
+    if uid not in cache:
+        try:
+            cache[uid] = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            cache[uid] = f"{uid}"
+    return cache[uid]
+
+
+def _read_stat_fields(pid: int) -> Optional[List[bytes]]:
+    """
+    Fields of /proc/<pid>/stat starting from the state, i.e. the third one.
+    """
+    try:
+        with open(f"{PROC_DIR}/{pid}/stat", "rb") as f:
+            data = f.read()
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    # Command name might contain spaces and parentheses, so skip up to the last one
+    return data[data.rfind(b")") + 2 :].split()
+
+
+def _read_stat(pid: int, boot_time: float, clock_ticks: int) -> Optional[tuple]:
+    fields = _read_stat_fields(pid)
+    try:
+        uid = os.stat(f"{PROC_DIR}/{pid}").st_uid
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    if fields is None:
+        return None
+    state, ppid, start_ticks = fields[0], int(fields[1]), int(fields[19])
+    create_time = boot_time + start_ticks / clock_ticks
+    return state == b"T", ppid, create_time, uid
+
+
+def _probe_proc(pids: Iterable[int]) -> Dict[int, ProcInfo]:
+    boot_time = psutil.boot_time()
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    usernames: Dict[int, str] = {}
+    result = {}
+    for pid in pids:
+        stat = _read_stat(pid, boot_time, clock_ticks)
+        if stat is None:
+            continue
+        stopped, ppid, create_time, uid = stat
+        username = _get_username(uid, usernames)
+        result[pid] = ProcInfo(pid, ppid, stopped, create_time, username)
+    return result
+
+
+def _probe_psutil(pids: Iterable[int]) -> Dict[int, ProcInfo]:
+    wanted = set(pids)
+    attrs = ["pid", "ppid", "status", "create_time", "username"]
+    result = {}
+    for proc in psutil.process_iter(attrs=attrs, ad_value=None):
+        info = proc.info
+        if info["pid"] not in wanted or info["create_time"] is None:
+            continue
+        result[info["pid"]] = ProcInfo(
+            info["pid"],
+            info["ppid"],
+            info["status"] == psutil.STATUS_STOPPED,
+            info["create_time"],
+            info["username"] or "",
+        )
+    return result
+
+
+def probe_processes(pids: Iterable[int]) -> Dict[int, ProcInfo]:
+    """
+    Collect details of all the given processes at once.
+    Processes which do not exist are missing from the result.
+    """
+    pids = list(pids)
+    if not pids:
+        return {}
+    if os.path.isdir(f"{PROC_DIR}/self"):
+        return _probe_proc(pids)
+    logger.debug("No procfs available, probing processes with psutil")
+    return _probe_psutil(pids)
+
+
+def get_children_map() -> Dict[int, List[int]]:
+    """
+    Children of every process collected in a single pass over procfs.
+    """
+    children: Dict[int, List[int]] = {}
+    for name in os.listdir(PROC_DIR):
+        if not name.isdigit():
+            continue
+        fields = _read_stat_fields(int(name))
+        if fields is not None:
+            children.setdefault(int(fields[1]), []).append(int(name))
+    return children
+
+
+def _read_task_children(pid: int) -> List[int]:
+    children = []
+    try:
+        tids = os.listdir(f"{PROC_DIR}/{pid}/task")
+    except FileNotFoundError:
+        return children
+    # NOTE: each thread lists only the children it has created itself
+    for tid in tids:
+        try:
+            with open(f"{PROC_DIR}/{pid}/task/{tid}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+        except FileNotFoundError:
+            continue
+    return children
+
+
+def get_process_tree(pid: int) -> List[int]:
+    """
+    Pids of the process and all of its descendants.
+    Children are read directly from the process when the kernel exposes them,
+    otherwise from a single scan of all the processes.
+    """
+    children_map: Optional[Dict[int, List[int]]] = None
+    if not os.path.exists(f"{PROC_DIR}/{pid}/task/{pid}/children"):
+        children_map = get_children_map()
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        if children_map is None:
+            stack.extend(_read_task_children(current))
+        else:
+            stack.extend(children_map.get(current, []))
+    return tree
+
+
+def _tree_usage_psutil(pid: int) -> Optional[Tuple[float, int, int]]:
+    try:
+        root = psutil.Process(pid)
+        procs = [root, *root.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return None
+    cpu_time, rss, threads = 0.0, 0, 0
+    for proc in procs:
+        try:
+            with proc.oneshot():
+                times = proc.cpu_times()
+                rss += proc.memory_info().rss
+                threads += proc.num_threads()
+        except psutil.NoSuchProcess:
+            continue
+        cpu_time += times.user + times.system + times.children_user
+        cpu_time += times.children_system
+    return cpu_time, rss, threads
+
+
+def get_tree_usage(pid: int) -> Optional[Tuple[float, int, int]]:
+    """
+    CPU time in seconds, RSS in bytes and number of threads summed over the
+    process tree. CPU time includes the children reaped already, so it never
+    decreases. None if the process is gone.
+    """
+    if not os.path.isdir(f"{PROC_DIR}/{pid}"):
+        if os.path.isdir(f"{PROC_DIR}/self"):
+            return None
+        return _tree_usage_psutil(pid)
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    ticks, rss, threads = 0, 0, 0
+    for child in get_process_tree(pid):
+        fields = _read_stat_fields(child)
+        if fields is None:
+            if child == pid:
+                return None
+            continue
+        # utime, stime, cutime and cstime
+        ticks += sum(int(value) for value in fields[11:15])
+        threads += int(fields[17])
+        rss += int(fields[21]) * page_size
+    return ticks / clock_ticks, rss, threads
+
+
+class TreeUsage:
+    """
+    Resources used by a process together with all of its descendants.
+    """
+
+    __slots__ = ("cpu_time", "cpu_percent", "rss", "uss", "children")
+
+    def __init__(
+        self, cpu_time: float, rss: int, uss: Optional[int], children: int
+    ) -> None:
+        self.cpu_time = cpu_time
+        self.cpu_percent = 0.0
+        self.rss = rss
+        self.uss = uss
+        self.children = children
+
+    def __repr__(self) -> str:
+        return (
+            f"<{self.__class__.__name__} cpu={self.cpu_time:.2f}s "
+            f"rss={self.rss} children={self.children}>"
+        )
+
+
+def _read_uss(pid: int) -> Optional[int]:
+    """
+    Memory private to the process, i.e. the one freed once it exits.
+    """
+    try:
+        with open(f"{PROC_DIR}/{pid}/smaps_rollup", "rb") as f:
+            data = f.read()
+    except OSError:
+        # NOTE: process of another user or a kernel without smaps_rollup
+        return None
+    return sum(
+        int(line.split()[1]) * 1024
+        for line in data.splitlines()
+        if line.startswith((b"Private_Clean:", b"Private_Dirty:"))
+    )
+
+
+def _scan_proc() -> Dict[int, Tuple[int, float, int]]:
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    procs = {}
+    for name in os.listdir(PROC_DIR):
+        if not name.isdigit():
+            continue
+        fields = _read_stat_fields(int(name))
+        if fields is None:
+            continue
+        # utime, stime, cutime and cstime
+        cpu_time = sum(int(value) for value in fields[11:15]) / clock_ticks
+        procs[int(name)] = (int(fields[1]), cpu_time, int(fields[21]) * page_size)
+    return procs
+
+
+def _scan_psutil() -> Dict[int, Tuple[int, float, int]]:
+    attrs = ["pid", "ppid", "cpu_times", "memory_info"]
+    procs = {}
+    for proc in psutil.process_iter(attrs=attrs, ad_value=None):
+        info = proc.info
+        times, memory = info["cpu_times"], info["memory_info"]
+        if times is None or memory is None:
+            continue
+        cpu_time = times.user + times.system
+        cpu_time += times.children_user + times.children_system
+        procs[info["pid"]] = (info["ppid"], cpu_time, memory.rss)
+    return procs
+
+
+def probe_tree_usage(pids: Iterable[int]) -> Dict[int, TreeUsage]:
+    """
+    Resources used by the process trees of all the given processes collected
+    with a single scan of the running processes.
+    Processes which do not exist are missing from the result.
+    """
+    pids = list(pids)
+    if not pids:
+        return {}
+    procfs = os.path.isdir(f"{PROC_DIR}/self")
+    procs = _scan_proc() if procfs else _scan_psutil()
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _, _) in procs.items():
+        children.setdefault(ppid, []).append(pid)
+
+    result = {}
+    for pid in pids:
+        if pid not in procs:
+            continue
+        cpu_time, rss, count = 0.0, 0, -1
+        # NOTE: reading private memory is much slower, so only for the trees
+        uss: Optional[int] = 0 if procfs else None
+        stack = [pid]
+        while stack:
+            current = stack.pop()
+            stack.extend(children.get(current, []))
+            _, proc_cpu_time, proc_rss = procs[current]
+            cpu_time += proc_cpu_time
+            rss += proc_rss
+            count += 1
+            if uss is not None:
+                proc_uss = _read_uss(current)
+                uss = None if proc_uss is None else uss + proc_uss
+        result[pid] = TreeUsage(cpu_time, rss, uss, count)
+    return result
+
+
+class ResourceMonitor:
+    """
+    Probes resources used by the process trees. CPU usage is measured since
+    the previous probe or over the whole process lifetime on the first one.
+    """
+
+    def __init__(self) -> None:
+        self._last: Dict[Tuple[int, float], Tuple[float, float]] = {}
+
+    def probe(self, procs: Iterable[ProcInfo]) -> Dict[int, TreeUsage]:
+        procs = list(procs)
+        now = time.time()
+        usage = probe_tree_usage(proc.pid for proc in procs)
+        last = {}
+        for proc in procs:
+            tree = usage.get(proc.pid)
+            if tree is None:
+                continue
+            key = (proc.pid, proc.create_time)
+            since, cpu_time = self._last.get(key, (proc.create_time, 0.0))
+            elapsed = now - since
+            if elapsed > 0:
+                tree.cpu_percent = max(tree.cpu_time - cpu_time, 0) / elapsed * 100
+            last[key] = (now, tree.cpu_time)
+        self._last = last
+        return usage
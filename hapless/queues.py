@@ -0,0 +1,183 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from hapless.hap import Hap, Status
+from hapless.utils import file_lock, logger
+
+QUEUES_DIRNAME = "queues"
+# NOTE: dispatched hap which is still not bound and has not been touched
+# after that has never been launched
+LAUNCH_TIMEOUT = 30.0
+
+
+def get_default_concurrency() -> int:
+    return os.cpu_count() or 1
+
+
+def _parse_entry(entry: str) -> Tuple[int, int, int]:
+    # Higher priority first, then in the order of enqueueing
+    priority, stamp, hid = entry.split("_")
+    return -int(priority), int(stamp), int(hid)
+
+
+class QueuePosition:
+    """
+    Place of a queued hap among the haps waiting in the same queue.
+    """
+
+    __slots__ = ("queue", "position", "depth")
+
+    def __init__(self, queue: str, position: int, depth: int) -> None:
+        self.queue = queue
+        self.position = position
+        self.depth = depth
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.queue} {self.position}/{self.depth}>"
+
+
+class JobQueue:
+    """
+    Haps waiting for a free slot, persisted within the state directory.
+    Each waiting hap is an empty file named after its priority, time of
+    enqueueing and id, so order is known from a single directory listing.
+    Started haps are moved to the running entries until they finish, which
+    lets any process noticing a hap has finished start the next ones.
+    """
+
+    def __init__(self, hapless_dir: Path, name: str) -> None:
+        self.name = name
+        self.path = hapless_dir / QUEUES_DIRNAME / name
+        self._pending_dir = self.path / "pending"
+        self._running_dir = self.path / "running"
+        self._concurrency_file = self.path / "concurrency"
+        self._lock_path = self.path / ".lock"
+
+    def _ensure(self) -> None:
+        self._pending_dir.mkdir(parents=True, exist_ok=True)
+        self._running_dir.mkdir(exist_ok=True)
+
+    @property
+    def concurrency(self) -> int:
+        try:
+            with open(self._concurrency_file) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return get_default_concurrency()
+
+    def set_concurrency(self, concurrency: int) -> None:
+        self._ensure()
+        tmp_file = self._concurrency_file.with_name(f".concurrency.{os.getpid()}")
+        with open(tmp_file, "w") as f:
+            f.write(f"{concurrency}")
+        os.replace(tmp_file, self._concurrency_file)
+
+    def _list(self, path: Path) -> List[str]:
+        try:
+            return [entry for entry in os.listdir(path) if not entry.startswith(".")]
+        except FileNotFoundError:
+            return []
+
+    def pending(self) -> List[str]:
+        """
+        Ids of the waiting haps in the order they are going to be started.
+        """
+        entries = sorted(self._list(self._pending_dir), key=_parse_entry)
+        return [entry.rsplit("_", 1)[1] for entry in entries]
+
+    def running(self) -> List[str]:
+        return self._list(self._running_dir)
+
+    def touch(self, hid: str) -> None:
+        """
+        Mark the dispatched hap as still being launched, so it keeps its slot.
+        """
+        try:
+            os.utime(self._running_dir / hid)
+        except FileNotFoundError:
+            pass
+
+    def push(self, haps: Iterable[Hap]) -> None:
+        self._ensure()
+        with file_lock(self._lock_path):
+            for hap in haps:
+                priority = (hap.run_options or {}).get("priority", 0)
+                entry = f"{priority}_{time.time_ns()}_{hap.hid}"
+                (self._pending_dir / entry).touch()
+                logger.debug(f"Queued hap {hap.hid} into {self.name} queue")
+
+    def claim(self, get_status: Callable[[str], Optional[Status]]) -> List[str]:
+        """
+        Move as many waiting haps as there are free slots to the running ones
+        and return their ids, so the caller is the only one to start them.
+        Slots of the finished haps are released along the way.
+        """
+        self._ensure()
+        with file_lock(self._lock_path):
+            running = 0
+            for hid in self.running():
+                running += self._check_running(hid, get_status)
+
+            pending = sorted(self._list(self._pending_dir), key=_parse_entry)
+            free = self.concurrency - running
+            claimed: List[str] = []
+            for entry in pending:
+                if len(claimed) >= free:
+                    break
+                hid = entry.rsplit("_", 1)[1]
+                if get_status(hid) is None:
+                    # Hap has been removed while waiting
+                    os.unlink(self._pending_dir / entry)
+                    continue
+                with open(self._running_dir / hid, "w") as f:
+                    f.write(entry)
+                os.unlink(self._pending_dir / entry)
+                claimed.append(hid)
+            return claimed
+
+    def _check_running(
+        self, hid: str, get_status: Callable[[str], Optional[Status]]
+    ) -> int:
+        """
+        Number of slots taken by the running entry, removing it once finished.
+        """
+        path = self._running_dir / hid
+        status = get_status(hid)
+        if status in (Status.RUNNING, Status.PAUSED):
+            return 1
+        if status == Status.UNBOUND:
+            try:
+                with open(path) as f:
+                    entry = f.read()
+                stale = path.stat().st_mtime < time.time() - LAUNCH_TIMEOUT
+            except FileNotFoundError:
+                return 0
+            if not stale:
+                return 1
+            logger.warning(f"Hap {hid} has not been launched, queueing it again")
+            os.replace(path, self._pending_dir / entry)
+            return 0
+        path.unlink(missing_ok=True)
+        return 0
+
+
+def get_queues(hapless_dir: Path) -> List[JobQueue]:
+    try:
+        names = sorted(os.listdir(hapless_dir / QUEUES_DIRNAME))
+    except FileNotFoundError:
+        return []
+    return [JobQueue(hapless_dir, name) for name in names]
+
+
+def get_queue_positions(hapless_dir: Path) -> Dict[str, QueuePosition]:
+    """
+    Positions of all the queued haps by hap id.
+    """
+    positions = {}
+    for queue in get_queues(hapless_dir):
+        pending = queue.pending()
+        for position, hid in enumerate(pending, start=1):
+            positions[hid] = QueuePosition(queue.name, position, len(pending))
+    return positions
@@ -0,0 +1,108 @@
+import math
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from hapless.procs import get_tree_usage
+from hapless.utils import logger
+
+# Sample record: time, CPU percent, RSS in bytes and number of threads
+SAMPLE = struct.Struct("<dfQI")
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+SPARK_WIDTH = 40
+
+
+class Samples:
+    """
+    Columns of the samples recorded for a hap.
+    """
+
+    def __init__(self) -> None:
+        self.times = array("d")
+        self.cpu = array("f")
+        self.rss = array("Q")
+        self.threads = array("I")
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def read(cls, path: Path) -> "Samples":
+        samples = cls()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return samples
+        # NOTE: the last record might be written partially at the moment
+        data = data[: len(data) - len(data) % SAMPLE.size]
+        for ts, cpu, rss, threads in SAMPLE.iter_unpack(data):
+            samples.times.append(ts)
+            samples.cpu.append(cpu)
+            samples.rss.append(rss)
+            samples.threads.append(threads)
+        return samples
+
+
+class Sampler(threading.Thread):
+    """
+    Append resource usage of the process tree to the file at the interval
+    until stopped or the process is gone.
+    """
+
+    def __init__(self, pid: int, path: Path, interval: float) -> None:
+        super().__init__(name=f"sampler-{pid}", daemon=True)
+        self.pid = pid
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        with open(self.path, "ab", buffering=0) as f:
+            # NOTE: sampling starts along with the process, so no CPU is used yet
+            prev_time, prev_cpu = time.monotonic(), 0.0
+            while not self._stopped.wait(self.interval):
+                usage = get_tree_usage(self.pid)
+                if usage is None:
+                    break
+                now = time.monotonic()
+                cpu_time, rss, threads = usage
+                cpu = max(cpu_time - prev_cpu, 0) / (now - prev_time) * 100
+                f.write(SAMPLE.pack(time.time(), cpu, rss, threads))
+                prev_time, prev_cpu = now, cpu_time
+        logger.debug(f"Stopped sampling process {self.pid}")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """
+    Minimum, average, maximum and 95th percentile (nearest rank) of the values.
+    """
+    ordered = sorted(values)
+    return {
+        "min": ordered[0],
+        "avg": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+        "p95": ordered[math.ceil(len(ordered) * 0.95) - 1],
+    }
+
+
+def sparkline(values: Sequence[float], width: Optional[int] = SPARK_WIDTH) -> str:
+    """
+    Values averaged into at most `width` buckets and drawn with block characters.
+    """
+    if width is not None and len(values) > width:
+        buckets = [
+            values[len(values) * n // width : len(values) * (n + 1) // width]
+            for n in range(width)
+        ]
+        values = [sum(bucket) / len(bucket) for bucket in buckets]
+    low, high = min(values), max(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low) if high > low else 0
+    return "".join(SPARK_CHARS[round((value - low) * scale)] for value in values)
@@ -0,0 +1,133 @@
+import os
+import resource
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple
+
+import psutil
+
+if TYPE_CHECKING:
+    from hapless.hap import RunOptions
+
+IONICE_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+IONICE_ALIASES = {"rt": 1, "be": 2}
+DEFAULT_IONICE_LEVEL = 4
+# NOTE: options which have to be applied within the child process
+SCHEDULING_OPTIONS = (
+    "cpus",
+    "nice",
+    "ionice",
+    "oom_score_adj",
+    "max_memory",
+    "max_cpu_time",
+)
+
+
+def get_available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpus(value: str) -> List[int]:
+    """
+    List of CPUs from a string like 0-3,6.
+    """
+    cpus = set()
+    for item in value.split(","):
+        first, sep, last = item.strip().partition("-")
+        if not first.isdigit() or (sep and not last.isdigit()):
+            raise ValueError(f"{value} should be a list of CPUs like 0-3,6")
+        start, end = int(first), int(last) if sep else int(first)
+        if start > end:
+            raise ValueError(f"{item} is not a valid range of CPUs")
+        cpus.update(range(start, end + 1))
+    return sorted(cpus)
+
+
+def format_cpus(cpus: List[int]) -> str:
+    """
+    Compact representation of the CPUs, reverse of `parse_cpus`.
+    """
+    ranges: List[List[int]] = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if a != b else f"{a}" for a, b in ranges)
+
+
+def parse_ionice(value: str) -> Tuple[int, int]:
+    """
+    IO scheduling class and priority level from a string like best-effort:4.
+    Level is ignored for the idle class.
+    """
+    name, _, level = value.lower().partition(":")
+    ioclass = IONICE_CLASSES.get(name) or IONICE_ALIASES.get(name)
+    if ioclass is None and name.isdigit() and int(name) in IONICE_CLASSES.values():
+        ioclass = int(name)
+    if ioclass is None:
+        raise ValueError(f"{name} is not a valid IO scheduling class")
+    if ioclass == IONICE_CLASSES["idle"]:
+        return ioclass, 0
+    if not level:
+        return ioclass, DEFAULT_IONICE_LEVEL
+    if not level.isdigit() or int(level) > 7:
+        raise ValueError("IO priority level should be within 0-7 range")
+    return ioclass, int(level)
+
+
+@contextmanager
+def _reported(what: str) -> Iterator[None]:
+    try:
+        yield
+    except (OSError, AttributeError, psutil.Error) as e:
+        # NOTE: descriptors are redirected already, so it ends up in the hap logs
+        os.write(2, f"hapless: cannot set {what}: {e}\n".encode())
+
+
+def _set_limit(limit: int, value: int) -> None:
+    _, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(limit, (value, hard))
+
+
+def apply_run_options(run_options: "RunOptions") -> None:
+    """
+    Apply scheduling attributes and resource limits to the current process.
+    Meant to be called within the child right before exec, so failures are
+    reported to its stderr without preventing the hap from starting.
+    """
+    if "cpus" in run_options:
+        with _reported("CPU affinity"):
+            os.sched_setaffinity(0, run_options["cpus"])
+    if "nice" in run_options:
+        with _reported("nice"):
+            os.setpriority(os.PRIO_PROCESS, 0, run_options["nice"])
+    if "ionice" in run_options:
+        with _reported("IO priority"):
+            psutil.Process().ionice(*parse_ionice(run_options["ionice"]))
+    if "oom_score_adj" in run_options:
+        with _reported("OOM score adjustment"):
+            with open("/proc/self/oom_score_adj", "w") as f:
+                f.write(f"{run_options['oom_score_adj']}")
+    # NOTE: limits apply to every process of the hap separately
+    if "max_memory" in run_options:
+        with _reported("memory limit"):
+            _set_limit(resource.RLIMIT_AS, run_options["max_memory"])
+    if "max_cpu_time" in run_options:
+        with _reported("CPU time limit"):
+            _set_limit(resource.RLIMIT_CPU, run_options["max_cpu_time"])
+
+
+def get_preexec_fn(
+    run_options: Optional["RunOptions"],
+) -> Optional[Callable[[], None]]:
+    """
+    Function to prepare the child process, None if there is nothing to apply,
+    so the process can be spawned without running any code in between.
+    """
+    if not run_options or not any(key in run_options for key in SCHEDULING_OPTIONS):
+        return None
+    return lambda: apply_run_options(run_options)
@@ -0,0 +1,204 @@
+import os
+import weakref
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from hapless.hap import Hap, Status
+from hapless.utils import get_mtime, logger
+
+if TYPE_CHECKING:
+    import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS haps (
+    hid INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    raw_name TEXT NOT NULL,
+    cmd TEXT,
+    workdir TEXT,
+    pid INTEGER,
+    rc INTEGER,
+    status TEXT NOT NULL,
+    redirect_stderr INTEGER NOT NULL DEFAULT 0,
+    start_time REAL,
+    end_time REAL,
+    uid INTEGER,
+    gid INTEGER
+);
+CREATE INDEX IF NOT EXISTS haps_name_idx ON haps (name);
+CREATE INDEX IF NOT EXISTS haps_status_idx ON haps (status);
+"""
+
+COLUMNS = (
+    "hid",
+    "name",
+    "raw_name",
+    "cmd",
+    "workdir",
+    "pid",
+    "rc",
+    "status",
+    "redirect_stderr",
+    "start_time",
+    "end_time",
+    "uid",
+    "gid",
+)
+
+
+class StateIndex:
+    """
+    SQLite-backed index of hap metadata stored within the state directory.
+    Hap directories stay the source of truth, index mirrors their content
+    so listing and lookups do not have to open every file of every hap.
+    """
+
+    FILENAME = "state.db"
+    _instances: "weakref.WeakSet[StateIndex]" = weakref.WeakSet()
+
+    def __init__(self, hapless_dir: Path, timeout: float = 30.0) -> None:
+        self._path = hapless_dir / self.FILENAME
+        self._timeout = timeout
+        self._conn: Optional["sqlite3.Connection"] = None
+        self._instances.add(self)
+
+    @classmethod
+    def _before_fork(cls) -> None:
+        # NOTE: SQLite tracks locks per process, so a child must not inherit
+        # an open connection, parent reconnects on the next use
+        for index in list(cls._instances):
+            index.close()
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        for index in list(cls._instances):
+            index._conn = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def conn(self) -> "sqlite3.Connection":
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> "sqlite3.Connection":
+        # NOTE: imported here as most of the commands never touch the index
+        import sqlite3
+
+        conn = sqlite3.connect(
+            self._path,
+            timeout=self._timeout,
+            isolation_level=None,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        logger.debug(f"Connected to state index at {self._path}")
+        return conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+
+    @staticmethod
+    def _to_record(row: "sqlite3.Row") -> Dict[str, Any]:
+        record = dict(row)
+        record["hid"] = f"{record['hid']}"
+        record["redirect_stderr"] = bool(record["redirect_stderr"])
+        return record
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        values = [record.get(column) for column in COLUMNS]
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO haps ({', '.join(COLUMNS)}) "
+            f"VALUES ({placeholders})",
+            values,
+        )
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO haps ({', '.join(COLUMNS)}) "
+                f"VALUES ({placeholders})",
+                ([record.get(column) for column in COLUMNS] for record in records),
+            )
+
+    def update(self, hid: str, **fields: Any) -> None:
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown state index fields: {', '.join(unknown)}")
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        cursor = self.conn.execute(
+            f"UPDATE haps SET {assignments} WHERE hid = ?",
+            [*fields.values(), int(hid)],
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(f"Hap {hid} is missing from the state index")
+
+    def delete(self, hids: Iterable[str]) -> None:
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "DELETE FROM haps WHERE hid = ?",
+                ((int(hid),) for hid in hids),
+            )
+
+    def get(self, hid: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT * FROM haps WHERE hid = ?", (int(hid),)
+        ).fetchone()
+        return self._to_record(row) if row is not None else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT * FROM haps ORDER BY hid").fetchall()
+        return [self._to_record(row) for row in rows]
+
+
+os.register_at_fork(
+    before=StateIndex._before_fork,
+    after_in_child=StateIndex._after_fork_in_child,
+)
+
+
+def recorded_status(pid: Optional[int], rc: Optional[int]) -> Status:
+    """
+    Status as it is recorded on disk, without checking the process itself.
+    """
+    if rc is not None:
+        return Status.SUCCESS if rc == 0 else Status.FAILED
+    if pid is not None:
+        return Status.RUNNING
+    return Status.UNBOUND
+
+
+def hap_to_record(hap: Hap) -> Dict[str, Any]:
+    """
+    Collect index record for the hap reading its state directory.
+    """
+    stat = hap.path.stat()
+    pid, rc = hap.pid, hap.rc
+    return {
+        "hid": int(hap.hid),
+        "name": hap.name,
+        "raw_name": hap.raw_name,
+        "cmd": hap.cmd,
+        "workdir": f"{hap.workdir}" if hap.workdir is not None else None,
+        "pid": pid,
+        "rc": rc,
+        "status": recorded_status(pid, rc).value,
+        "redirect_stderr": hap.redirect_stderr,
+        "start_time": get_mtime(hap._pid_file),
+        "end_time": get_mtime(hap._rc_file),
+        "uid": stat.st_uid,
+        "gid": stat.st_gid,
+    }
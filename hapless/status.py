@@ -0,0 +1,12 @@
+from enum import Enum
+
+
+class Status(str, Enum):
+    # Created status
+    UNBOUND = "unbound"
+    # Active statuses
+    PAUSED = "paused"
+    RUNNING = "running"
+    # Finished statuses
+    FAILED = "failed"
+    SUCCESS = "success"
@@ -1,11 +1,17 @@
-from typing import List, Optional
+import time
+from typing import TYPE_CHECKING, List, Optional
 
 from rich.console import Console
 from rich.live import Live
+from rich.text import Text
 
 from hapless import config
 from hapless.formatters import Formatter, TableFormatter
-from hapless.hap import Hap
+from hapless.hap import Hap, SnapshotCache, probe_usage
+from hapless.procs import ResourceMonitor
+
+if TYPE_CHECKING:
+    from hapless.sampling import Samples
 
 
 class ConsoleUI:
@@ -17,9 +23,10 @@ class ConsoleUI:
     def print(self, *args, **kwargs):
         return self.console.print(*args, **kwargs)
 
-    def print_plain(self, text: str):
+    def print_plain(self, text: str, end: str = "\n"):
         return self.console.print(
             text,
+            end=end,
             markup=False,
             highlight=False,
             emoji=False,
@@ -28,6 +35,18 @@ class ConsoleUI:
             crop=False,
         )
 
+    def print_prefixed(self, prefix: str, text: str):
+        line = Text(f"{prefix} ", style=f"{config.COLOR_ACCENT}")
+        line.append(text)
+        return self.console.print(
+            line,
+            highlight=False,
+            emoji=False,
+            no_wrap=True,
+            overflow="ignore",
+            crop=False,
+        )
+
     def error(self, message: str):
         return self.console.print(
             f"{config.ICON_INFO} {message}",
@@ -36,13 +55,48 @@ class ConsoleUI:
             crop=False,
         )
 
-    def get_live(self):
+    def get_live(self, transient: bool = True):
         return Live(
             console=self.console,
             refresh_per_second=10,
-            transient=True,
+            transient=transient,
         )
 
+    def watch_stats(
+        self,
+        cache: SnapshotCache,
+        formatter: Optional[TableFormatter] = None,
+        interval: float = 1.0,
+        active_only: bool = False,
+    ):
+        """
+        Keep redrawing the haps table in place until interrupted.
+        """
+        formatter = formatter or self.default_formatter
+        # NOTE: CPU usage is measured between the refreshes
+        monitor = ResourceMonitor()
+        with self.get_live(transient=False) as live:
+            while True:
+                snapshots = cache.refresh()
+                if active_only:
+                    snapshots = [s for s in snapshots if s.active]
+                if snapshots:
+                    usage = None
+                    if formatter.resources or formatter.sort:
+                        usage = probe_usage(snapshots, monitor)
+                    live.update(
+                        formatter.format_snapshots(snapshots, usage), refresh=True
+                    )
+                else:
+                    live.update(
+                        Text(
+                            f"{config.ICON_INFO} No haps are currently running",
+                            style=f"{config.COLOR_MAIN} bold",
+                        ),
+                        refresh=True,
+                    )
+                time.sleep(interval)
+
     def stats(self, haps: List[Hap], formatter: Optional[Formatter] = None):
         if not haps:
             self.console.print(
@@ -54,6 +108,11 @@ class ConsoleUI:
         haps_data = formatter.format_list(haps)
         self.console.print(haps_data, soft_wrap=True)
 
+    def show_samples(self, hap: Hap, samples: "Samples"):
+        self.console.print(
+            self.default_formatter.format_samples(hap, samples), soft_wrap=True
+        )
+
     def show_one(self, hap: Hap, formatter: Optional[Formatter] = None):
         formatter = formatter or self.default_formatter
         hap_data = formatter.format_one(hap)
@@ -1,20 +1,17 @@
-import logging
+import fcntl
 import os
+import re
 import shutil
 import signal
 import sys
 import time
-from collections import deque
-from contextlib import nullcontext
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
 from functools import wraps
 from pathlib import Path
-from typing import Callable, Optional, TypeVar
+from typing import Any, Callable, Iterator, List, Optional, TypeVar
 
 import click
-import psutil
-import structlog
-from rich.spinner import Spinner
-from rich.text import Text
 
 if sys.version_info >= (3, 10):
     from typing import ParamSpec
@@ -27,6 +24,18 @@ P = ParamSpec("P")
 R = TypeVar("R")
 
 
+SIZE_UNITS = {"": 1, "B": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+QUEUE_NAME_RE = re.compile(r"^\w[\w.-]*$")
+TIME_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%H:%M:%S",
+    "%H:%M",
+)
+
+
 def allow_missing(func: Callable[P, R]) -> Callable[P, Optional[R]]:
     @wraps(func)
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> Optional[R]:
@@ -56,6 +65,21 @@ class timed(object):
         return self
 
 
+class LazyObject:
+    """
+    Proxy creating the underlying object on the first attribute access.
+    """
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._obj = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._obj is None:
+            self._obj = self._factory()
+        return getattr(self._obj, name)
+
+
 class dummy_live(nullcontext):
     def update(self, *args, **kwargs):
         pass
@@ -68,8 +92,18 @@ def wait_created(
     *,
     live_context=dummy_live(),
 ) -> bool:
+    """
+    Wait for the file to appear within the timeout.
+    Wakes up right when the file is created, interval only sets the pace of
+    the progress updates.
+    """
+    from rich.spinner import Spinner
+    from rich.text import Text
+
+    from hapless.events import watch_directories
+
     start = time.time()
-    with live_context:
+    with live_context, watch_directories([path.parent]) as watch:
         elapsed = 0
         while not path.exists() and elapsed < timeout:
             elapsed = time.time() - start
@@ -82,10 +116,23 @@ def wait_created(
                 style=f"{config.COLOR_MAIN}",
             )
             live_context.update(spinner)
-            time.sleep(interval)
+            watch.wait(min(interval, timeout - elapsed))
     return path.exists()
 
 
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on the file for the duration of the block.
+    """
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
 def validate_signal(ctx, param, value):
     try:
         signal_code = int(value)
@@ -98,10 +145,110 @@ def validate_signal(ctx, param, value):
         raise click.BadParameter(f"{signal_code} is not a valid signal code")
 
 
+def validate_pattern(ctx, param, value):
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise click.BadParameter(f"{value} is not a valid regular expression: {e}")
+    return value
+
+
+def validate_matrix(ctx, param, value):
+    matrix = {}
+    for item in value:
+        key, sep, values = item.partition("=")
+        key = key.strip()
+        if not sep or not key.isidentifier():
+            raise click.BadParameter(f"{item} should be in key=v1,v2 format")
+        if key in matrix:
+            raise click.BadParameter(f"Key {key} is provided more than once")
+        matrix[key] = [v.strip() for v in values.split(",") if v.strip()]
+        if not matrix[key]:
+            raise click.BadParameter(f"No values provided for {key} key")
+    return matrix
+
+
+def validate_time(ctx, param, value):
+    """
+    Accept time of the day, date with time or how long ago, e.g. 15m.
+    """
+    if value is None:
+        return None
+    number, unit = value[:-1], value[-1:].lower()
+    if unit in TIME_UNITS and number.isdigit():
+        return time.time() - int(number) * TIME_UNITS[unit]
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+        if "%d" not in time_format:
+            parsed = datetime.combine(date.today(), parsed.time())
+        return parsed.timestamp()
+    raise click.BadParameter(
+        f"{value} should be a time like 03:10, 2024-05-01 03:10 or 15m"
+    )
+
+
+def validate_size(ctx, param, value):
+    if value is None:
+        return None
+    number, unit = value[:-1], value[-1:].upper()
+    if unit.isdigit():
+        number, unit = value, ""
+    try:
+        size = int(number) * SIZE_UNITS[unit]
+    except (KeyError, ValueError):
+        raise click.BadParameter(f"{value} should be a size like 512K, 64M or 1G")
+    if size <= 0:
+        raise click.BadParameter("Size should be a positive value")
+    return size
+
+
+def validate_queue(ctx, param, value):
+    if value is not None and not QUEUE_NAME_RE.match(value):
+        raise click.BadParameter(
+            f"{value} is not a valid queue name, use letters, digits, _, - and ."
+        )
+    return value
+
+
+def validate_cpus(ctx, param, value):
+    if value is None:
+        return None
+    # NOTE: imported here to keep the cli startup fast
+    from hapless.scheduling import get_available_cpus, parse_cpus
+
+    try:
+        cpus = parse_cpus(value)
+    except ValueError as e:
+        raise click.BadParameter(f"{e}")
+    missing = set(cpus) - set(get_available_cpus())
+    if missing:
+        raise click.BadParameter(f"CPU {min(missing)} is not available")
+    return cpus
+
+
+def validate_ionice(ctx, param, value):
+    if value is None:
+        return None
+    # NOTE: imported here to keep the cli startup fast
+    from hapless.scheduling import IONICE_CLASSES, parse_ionice
+
+    try:
+        ioclass, level = parse_ionice(value)
+    except ValueError as e:
+        raise click.BadParameter(f"{e}")
+    name = next(k for k, v in IONICE_CLASSES.items() if v == ioclass)
+    return name if ioclass == IONICE_CLASSES["idle"] else f"{name}:{level}"
+
+
 def kill_proc_tree(pid, sig=signal.SIGKILL, include_parent=True):
     if pid == os.getpid():
         raise ValueError("Would not kill myself")
 
+    import psutil
+
     try:
         parent = psutil.Process(pid)
     except psutil.NoSuchProcess:
@@ -119,6 +266,15 @@ def kill_proc_tree(pid, sig=signal.SIGKILL, include_parent=True):
             pass
 
 
+def get_return_code(status: int) -> int:
+    """
+    Convert wait status to a return code the same way `subprocess` does.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
 def get_mtime(path: Path) -> Optional[float]:
     if path.exists():
         return os.path.getmtime(path)
@@ -141,16 +297,61 @@ def get_exec_path() -> Path:
     return Path(exec_path)
 
 
-def tail_lines(filepath: Path, n: int = 20):
-    with open(filepath) as f:
-        return deque(f, n)
+def tail_lines(filepath: Path, n: int = 20) -> List[str]:
+    from hapless.logfiles import iter_log
 
+    data = b"".join(iter_log(filepath, lines=n))
+    return data.decode(errors="replace").splitlines(keepends=True)
 
-def configure_logger() -> logging.Logger:
-    logger = structlog.get_logger()
-    level = logging.DEBUG if config.DEBUG else logging.CRITICAL
-    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(level))
-    return logger
+
+# NOTE: same values as within `logging` module, which is not imported on purpose
+LOG_LEVELS = {
+    "debug": 10,
+    "info": 20,
+    "warning": 30,
+    "error": 40,
+    "critical": 50,
+}
+
+
+def _noop(*args, **kwargs) -> None:
+    pass
+
+
+class LazyLogger:
+    """
+    Logger importing structlog only once a message is going to be emitted.
+    Messages below the configured level are dropped without the import.
+    """
+
+    def __init__(self) -> None:
+        self._logger = None
+
+    @property
+    def level(self) -> int:
+        return LOG_LEVELS["debug"] if config.DEBUG else LOG_LEVELS["critical"]
+
+    def __getattr__(self, name: str) -> Any:
+        if self._logger is None:
+            method_level = LOG_LEVELS.get(name)
+            # Structlog might have been configured by someone else already
+            if (
+                "structlog" not in sys.modules
+                and method_level is not None
+                and method_level < self.level
+            ):
+                return _noop
+            self._logger = self._configure()
+        return getattr(self._logger, name)
+
+    def _configure(self):
+        import structlog
+
+        if not structlog.is_configured():
+            structlog.configure(
+                wrapper_class=structlog.make_filtering_bound_logger(self.level)
+            )
+        return structlog.get_logger()
 
 
-logger = configure_logger()
+logger = LazyLogger()
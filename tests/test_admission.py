@@ -0,0 +1,147 @@
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from hapless import admission, cli
+from hapless.admission import (
+    Admission,
+    count_running_haps,
+    read_available_memory,
+    read_load,
+)
+from hapless.main import Hapless
+
+
+def test_read_machine_state(tmp_path, monkeypatch):
+    loadavg = tmp_path / "loadavg"
+    loadavg.write_text("2.50 1.75 1.20 5/812 41235\n")
+    meminfo = tmp_path / "meminfo"
+    meminfo.write_text(
+        "MemTotal:       16384000 kB\n"
+        "MemFree:         1024000 kB\n"
+        "MemAvailable:    4096000 kB\n"
+    )
+    monkeypatch.setattr(admission, "LOADAVG_PATH", f"{loadavg}")
+    monkeypatch.setattr(admission, "MEMINFO_PATH", f"{meminfo}")
+    # Runnable tasks without the reader itself
+    assert read_load() == 4
+    assert read_available_memory() == 4096000 * 1024
+
+    loadavg.write_text("6.25 1.75 1.20 1/812 41235\n")
+    assert read_load() == 6.25
+
+
+def test_hysteresis(tmp_path):
+    checked = Admission(tmp_path, {"when_load_below": 8})
+    with patch("hapless.admission.read_load", return_value=7.5):
+        assert checked.check() is None
+        # Once held back, load has to drop clearly below the limit
+        checked.held = True
+        assert checked.check() == "load 7.50 is not below 8"
+    with patch("hapless.admission.read_load", return_value=7):
+        assert checked.check() is None
+
+    checked = Admission(tmp_path, {"when_free_mem_above": 1000})
+    with patch("hapless.admission.read_available_memory", return_value=1050):
+        assert checked.check() is None
+        checked.held = True
+        assert checked.check() is not None
+
+
+def test_max_running_per_user(hapless: Hapless):
+    proc = subprocess.Popen(["sleep", "10"])
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    running, reused, crashed, finished, unbound = (
+        hapless.create_hap("true") for _ in range(5)
+    )
+    running.bind(proc.pid)
+    # Pid recorded long before the process has been created was reused
+    reused.bind(proc.pid)
+    os.utime(reused.path / "pid", (1000, 1000))
+    # Wrapper died without recording the return code
+    crashed.bind(dead.pid)
+    finished.bind(proc.pid)
+    finished.set_return_code(0)
+    try:
+        assert count_running_haps(hapless.dir, unbound.path.stat().st_uid) == 1
+
+        checked = Admission(hapless.dir, {"max_running_per_user": 1})
+        assert checked.check() == "1 haps of the user are running already"
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_held_hap_starts_once_admitted(hapless: Hapless):
+    hap = hapless.create_hap("true", run_options={"when_load_below": 4})
+    assert hapless._needs_wrapper(hap)
+
+    reasons = []
+
+    def sleep(_):
+        reasons.append(hap.held_reason)
+
+    with patch("hapless.admission.read_load", side_effect=[6, 3.8, 3]), patch(
+        "hapless.admission.time.sleep", side_effect=sleep
+    ):
+        hapless.run_hap(hap, blocking=True)
+
+    assert reasons == ["load 6.00 is not below 4", "load 3.80 is not below 4"]
+    assert hap.held_reason is None
+    assert hap.rc == 0
+
+
+def test_held_queued_hap_keeps_its_slot(hapless: Hapless):
+    queue = hapless.get_queue("q")
+    hap = hapless.create_hap("true", run_options={"queue": "q", "when_load_below": 4})
+    queue.push([hap])
+    assert queue.claim(lambda hid: hap.status) == [hap.hid]
+
+    with patch("hapless.admission.read_load", side_effect=[6, 1]), patch(
+        "hapless.admission.time.sleep"
+    ), patch.object(queue, "touch") as touch_mock, patch.object(
+        hapless, "get_queue", return_value=queue
+    ):
+        hapless._wrap_subprocess(hap)
+    touch_mock.assert_called_once_with(hap.hid)
+    assert hap.rc == 0
+
+
+def test_run_admission_invocation(runner):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(
+            cli.cli,
+            [
+                "run",
+                "--when-load-below",
+                "8",
+                "--when-free-mem-above",
+                "4G",
+                "--max-running-per-user",
+                "3",
+                "--",
+                "make",
+            ],
+        )
+        assert result.exit_code == 0
+        assert run_command_mock.call_args.kwargs["run_options"] == {
+            "when_load_below": 8,
+            "when_free_mem_above": 4 << 30,
+            "max_running_per_user": 3,
+        }
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--when-load-below", "0"],
+        ["--max-running-per-user", "0"],
+        ["--when-load-below", "8", "--check"],
+    ],
+)
+def test_run_admission_invalid_usage(runner, args):
+    result = runner.invoke(cli.cli, ["run", *args, "--", "make"])
+    assert result.exit_code == 2
@@ -0,0 +1,181 @@
+import io
+import os
+from unittest.mock import ANY, call, patch
+
+import pytest
+
+from hapless import cli
+from hapless.bulk import expand_matrix, parse_spec, read_specs
+from hapless.main import Hapless
+
+
+def test_parse_plain_command():
+    assert parse_spec("echo hello") == {"cmd": "echo hello"}
+
+
+@patch.dict(os.environ, {"CURRENT": "1"}, clear=True)
+def test_parse_json_spec():
+    spec = parse_spec(
+        '{"cmd": "echo $X", "name": "hap-json", "env": {"X": 42}, "workdir": "/tmp"}'
+    )
+    assert spec == {
+        "cmd": "echo $X",
+        "name": "hap-json",
+        "env": {"CURRENT": "1", "X": "42"},
+        "workdir": "/tmp",
+    }
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ('{"name": "no-cmd"}', "spec should contain a command to run"),
+        ('{"cmd": "true", "user": "root"}', "unknown keys user"),
+        ('{"cmd": "true", "env": "X=1"}', "env should be a JSON object"),
+    ],
+)
+def test_parse_invalid_spec(line: str, message: str):
+    with pytest.raises(ValueError) as e:
+        parse_spec(line)
+    assert str(e.value) == message
+
+
+def test_read_specs_skips_comments():
+    stream = io.StringIO("# header\n\necho one\n  echo two  \n")
+    assert list(read_specs(stream)) == [{"cmd": "echo one"}, {"cmd": "echo two"}]
+
+
+def test_read_specs_reports_line():
+    stream = io.StringIO("echo one\n{broken\n")
+    with pytest.raises(ValueError) as e:
+        list(read_specs(stream))
+    assert str(e.value).startswith("Invalid spec on line 2:")
+
+
+def test_expand_matrix():
+    specs = [{"cmd": "train --lr {lr} --n {n} ${HOME}", "name": "sweep"}]
+    expanded = list(expand_matrix(specs, {"lr": ["0.1", "0.2"], "n": ["1", "2"]}))
+    assert [spec["cmd"] for spec in expanded] == [
+        "train --lr 0.1 --n 1 ${HOME}",
+        "train --lr 0.1 --n 2 ${HOME}",
+        "train --lr 0.2 --n 1 ${HOME}",
+        "train --lr 0.2 --n 2 ${HOME}",
+    ]
+    assert [spec["name"] for spec in expanded] == [
+        "sweep-0.1-1",
+        "sweep-0.1-2",
+        "sweep-0.2-1",
+        "sweep-0.2-2",
+    ]
+
+
+def test_create_haps_in_one_pass(hapless: Hapless):
+    specs = [{"cmd": "echo one", "name": "hap-one"}, {"cmd": "echo two"}]
+    with patch.object(
+        hapless, "_reserve_hap_ids", wraps=hapless._reserve_hap_ids
+    ) as reserve_mock:
+        haps = hapless.create_haps(specs)
+        reserve_mock.assert_called_once_with(2)
+
+    assert [hap.hid for hap in haps] == ["1", "2"]
+    assert [hap.cmd for hap in haps] == ["echo one", "echo two"]
+    assert haps[0].name == "hap-one"
+
+
+def test_create_haps_skips_taken_names(hapless: Hapless):
+    hapless.create_hap("true", name="hap-taken")
+    haps = hapless.create_haps(
+        [{"cmd": "echo one", "name": "hap-taken"}, {"cmd": "echo two"}]
+    )
+    assert [hap.cmd for hap in haps] == ["echo two"]
+    assert len(hapless.get_haps()) == 2
+
+
+def test_run_many_launches_all(hapless: Hapless):
+    specs = [{"cmd": f"echo {i}"} for i in range(5)]
+    with patch.object(hapless, "_launch") as launch_mock, patch(
+        "time.sleep"
+    ) as sleep_mock:
+        haps = hapless.run_many(specs, stagger=0.5)
+
+        assert launch_mock.call_args_list == [call(hap) for hap in haps]
+        assert sleep_mock.call_args_list == [call(0.5)] * 4
+
+
+def test_run_many_respects_max_in_flight(hapless: Hapless):
+    specs = [{"cmd": "true"} for _ in range(6)]
+    launched = []
+    running_at_launch = []
+
+    def launch(hap):
+        running_at_launch.append(sum(not h._rc_file.exists() for h in launched))
+        launched.append(hap)
+
+    def wait_child():
+        # Finish the oldest running hap
+        next(h for h in launched if not h._rc_file.exists()).set_return_code(0)
+
+    with patch.object(hapless, "_launch", side_effect=launch), patch.object(
+        hapless, "_wait_child", side_effect=wait_child
+    ) as wait_child_mock:
+        haps = hapless.run_many(specs, max_in_flight=2)
+
+    assert launched == haps
+    assert max(running_at_launch) == 1
+    assert wait_child_mock.call_count == 4
+
+
+def test_run_from_file_invocation(runner):
+    with patch.object(runner.hapless, "run_many") as run_many_mock:
+        result = runner.invoke(
+            cli.cli,
+            ["run", "--from-file", "-", "--stagger", "0.1", "--max-in-flight", "4"],
+            input='echo one\n{"cmd": "echo two", "name": "two"}\n',
+        )
+        assert result.exit_code == 0
+        run_many_mock.assert_called_once_with(
+            [{"cmd": "echo one"}, {"cmd": "echo two", "name": "two"}],
+            stagger=0.1,
+            max_in_flight=4,
+            log_options=None,
+            run_options=None,
+            spread=False,
+        )
+
+
+def test_run_matrix_invocation(runner):
+    with patch.object(runner.hapless, "run_many") as run_many_mock:
+        result = runner.invoke(
+            cli.cli,
+            ["run", "--matrix", "n=1,2", "--name", "sweep", "--", "echo", "{n}"],
+        )
+        assert result.exit_code == 0
+        run_many_mock.assert_called_once_with(
+            [
+                {"cmd": "echo '1'", "name": "sweep-1"},
+                {"cmd": "echo '2'", "name": "sweep-2"},
+            ],
+            stagger=ANY,
+            max_in_flight=None,
+            log_options=None,
+            run_options=None,
+            spread=False,
+        )
+
+
+@pytest.mark.parametrize("matrix", ["n", "n=", "1n=2", ""])
+def test_run_invalid_matrix(runner, matrix: str):
+    with patch.object(runner.hapless, "run_many") as run_many_mock:
+        result = runner.invoke(cli.cli, ["run", "--matrix", matrix, "echo"])
+        assert result.exit_code == 2
+        run_many_mock.assert_not_called()
+
+
+def test_run_from_file_invalid_spec(runner):
+    with patch.object(runner.hapless, "run_many") as run_many_mock:
+        result = runner.invoke(
+            cli.cli, ["run", "--from-file", "-"], input='{"name": "x"}\n'
+        )
+        assert result.exit_code == 1
+        assert "Invalid spec on line 1" in result.output
+        run_many_mock.assert_not_called()
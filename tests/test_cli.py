@@ -1,7 +1,15 @@
+import os
+import subprocess
+import sys
+import time
 from contextlib import ExitStack
-from unittest.mock import Mock, patch
+from datetime import datetime
+from unittest.mock import ANY, Mock, call, patch
+
+import pytest
 
 from hapless import cli
+from hapless.hap import Status
 
 
 def test_executable_invocation(runner):
@@ -39,7 +47,9 @@ def test_show_command_invokes_status(status_mock, runner):
     result = runner.invoke(cli.cli, ["show", "hap-me"])
 
     assert result.exit_code == 0
-    status_mock.assert_called_once_with("hap-me", False, json_output=False)
+    status_mock.assert_called_once_with(
+        "hap-me", False, json_output=False, watch=None, resources=False
+    )
 
 
 @patch("hapless.cli._status")
@@ -47,7 +57,42 @@ def test_status_command_invokes_status(status_mock, runner):
     result = runner.invoke(cli.cli, ["status", "hap-me"])
 
     assert result.exit_code == 0
-    status_mock.assert_called_once_with("hap-me", False, json_output=False)
+    status_mock.assert_called_once_with(
+        "hap-me", False, json_output=False, watch=None, resources=False
+    )
+
+
+def test_status_watch_invocation(runner):
+    with patch.object(runner.hapless, "watch_stats") as watch_mock:
+        result = runner.invoke(cli.cli, ["status", "--watch"])
+        assert result.exit_code == 0
+        watch_mock.assert_called_once_with(ANY, interval=1.0)
+
+        result = runner.invoke(cli.cli, ["show", "-v", "-w", "0.5"])
+        assert result.exit_code == 0
+        assert watch_mock.call_args == call(ANY, interval=0.5)
+        assert watch_mock.call_args.args[0].verbose is True
+
+
+@pytest.mark.parametrize("args", [["--watch", "--json"], ["--watch", "0", "hap-me"]])
+def test_status_watch_invalid_usage(runner, args):
+    result = runner.invoke(cli.cli, ["status", *args])
+    assert result.exit_code == 2
+
+
+def test_top_invocation(runner):
+    with patch.object(runner.hapless, "watch_stats") as watch_mock:
+        result = runner.invoke(cli.cli, ["top", "--sort", "memory", "-i", "5"])
+        assert result.exit_code == 0
+        watch_mock.assert_called_once_with(ANY, interval=5.0, active_only=True)
+        formatter = watch_mock.call_args.args[0]
+        assert formatter.resources is True
+        assert formatter.sort == "memory"
+
+
+def test_status_resources_with_json(runner):
+    result = runner.invoke(cli.cli, ["status", "--resources", "--json"])
+    assert result.exit_code == 2
 
 
 @patch("hapless.cli._status")
@@ -55,7 +100,9 @@ def test_status_accepts_json_argument(status_mock, runner):
     result = runner.invoke(cli.cli, ["status", "hap-me", "--json"])
 
     assert result.exit_code == 0
-    status_mock.assert_called_once_with("hap-me", False, json_output=True)
+    status_mock.assert_called_once_with(
+        "hap-me", False, json_output=True, watch=None, resources=False
+    )
 
 
 @patch("hapless.cli.get_or_exit")
@@ -107,7 +154,9 @@ def test_run_invocation(runner):
     with patch.object(runner.hapless, "run_command") as run_command_mock:
         result = runner.invoke(cli.cli, ["run", "script", "--check"])
         assert result.exit_code == 0
-        run_command_mock.assert_called_once_with("script", name=None, check=True)
+        run_command_mock.assert_called_once_with(
+            "script", name=None, check=True, log_options=None, run_options=None
+        )
 
 
 def test_run_invocation_with_arguments(runner):
@@ -117,7 +166,11 @@ def test_run_invocation_with_arguments(runner):
         )
         assert result.exit_code == 0
         run_command_mock.assert_called_once_with(
-            "script --script-param", name=None, check=True
+            "script --script-param",
+            name=None,
+            check=True,
+            log_options=None,
+            run_options=None,
         )
 
 
@@ -128,7 +181,11 @@ def test_run_invocation_name_provided(runner):
         )
         assert result.exit_code == 0
         run_command_mock.assert_called_once_with(
-            "script --script-param", name="hap-name", check=False
+            "script --script-param",
+            name="hap-name",
+            check=False,
+            log_options=None,
+            run_options=None,
         )
 
 
@@ -142,6 +199,8 @@ def test_run_invocation_same_name_provided(runner):
             cmd,
             name=name,
             check=False,
+            log_options=None,
+            run_options=None,
         )
         # make sure record for the hap has been actually created
         runner.hapless.create_hap(cmd=cmd, name=name)
@@ -236,3 +295,247 @@ def test_rename_name_exists(get_or_exit_mock, runner):
         get_or_exit_mock.assert_called_once_with("hap-me")
         get_hap_mock.assert_called_once_with("new-hap-name")
         rename_mock.assert_not_called()
+
+
+def test_is_running_invocation(runner):
+    hap = runner.hapless.create_hap("true", name="hap-running")
+    with patch.object(runner.hapless, "get_hap", return_value=hap):
+        with patch.object(type(hap), "status", Status.RUNNING):
+            result = runner.invoke(cli.cli, ["is-running", "hap-running"])
+            assert result.exit_code == 0
+            assert result.output == ""
+
+        result = runner.invoke(cli.cli, ["is-running", "hap-running"])
+        assert result.exit_code == 1
+        assert result.output == ""
+
+
+def test_is_running_missing_hap(runner):
+    result = runner.invoke(cli.cli, ["is-running", "hap-missing"])
+    assert result.exit_code == 1
+    assert result.output == ""
+
+
+def test_count_invocation(runner):
+    runner.hapless.create_hap("true")
+    runner.hapless.create_hap("true")
+    hap = runner.hapless.create_hap("false")
+    runner.hapless.run_hap(hap, blocking=True)
+
+    result = runner.invoke(cli.cli, ["count"])
+    assert result.exit_code == 0
+    assert result.output == "3\n"
+
+    result = runner.invoke(cli.cli, ["count", "-s", "unbound", "-s", "failed"])
+    assert result.exit_code == 0
+    assert result.output == "3\n"
+
+    result = runner.invoke(cli.cli, ["count", "--status", "running"])
+    assert result.exit_code == 0
+    assert result.output == "0\n"
+
+
+@patch("hapless.cli.get_or_exit")
+def test_logs_follow_several_haps(get_or_exit_mock, runner):
+    haps = [Mock(), Mock()]
+    get_or_exit_mock.side_effect = haps
+    with patch.object(runner.hapless, "follow_logs") as follow_logs_mock:
+        result = runner.invoke(cli.cli, ["logs", "-f", "3", "7"])
+        assert result.exit_code == 0
+        follow_logs_mock.assert_called_once_with(haps, stderr=False)
+
+
+def test_logs_all_with_alias_fails(runner):
+    result = runner.invoke(cli.cli, ["logs", "--all", "hap-me"])
+    assert result.exit_code == 2
+    assert "Cannot use --all flag while hap id provided" in result.output
+
+
+@patch("hapless.cli.get_or_exit")
+def test_logs_last_lines_invocation(get_or_exit_mock, runner):
+    hap_mock = Mock()
+    get_or_exit_mock.return_value = hap_mock
+    with patch.object(runner.hapless, "logs") as logs_mock:
+        result = runner.invoke(cli.cli, ["logs", "hap-me", "-n", "5"])
+        assert result.exit_code == 0
+        logs_mock.assert_called_once_with(hap_mock, stderr=False, follow=False, lines=5)
+
+
+def test_logs_ranges_are_exclusive(runner):
+    result = runner.invoke(cli.cli, ["logs", "hap-me", "-n", "5", "-c", "10"])
+    assert result.exit_code == 2
+    assert "mutually exclusive" in result.output
+
+
+@patch("hapless.cli.get_or_exit")
+def test_logs_from_line_invocation(get_or_exit_mock, runner):
+    hap_mock = Mock()
+    get_or_exit_mock.return_value = hap_mock
+    with patch.object(runner.hapless, "logs") as logs_mock:
+        result = runner.invoke(cli.cli, ["logs", "hap-me", "--from-line", "3"])
+        assert result.exit_code == 0
+        logs_mock.assert_called_once_with(
+            hap_mock, stderr=False, follow=False, from_line=3
+        )
+
+
+@patch("hapless.cli.get_or_exit")
+def test_logs_since_invocation(get_or_exit_mock, runner):
+    get_or_exit_mock.return_value = Mock()
+    with patch.object(runner.hapless, "logs") as logs_mock:
+        result = runner.invoke(
+            cli.cli, ["logs", "hap-me", "--since", "2024-05-01 03:10", "--until", "5m"]
+        )
+        assert result.exit_code == 0
+        options = logs_mock.call_args.kwargs
+        assert options["since"] == datetime(2024, 5, 1, 3, 10).timestamp()
+        assert options["until"] == pytest.approx(time.time() - 300, abs=5)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--since", "yesterday"],
+        ["--since", "5m", "-n", "3"],
+        ["--from-line", "0"],
+    ],
+)
+def test_logs_invalid_time_range(runner, args):
+    result = runner.invoke(cli.cli, ["logs", "hap-me", *args])
+    assert result.exit_code == 2
+
+
+@patch("hapless.cli.get_or_exit")
+def test_logs_merge_invocation(get_or_exit_mock, runner):
+    haps = [Mock(), Mock()]
+    get_or_exit_mock.side_effect = haps
+    with patch.object(runner.hapless, "merge_logs") as merge_logs_mock:
+        result = runner.invoke(cli.cli, ["logs", "--merge", "hap-1", "hap-2"])
+        assert result.exit_code == 0
+        merge_logs_mock.assert_called_once_with(haps, stderr=False)
+
+
+def test_logs_merge_name_glob(runner):
+    etl_load, etl_dump = Mock(), Mock()
+    etl_load.name, etl_dump.name = "etl-load", "etl-dump"
+    other = Mock()
+    other.name = "report"
+    with ExitStack() as stack:
+        stack.enter_context(
+            patch.object(
+                runner.hapless, "get_haps", return_value=[etl_load, other, etl_dump]
+            )
+        )
+        merge_logs_mock = stack.enter_context(
+            patch.object(runner.hapless, "merge_logs")
+        )
+        result = runner.invoke(
+            cli.cli, ["logs", "--merge", "--name-glob", "etl-*", "-e"]
+        )
+        assert result.exit_code == 0
+        merge_logs_mock.assert_called_once_with([etl_load, etl_dump], stderr=True)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--merge", "--follow", "hap-me"],
+        ["--merge", "-n", "5", "hap-me"],
+        ["--name-glob", "etl-*", "hap-me"],
+        ["--name-glob", "etl-*", "--all"],
+    ],
+)
+def test_logs_invalid_merge(runner, args):
+    result = runner.invoke(cli.cli, ["logs", *args])
+    assert result.exit_code == 2
+
+
+def test_run_with_log_rotation(runner):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(
+            cli.cli,
+            ["run", "--log-max-size", "64M", "--log-keep", "3", "--", "script"],
+        )
+        assert result.exit_code == 0
+        run_command_mock.assert_called_once_with(
+            "script",
+            name=None,
+            check=False,
+            log_options={"mode": "file", "max_size": 64 * 1024 * 1024, "keep": 3},
+            run_options=None,
+        )
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--log-keep", "3"],
+        ["--log-max-size", "lots"],
+        ["--log-max-size", "0"],
+    ],
+)
+def test_run_with_invalid_log_rotation(runner, args):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(cli.cli, ["run", *args, "--", "script"])
+        assert result.exit_code == 2
+        run_command_mock.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "args, log_options",
+    [
+        (["--log-mode", "ring"], {"mode": "ring", "size": 16 * 1024 * 1024}),
+        (["--log-mode", "ring", "--log-size", "1K"], {"mode": "ring", "size": 1024}),
+        (["--log-mode", "null"], {"mode": "null"}),
+        (["--log-timestamps"], {"mode": "file", "timestamps": True}),
+    ],
+)
+def test_run_with_log_mode(runner, args, log_options):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(cli.cli, ["run", *args, "--", "script"])
+        assert result.exit_code == 0
+        run_command_mock.assert_called_once_with(
+            "script",
+            name=None,
+            check=False,
+            log_options=log_options,
+            run_options=None,
+        )
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--log-mode", "ring", "--log-max-size", "1M"],
+        ["--log-mode", "null", "--log-size", "1M"],
+        ["--log-size", "1M"],
+        ["--log-mode", "ring", "--log-timestamps"],
+        ["--log-max-size", "1M", "--log-timestamps"],
+    ],
+)
+def test_run_with_invalid_log_mode(runner, args):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(cli.cli, ["run", *args, "--", "script"])
+        assert result.exit_code == 2
+        run_command_mock.assert_not_called()
+
+
+@pytest.mark.parametrize("mode", ["file", "ring", "null"])
+def test_run_check_shows_stderr_for_log_mode(tmp_path, mode):
+    env = {**os.environ, "HAPLESS_DIR": f"{tmp_path}"}
+    result = subprocess.run(
+        [sys.executable, "-m", "hapless.cli", "run", "--check"]
+        + ["--log-mode", mode, "--", "sh", "-c", "echo boom >&2; exit 3"],
+        env=env,
+        capture_output=True,
+        timeout=30,
+    )
+    assert result.returncode == 1
+    output = result.stdout + result.stderr
+    assert b"HAPRING1" not in output
+    assert b"\0" not in output
+    if mode == "null":
+        assert b"boom" not in output
+        assert b"output is discarded" in output
+    else:
+        assert b"boom" in output
@@ -0,0 +1,71 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from hapless.main import Hapless
+
+LAUNCHES = 200
+WORKERS = 32
+
+
+def launch(hapless_dir: Path, name: str) -> Optional[str]:
+    hapless = Hapless(hapless_dir=hapless_dir, quiet=True)
+    try:
+        hap = hapless.create_hap("true", name=name)
+    except FileExistsError:
+        return None
+    hapless.run_hap(hap, blocking=True)
+    return hap.hid
+
+
+def test_reserved_ids_are_sequential(hapless: Hapless):
+    assert hapless._reserve_hap_ids(3) == ["1", "2", "3"]
+    assert hapless._get_next_hap_id() == "4"
+
+
+def test_counter_is_restored_from_state_dir(hapless: Hapless):
+    hapless.create_hap("true")
+    hapless.create_hap("true")
+    (hapless.dir / ".next_hid").write_text("garbage")
+
+    assert hapless._get_next_hap_id() == "3"
+
+
+def test_explicit_hid_is_skipped(hapless: Hapless):
+    hapless.create_hap("true", hid="1")
+    hap = hapless.create_hap("true")
+    assert hap.hid == "2"
+
+
+def test_parallel_launches_do_not_collide(tmp_path: Path):
+    context = multiprocessing.get_context("fork")
+    names = [f"hap-{i}" for i in range(LAUNCHES)]
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=context) as executor:
+        hids = list(executor.map(launch, [tmp_path] * LAUNCHES, names))
+
+    assert None not in hids
+    assert len(set(hids)) == LAUNCHES
+
+    hapless = Hapless(hapless_dir=tmp_path, quiet=True)
+    haps = hapless.get_haps()
+    assert len(haps) == LAUNCHES
+    assert sorted(hap.name for hap in haps) == sorted(names)
+    assert all(hap.rc == 0 for hap in haps)
+
+
+def test_parallel_launches_with_same_name(tmp_path: Path):
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=context) as executor:
+        hids = list(
+            executor.map(launch, [tmp_path] * LAUNCHES, ["hap-same"] * LAUNCHES)
+        )
+
+    winners = [hid for hid in hids if hid is not None]
+    assert len(winners) == 1
+
+    hapless = Hapless(hapless_dir=tmp_path, quiet=True)
+    hap = hapless.get_hap("hap-same")
+    assert hap is not None
+    assert hap.hid == winners[0]
+    assert len(hapless.get_haps()) == 1
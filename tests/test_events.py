@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import psutil
+import pytest
+
+from hapless import events
+from hapless.hap import Hap
+from hapless.utils import wait_created
+
+
+def _create_later(path, delay: float = 0.2):
+    timer = threading.Timer(delay, path.write_text, args=("0",))
+    timer.start()
+    return timer
+
+
+def test_wait_created_wakes_up_on_creation(tmp_path):
+    path = tmp_path / "rc"
+    timer = _create_later(path)
+    start = time.monotonic()
+    assert wait_created(path, interval=10, timeout=20) is True
+    timer.join()
+    assert time.monotonic() - start < 5
+
+
+def test_wait_created_times_out(tmp_path):
+    assert wait_created(tmp_path / "rc", interval=0.05, timeout=0.2) is False
+
+
+def test_wait_created_falls_back_to_polling(tmp_path):
+    path = tmp_path / "rc"
+    timer = _create_later(path)
+    with patch.object(events, "DirectoryWatch", side_effect=OSError(28, "No space")):
+        assert wait_created(path, interval=0.05, timeout=5) is True
+    timer.join()
+
+
+def test_rc_file_written_atomically(hap: Hap):
+    hap.set_return_code(3)
+    assert hap.rc == 3
+    assert not list(hap.path.glob(".*"))
+
+
+@pytest.mark.skipif(not hasattr(os, "pidfd_open"), reason="no pidfd support")
+def test_wait_exited_wakes_up_on_exit():
+    popen = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"])
+    proc = psutil.Process(popen.pid)
+    start = time.monotonic()
+    assert events.wait_exited(proc, timeout=20) is True
+    assert time.monotonic() - start < 5
+    popen.wait()
+
+
+def test_wait_exited_times_out():
+    popen = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(10)"])
+    try:
+        assert events.wait_exited(psutil.Process(popen.pid), timeout=0.1) is False
+    finally:
+        popen.kill()
+        popen.wait()
+
+
+def test_wait_exited_falls_back_to_polling(monkeypatch):
+    monkeypatch.delattr(os, "pidfd_open", raising=False)
+    popen = subprocess.Popen([sys.executable, "-c", "pass"])
+    assert events.wait_exited(psutil.Process(popen.pid), timeout=20) is True
@@ -0,0 +1,72 @@
+import threading
+
+from hapless.follow import LogFile, LogFollower
+from hapless.logfiles import RingLog, RotatingLog
+from hapless.main import Hapless
+
+
+def test_follow_several_haps_until_finished(hapless: Hapless):
+    first = hapless.create_hap("true", name="first")
+    second = hapless.create_hap("true", name="second")
+    first.stdout_path.write_text("old\nrecent\n")
+
+    def write_and_finish():
+        with open(second.stdout_path, "a") as f:
+            f.write("from second\nunterminated")
+        second.set_return_code(0)
+        with open(first.stdout_path, "a") as f:
+            f.write("from first\n")
+        first.set_return_code(1)
+
+    timer = threading.Timer(0.2, write_and_finish)
+    timer.start()
+    follower = LogFollower([first, second], lines=1, interval=10)
+    result = {"first": [], "second": []}
+    for hap, line in follower:
+        result[hap.name].append(line)
+    timer.join()
+
+    assert result == {
+        "first": ["recent", "from first"],
+        "second": ["from second", "unterminated"],
+    }
+
+
+def test_follow_stops_when_process_is_gone(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    hap.stdout_path.write_text("line\n")
+    # NOTE: pid which cannot belong to a running process
+    hap._pid_file.write_text("999999999")
+    follower = LogFollower([hap], interval=0.05)
+    assert [line for _, line in follower] == ["line"]
+
+
+def test_follow_logs_prefixes_lines(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    hap = hapless.create_hap("true", name="prefixed")
+    hap.stdout_path.write_text("hello\n")
+    hap.set_return_code(0)
+    hapless.follow_logs([hap])
+    assert "prefixed | hello" in capsys.readouterr().out
+
+
+def test_follow_across_rotation(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    log = RotatingLog(hap.stdout_path, max_size=16)
+    log_file = LogFile(hap, hap.stdout_path)
+    log.write(b"first\n")
+    assert log_file.read() == ["first"]
+    log.write(b"second\nthird\n")
+    log.close()
+    assert log_file.read() == ["second", "third"]
+
+
+def test_follow_ring_log(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    log_file = LogFile(hap, hap.stdout_path)
+    log = RingLog(hap.stdout_path, size=16)
+    log.write(b"first\n")
+    assert log_file.read() == ["first"]
+    log.write(b"second\nthird\n")
+    assert log_file.read() == ["second", "third"]
+    log.close()
@@ -0,0 +1,162 @@
+import re
+from unittest.mock import Mock, patch
+
+import pytest
+
+from hapless import cli
+from hapless.grep import (
+    _search_mapped,
+    _search_stream,
+    grep_log,
+    grep_logs,
+    iter_matches,
+)
+from hapless.logfiles import RingLog, RotatingLog
+from hapless.main import Hapless
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "stdout.log"
+    path.write_bytes(b"start\nerror: one\nok\n\nerror: two\nend")
+    return path
+
+
+def test_iter_matches(log_file):
+    regex = re.compile(rb"^error", re.M)
+    assert list(iter_matches(log_file, regex)) == [
+        (2, b"error: one"),
+        (5, b"error: two"),
+    ]
+    assert list(iter_matches(log_file, re.compile(rb"^$", re.M))) == [(4, b"")]
+    assert list(iter_matches(log_file, re.compile(rb"end"))) == [(6, b"end")]
+
+
+def _search_all(search, path, regex):
+    with open(path, "rb") as f:
+        gen = search(f, regex, 0)
+        matches = []
+        while True:
+            try:
+                matches.append(next(gen))
+            except StopIteration as e:
+                return matches, e.value
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [rb"a\sb", rb"^$", rb"$", rb"b\n", rb"\s", rb"^a", rb"b$", rb"a\s*\n*b"],
+)
+@pytest.mark.parametrize("content", [b"a\nb\n", b"a\nb", b"a b\n\na\n b\n"])
+def test_mapped_and_stream_search_agree(tmp_path, content, pattern):
+    path = tmp_path / "stdout.log"
+    path.write_bytes(content)
+    regex = re.compile(pattern, re.MULTILINE)
+    mapped = _search_all(_search_mapped, path, regex)
+    assert mapped == _search_all(_search_stream, path, regex)
+
+
+def test_iter_matches_missing_or_empty(tmp_path):
+    path = tmp_path / "stdout.log"
+    assert list(iter_matches(path, re.compile(rb"."))) == []
+    path.touch()
+    assert list(iter_matches(path, re.compile(rb""))) == []
+
+
+@pytest.mark.parametrize("compress", [None, "gzip"])
+def test_iter_matches_across_segments(tmp_path, compress):
+    path = tmp_path / "stdout.log"
+    log = RotatingLog(path, max_size=20, keep=10, compress=compress)
+    for i in range(1, 11):
+        log.write(f"line {i}\n".encode())
+    log.close()
+    matches = list(iter_matches(path, re.compile(rb"[37]$|10", re.M)))
+    assert matches == [(3, b"line 3"), (7, b"line 7"), (10, b"line 10")]
+
+
+def test_iter_matches_ring_log(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = RingLog(path, size=64)
+    log.write(b"error\nok\nerror again\n")
+    log.close()
+    assert list(iter_matches(path, re.compile(rb"error"))) == [
+        (1, b"error"),
+        (3, b"error again"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "mode, expected",
+    [
+        ("lines", (2, [(2, b"error: one"), (5, b"error: two")])),
+        ("files", (1, [])),
+        ("count", (2, [])),
+    ],
+)
+def test_grep_log_modes(log_file, mode, expected):
+    assert grep_log(log_file, rb"error", mode=mode) == expected
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_grep_logs(tmp_path, log_file, jobs):
+    other = tmp_path / "other.log"
+    other.write_bytes(b"ERROR: three\n")
+    results = grep_logs(
+        {"1": log_file, "2": other}, rb"error: t", flags=re.I, mode="lines", jobs=jobs
+    )
+    assert sorted(results) == [
+        ("1", 1, [(5, b"error: two")]),
+        ("2", 1, [(1, b"ERROR: three")]),
+    ]
+
+
+def test_hapless_grep(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    first = hapless.create_hap("true")
+    second = hapless.create_hap("true")
+    first.stdout_path.write_text("Traceback\n  raise\n")
+    second.stdout_path.write_text("all good\n")
+
+    assert hapless.grep([first, second], "raise", jobs=1)
+    assert capsys.readouterr().out == f"{first.hid}:2:  raise\n"
+
+    assert hapless.grep([first, second], "^tr", ignore_case=True, mode="count")
+    assert capsys.readouterr().out.splitlines() == [
+        f"{first.hid}:1",
+        f"{second.hid}:0",
+    ]
+
+    assert not hapless.grep([first, second], "missing", mode="files")
+    assert capsys.readouterr().out == ""
+
+
+def test_grep_invocation(runner):
+    failed, running = Mock(), Mock()
+    snapshots = [Mock(status=cli.Status.FAILED), Mock(status=cli.Status.RUNNING)]
+    with patch.object(
+        runner.hapless, "get_haps", return_value=[failed, running]
+    ), patch("hapless.hap.load_snapshots", return_value=snapshots), patch.object(
+        runner.hapless, "grep", return_value=True
+    ) as grep_mock:
+        result = runner.invoke(cli.cli, ["grep", "Trace.*", "-s", "failed", "-l"])
+        assert result.exit_code == 0
+        grep_mock.assert_called_once_with(
+            [failed],
+            "Trace.*",
+            stderr=False,
+            ignore_case=False,
+            mode="files",
+            jobs=None,
+        )
+
+
+def test_grep_nothing_found(runner):
+    with patch.object(runner.hapless, "grep", return_value=False):
+        result = runner.invoke(cli.cli, ["grep", "missing"])
+        assert result.exit_code == 1
+
+
+@pytest.mark.parametrize("args", [["("], ["error", "-l", "-c"]])
+def test_grep_invalid_usage(runner, args):
+    result = runner.invoke(cli.cli, ["grep", *args])
+    assert result.exit_code == 2
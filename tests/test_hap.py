@@ -9,7 +9,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 from rich.console import Console
 
-from hapless.hap import Hap, Status
+from hapless.hap import Hap, HapSnapshot, SnapshotCache, Status
 from hapless.main import Hapless
 
 
@@ -126,12 +126,109 @@ def test_serialize(hap: Hap):
     assert serialized["restarts"] == str(hap.restarts)
     assert serialized["stdout_file"] == str(hap.stdout_path)
     assert serialized["stderr_file"] == str(hap.stderr_path)
+    assert serialized["exit"] is None
     # check all the fields are json-serializable
     result = json.dumps(serialized)
     assert isinstance(result, str)
     assert "workdir" in result
 
 
+def test_exit_record(hapless: Hapless):
+    hap = hapless.create_hap("python -c 'bytearray(64 << 20)'")
+    killed = hapless.create_hap("kill -TERM $$")
+    hapless.run_hap(hap, blocking=True)
+    hapless.run_hap(killed, blocking=True)
+
+    exit_record = hap.exit_record
+    assert exit_record is not None
+    assert exit_record["max_rss"] > 64 << 20
+    assert exit_record["user_time"] + exit_record["system_time"] > 0
+    assert exit_record["voluntary_switches"] >= 0
+    assert exit_record["signal"] is None
+    assert exit_record["finished"] > exit_record["started"]
+    assert hap.serialize()["exit"] == exit_record
+
+    assert killed.rc == -15
+    assert killed.snapshot().exit_record["signal"] == 15
+
+
+def test_snapshot_reads_each_file_once(hapless: Hapless):
+    hap = hapless.create_hap("false", name="hap-snapshot@2")
+    hapless.run_hap(hap, blocking=True)
+
+    with patch("os.scandir", wraps=os.scandir) as scandir_mock, patch(
+        "builtins.open", wraps=open
+    ) as open_mock:
+        snapshot = hap.snapshot()
+
+        scandir_mock.assert_called_once_with(hap.path)
+        opened = sorted(
+            Path(c.args[0]).name
+            for c in open_mock.call_args_list
+            if Path(c.args[0]).parent == hap.path
+        )
+        assert opened == ["cmd", "exit", "name", "pid", "rc", "workdir"]
+
+    assert snapshot.hid == hap.hid
+    assert snapshot.name == "hap-snapshot"
+    assert snapshot.restarts == 2
+    assert snapshot.cmd == "false"
+    assert snapshot.pid == hap.pid
+    assert snapshot.rc == 1
+    assert snapshot.status == Status.FAILED
+    assert snapshot.active is False
+    assert snapshot.start_time == hap.start_time
+    assert snapshot.end_time == hap.end_time
+    assert snapshot.owner == hap.owner
+
+
+def test_snapshot_is_immutable(hap: Hap):
+    snapshot = hap.snapshot()
+    with pytest.raises(AttributeError):
+        snapshot.rc = 0
+    with pytest.raises(AttributeError):
+        snapshot.extra = "value"
+
+
+def test_snapshot_refresh(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    snapshot = hap.snapshot()
+    assert snapshot.status == Status.UNBOUND
+
+    hap.set_return_code(0)
+    refreshed = snapshot.refresh()
+    assert refreshed is not snapshot
+    assert refreshed.status == Status.SUCCESS
+    assert refreshed.rc == 0
+    # Old snapshot stays the same
+    assert snapshot.status == Status.UNBOUND
+    assert snapshot.rc is None
+
+
+def test_snapshot_cache_reads_only_changed_haps(hapless: Hapless):
+    finished = hapless.create_hap("true", name="finished")
+    hapless.run_hap(finished, blocking=True)
+    os.utime(finished.path, (0, 0))
+    unbound = hapless.create_hap("true", name="unbound")
+    cache = SnapshotCache(hapless.dir)
+    assert [s.status for s in cache.refresh()] == [Status.SUCCESS, Status.UNBOUND]
+
+    with patch(
+        "hapless.hap.HapSnapshot._read_fields", wraps=HapSnapshot._read_fields
+    ) as read_mock:
+        cache.refresh()
+        read_mock.assert_called_once_with(unbound.path)
+
+        unbound.set_return_code(1)
+        finished.set_name("renamed")
+        read_mock.reset_mock()
+        snapshots = cache.refresh()
+        assert read_mock.call_count == 2
+
+    assert [s.name for s in snapshots] == ["renamed", "unbound"]
+    assert [s.status for s in snapshots] == [Status.SUCCESS, Status.FAILED]
+
+
 def test_represent_unbound_hap(hapless: Hapless):
     hap = hapless.create_hap("echo print", name="hap-print")
     assert f"{hap}" == "#1 (hap-print)"
@@ -158,6 +158,8 @@ def test_restart_uses_same_env(hapless: Hapless, monkeypatch):
             hid=hid,
             name="hap-same-env@1",
             redirect_stderr=False,
+            log_options=None,
+            run_options=None,
         )
 
     restarted_hap = hapless.get_hap("hap-same-env")
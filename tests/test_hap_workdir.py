@@ -44,6 +44,8 @@ def test_restart_uses_same_working_dir(hapless: Hapless, monkeypatch):
             hid=hid,
             name="hap-same-name@1",
             redirect_stderr=False,
+            log_options=None,
+            run_options=None,
         )
 
     restarted_hap = hapless.get_hap("hap-same-name")
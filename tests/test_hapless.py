@@ -240,6 +240,8 @@ def test_run_command_accepts_redirect_stderr_parameter(hapless: Hapless):
             hid=None,
             name=None,
             redirect_stderr=True,
+            log_options=None,
+            run_options=None,
         )
         run_hap_mock.assert_called_once_with(hap_mock, check=False, blocking=False)
 
@@ -258,6 +260,8 @@ def test_run_command_accepts_env_parameter(hapless: Hapless):
             hid=None,
             name=None,
             redirect_stderr=None,
+            log_options=None,
+            run_options=None,
         )
         run_hap_mock.assert_called_once_with(hap_mock, check=False, blocking=False)
 
@@ -360,6 +364,8 @@ def test_restart_preserves_redirect_state(hapless: Hapless, redirect_stderr: boo
             hid=hid,
             name="hap-redirect-state@1",
             redirect_stderr=redirect_stderr,
+            log_options=None,
+            run_options=None,
         )
 
 
@@ -413,5 +419,8 @@ def test_wrap_subprocess(hapless: Hapless):
             executable=ANY,
             stdout=ANY,
             stderr=ANY,
+            start_new_session=False,
+            preexec_fn=None,
         )
-        set_return_code_mock.assert_called_once_with(0)
+        # Mocked process is not a child, so there is no resource usage for it
+        set_return_code_mock.assert_called_once_with(0, None)
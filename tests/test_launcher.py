@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from hapless.hap import Status
+from hapless.launcher import (
+    REQUEST_TIMEOUT,
+    Launcher,
+    _get_peer_uid,
+    get_socket_path,
+    request_launch,
+)
+from hapless.main import Hapless
+from hapless.utils import wait_created
+
+
+def serve(hapless_dir: Path, idle_timeout: float) -> None:
+    Launcher(Hapless(hapless_dir=hapless_dir, quiet=True), idle_timeout).serve()
+
+
+@pytest.fixture
+def launcher(hapless: Hapless):
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=serve, args=(hapless.dir, 1.0))
+    process.start()
+    assert wait_created(get_socket_path(hapless.dir), interval=0.01, timeout=5)
+    yield process
+    process.join(timeout=5)
+
+
+def test_launch_via_launcher(hapless: Hapless, launcher):
+    hap = hapless.create_hap("echo launched", name="hap-launched")
+    with patch("hapless.launcher.start_launcher") as start_launcher_mock:
+        pid = request_launch(hapless.dir, hap.hid)
+        start_launcher_mock.assert_not_called()
+
+    assert isinstance(pid, int)
+    assert wait_created(hap._rc_file, interval=0.01, timeout=5)
+    assert hap.status == Status.SUCCESS
+    assert hap.stdout_path.read_text() == "launched\n"
+
+
+def test_launcher_rejects_bound_hap(hapless: Hapless, launcher):
+    hap = hapless.create_hap("true")
+    hapless.run_hap(hap, blocking=True)
+
+    with pytest.raises(RuntimeError) as e:
+        request_launch(hapless.dir, hap.hid)
+    assert f"Hap {hap.hid} cannot be launched" in str(e.value)
+
+
+def test_launcher_exits_when_idle(hapless: Hapless):
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=serve, args=(hapless.dir, 0.2))
+    start = time.monotonic()
+    process.start()
+    process.join(timeout=5)
+
+    assert process.exitcode == 0
+    assert time.monotonic() - start < 5
+    assert not get_socket_path(hapless.dir).exists()
+
+
+def test_launcher_is_started_lazily(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    with patch("hapless.launcher.start_launcher") as start_launcher_mock, patch(
+        "hapless.launcher.CONNECT_TIMEOUT", 0.1
+    ):
+        pid = request_launch(hapless.dir, hap.hid)
+
+        start_launcher_mock.assert_called_once_with(hapless.dir)
+        assert pid is None
+
+
+def test_spawn_fallback_without_launcher(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    with patch("hapless.config.NO_FORK", True), patch(
+        "hapless.config.LAUNCHER", True
+    ), patch("hapless.main.request_launch", return_value=None), patch.object(
+        hapless, "_run_via_spawn", return_value=12345
+    ) as run_spawn_mock:
+        pid = hapless._launch(hap)
+
+        run_spawn_mock.assert_called_once_with(hap)
+        assert pid == 12345
+
+
+def test_supervise_records_return_code(hapless: Hapless, launcher):
+    hap = hapless.create_hap("echo supervised; exit 3")
+    pid = request_launch(hapless.dir, hap.hid, supervise=True)
+
+    assert wait_created(hap._rc_file, interval=0.01, timeout=5)
+    # Hap is a direct child of the supervisor, there is no wrapper
+    assert hap.pid == pid
+    assert hap.rc == 3
+    assert hap.status == Status.FAILED
+    assert hap.stdout_path.read_text() == "supervised\n"
+
+
+def test_supervise_killed_hap(hapless: Hapless, launcher):
+    hap = hapless.create_hap("sleep 10")
+    pid = request_launch(hapless.dir, hap.hid, supervise=True)
+    os.kill(pid, signal.SIGKILL)
+
+    assert wait_created(hap._rc_file, interval=0.01, timeout=5)
+    assert hap.rc == -signal.SIGKILL
+    assert hap.exit_record["signal"] == signal.SIGKILL
+
+
+def test_supervisor_waits_for_running_haps(hapless: Hapless):
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=serve, args=(hapless.dir, 0.2))
+    process.start()
+    assert wait_created(get_socket_path(hapless.dir), interval=0.01, timeout=5)
+
+    hap = hapless.create_hap("sleep 1")
+    request_launch(hapless.dir, hap.hid, supervise=True)
+    time.sleep(0.5)
+    assert process.is_alive()
+
+    process.join(timeout=5)
+    assert process.exitcode == 0
+    assert hap.rc == 0
+
+
+def test_wrapper_fallback_without_supervisor(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    with patch("hapless.config.SUPERVISOR", True), patch(
+        "hapless.main.request_launch", return_value=None
+    ) as request_launch_mock, patch.object(
+        hapless, "_run_via_fork", return_value=12345
+    ) as run_fork_mock:
+        pid = hapless._launch(hap)
+
+        request_launch_mock.assert_called_once_with(
+            hapless.dir, hap.hid, supervise=True
+        )
+        run_fork_mock.assert_called_once_with(hap)
+        assert pid == 12345
+
+
+def test_silent_client_does_not_stall_launcher(hapless: Hapless, launcher):
+    hap = hapless.create_hap("true")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as silent:
+        silent.connect(f"{get_socket_path(hapless.dir)}")
+        start = time.monotonic()
+        pid = request_launch(hapless.dir, hap.hid)
+
+    assert isinstance(pid, int)
+    assert time.monotonic() - start < REQUEST_TIMEOUT + 1
+    assert wait_created(hap._rc_file, interval=0.01, timeout=5)
+
+
+def test_peer_uid_without_credentials_support(monkeypatch):
+    first, second = socket.socketpair()
+    with first, second:
+        if hasattr(socket, "SO_PEERCRED"):
+            assert _get_peer_uid(first) == os.getuid()
+        monkeypatch.delattr(socket, "SO_PEERCRED", raising=False)
+        monkeypatch.delattr(socket, "LOCAL_PEERCRED", raising=False)
+        assert _get_peer_uid(first) is None
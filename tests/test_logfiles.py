@@ -0,0 +1,496 @@
+import io
+import os
+import signal
+import subprocess
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from hapless.logfiles import (
+    RING_HEADER_SIZE,
+    RingLog,
+    RotatingLog,
+    TimestampedLog,
+    _has_exited,
+    compress_segment,
+    copy_log,
+    copy_range,
+    find_range,
+    get_segments,
+    iter_log,
+    iter_range,
+    iter_tail,
+    iter_timed_lines,
+    merge_logs,
+    pump_output,
+    read_index,
+    tail_offset,
+)
+from hapless.main import Hapless
+from hapless.utils import tail_lines
+
+
+@pytest.mark.parametrize(
+    "content, lines, expected",
+    [
+        (b"", 10, b""),
+        (b"a\nb\nc\n", 2, b"b\nc\n"),
+        (b"a\nb\nc", 2, b"b\nc"),
+        (b"a\nb\nc\n", 10, b"a\nb\nc\n"),
+        (b"a\nb\nc\n", 0, b""),
+    ],
+)
+def test_tail_offset(content, lines, expected):
+    f = io.BytesIO(content)
+    assert content[tail_offset(f, lines) :] == expected
+
+
+def test_tail_offset_spans_blocks():
+    content = b"".join(f"{i:08}\n".encode() for i in range(5000))
+    f = io.BytesIO(content)
+    assert content[tail_offset(f, 3) :] == b"00004997\n00004998\n00004999\n"
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "stdout.log"
+    path.write_bytes(b"".join(f"line {i}\n".encode() for i in range(100000)))
+    return path
+
+
+def test_iter_tail_lines(log_file):
+    data = b"".join(iter_tail(log_file, lines=2))
+    assert data == b"line 99998\nline 99999\n"
+
+
+def test_iter_tail_bytes(log_file):
+    assert b"".join(iter_tail(log_file, nbytes=6)) == b"99999\n"
+    assert b"".join(iter_tail(log_file, nbytes=10**9)) == log_file.read_bytes()
+
+
+def test_iter_range(log_file):
+    assert b"".join(iter_range(log_file, offset=7, length=7)) == b"line 1\n"
+    assert b"".join(iter_range(log_file, offset=10**9)) == b""
+
+
+def test_iter_range_reads_in_blocks(log_file):
+    chunks = list(iter_range(log_file, length=1000, block_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+
+
+def test_tail_lines(log_file):
+    assert tail_lines(log_file, n=3) == ["line 99997\n", "line 99998\n", "line 99999\n"]
+
+
+def test_logs_last_lines(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    hap = hapless.create_hap("true")
+    hap.stdout_path.write_text("first\nsecond\nthird")
+    hapless.logs(hap, lines=2, raw=False)
+    out = capsys.readouterr().out
+    assert "Showing logs at" in out
+    assert "first" not in out
+    assert out.endswith("second\nthird\n")
+
+
+def test_logs_empty_range(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    hap = hapless.create_hap("true")
+    hap.stdout_path.write_text("content\n")
+    hapless.logs(hap, offset=100, raw=False)
+    assert "No logs found" in capsys.readouterr().out
+
+
+def test_logs_raw_when_not_terminal(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    hap = hapless.create_hap("true")
+    hap.stdout_path.write_bytes(b"\xff binary\nlast")
+    hapless.logs(hap, lines=1)
+    assert capsys.readouterr().out == "last"
+
+
+@pytest.mark.parametrize("sendfile", [True, False])
+def test_copy_range(log_file, tmp_path, monkeypatch, sendfile):
+    if not sendfile:
+        monkeypatch.delattr(os, "sendfile", raising=False)
+    out_path = tmp_path / "out.log"
+    with open(out_path, "wb") as out:
+        assert copy_range(log_file, out.fileno(), offset=7, length=14) == 14
+    assert out_path.read_bytes() == b"line 1\nline 2\n"
+
+
+def test_copy_range_whole_file(log_file, tmp_path):
+    out_path = tmp_path / "out.log"
+    with open(out_path, "wb") as out:
+        copy_range(log_file, out.fileno())
+    assert out_path.read_bytes() == log_file.read_bytes()
+
+
+def test_rotating_log_keeps_last_segments(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = RotatingLog(path, max_size=10, keep=2)
+    for i in range(5):
+        log.write(f"chunk {i}\n".encode())
+    log.close()
+
+    assert [segment.name for segment in get_segments(path)] == [
+        "stdout.log.3",
+        "stdout.log.4",
+    ]
+    assert path.read_bytes() == b"chunk 4\n"
+    assert b"".join(iter_log(path)) == b"chunk 2\nchunk 3\nchunk 4\n"
+
+
+@pytest.mark.parametrize("compress", ["gzip", "zstd"])
+def test_rotating_log_compresses_segments(tmp_path, compress):
+    if compress == "zstd":
+        pytest.importorskip("zstandard")
+    path = tmp_path / "stdout.log"
+    log = RotatingLog(path, max_size=20, compress=compress)
+    for i in range(6):
+        log.write(f"line {i}\n".encode())
+    log.close()
+
+    segments = get_segments(path)
+    assert segments
+    assert all(segment.suffix in (".gz", ".zst") for segment in segments)
+    assert not list(tmp_path.glob(".*"))
+    expected = b"".join(f"line {i}\n".encode() for i in range(6))
+    assert b"".join(iter_log(path)) == expected
+
+
+def test_rotating_log_compresses_in_background(tmp_path):
+    release = threading.Event()
+
+    def slow_compress_segment(path, compress):
+        assert release.wait(timeout=5)
+        return compress_segment(path, compress)
+
+    path = tmp_path / "stdout.log"
+    log = RotatingLog(path, max_size=10, keep=1, compress="gzip")
+    with patch("hapless.logfiles.compress_segment", slow_compress_segment):
+        for i in range(4):
+            log.write(f"chunk {i}\n".encode())
+
+    # Writing is not held up and segments waiting for compression are kept
+    segments = get_segments(path)
+    assert [segment.name for segment in segments] == [
+        "stdout.log.1",
+        "stdout.log.2",
+        "stdout.log.3",
+    ]
+    assert b"".join(iter_log(path)) == b"chunk 0\nchunk 1\nchunk 2\nchunk 3\n"
+
+    release.set()
+    log.close()
+    assert [segment.name for segment in get_segments(path)] == ["stdout.log.3.gz"]
+    assert b"".join(iter_log(path)) == b"chunk 2\nchunk 3\n"
+
+
+@pytest.fixture
+def rotated_log(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = RotatingLog(path, max_size=30, compress="gzip")
+    for i in range(20):
+        log.write(f"line {i}\n".encode())
+    log.close()
+    return path
+
+
+def test_iter_log_tail_across_segments(rotated_log):
+    data = b"".join(iter_log(rotated_log, lines=6))
+    assert data == b"".join(f"line {i}\n".encode() for i in range(14, 20))
+    assert b"".join(iter_log(rotated_log, nbytes=16)) == b"line 18\nline 19\n"
+
+
+def test_iter_log_range_across_segments(rotated_log):
+    data = b"".join(iter_log(rotated_log))
+    assert b"".join(iter_log(rotated_log, offset=20, length=30)) == data[20:50]
+
+
+def test_copy_log_across_segments(rotated_log, tmp_path):
+    out_path = tmp_path / "out.log"
+    with open(out_path, "wb") as out:
+        copy_log(rotated_log, out.fileno(), lines=2)
+    assert out_path.read_bytes() == b"line 18\nline 19\n"
+
+
+def test_run_hap_with_rotated_logs(hapless: Hapless):
+    hapless.run_command(
+        "python -c 'for i in range(1000): print(i)'",
+        name="rotated",
+        log_options={"max_size": 1000, "keep": 2},
+        blocking=True,
+    )
+    hap = hapless.get_hap("rotated")
+    assert hap.rc == 0
+    assert hap.log_options == {"max_size": 1000, "keep": 2}
+    assert len(get_segments(hap.stdout_path)) == 2
+    assert hap.stdout_path.stat().st_size <= 1000
+    assert b"".join(iter_log(hap.stdout_path, lines=1)) == b"999\n"
+
+
+def test_ring_log_keeps_latest_output(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = RingLog(path, size=30)
+    for i in range(20):
+        log.write(f"line {i:02}\n".encode())
+    log.close()
+
+    assert path.stat().st_size == RING_HEADER_SIZE + 30
+    # NOTE: partially overwritten line is skipped
+    assert b"".join(iter_log(path)) == b"line 17\nline 18\nline 19\n"
+    assert b"".join(iter_log(path, lines=2)) == b"line 18\nline 19\n"
+    assert b"".join(iter_log(path, offset=8, length=7)) == b"line 18"
+    assert tail_lines(path, n=1) == ["line 19\n"]
+
+
+def test_ring_log_reopened_continues(tmp_path):
+    path = tmp_path / "stdout.log"
+    path.touch()
+    log = RingLog(path, size=16)
+    log.write(b"first\n")
+    log.close()
+    log = RingLog(path, size=16)
+    log.write(b"second\n")
+    log.close()
+    assert b"".join(iter_log(path)) == b"first\nsecond\n"
+
+
+def test_ring_log_chunk_bigger_than_buffer(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = RingLog(path, size=8)
+    log.write(b"0123456789abc")
+    log.close()
+    assert b"".join(iter_log(path)) == b"56789abc"
+    log = RingLog(path, size=8)
+    log.write(b"d\nef")
+    log.close()
+    assert b"".join(iter_log(path)) == b"ef"
+
+
+def test_copy_ring_log(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = RingLog(path, size=8)
+    log.write(b"abc\ndef\n")
+    log.close()
+    out_path = tmp_path / "out.log"
+    with open(out_path, "wb") as out:
+        copy_log(path, out.fileno(), lines=1)
+    assert out_path.read_bytes() == b"def\n"
+
+
+@pytest.mark.parametrize(
+    "log_options, expected",
+    [
+        ({"mode": "ring", "size": 100}, b"996\n997\n998\n999\n"),
+        ({"mode": "null"}, b""),
+    ],
+)
+def test_run_hap_with_log_mode(hapless: Hapless, log_options, expected):
+    hapless.run_command(
+        "python -c 'for i in range(1000): print(i)'",
+        name="moded",
+        log_options=log_options,
+        blocking=True,
+    )
+    hap = hapless.get_hap("moded")
+    assert hap.rc == 0
+    assert b"".join(iter_log(hap.stdout_path, lines=4)) == expected
+
+
+@pytest.fixture
+def timestamped_log(tmp_path):
+    path = tmp_path / "stdout.log"
+    log = TimestampedLog(path, index_bytes=16, index_interval=60)
+    with patch("hapless.logfiles.time.time", side_effect=range(100, 110)):
+        for i in range(10):
+            log.write(f"line {i}\npart".encode() if i == 9 else f"line {i}\n".encode())
+    log.close()
+    return path
+
+
+def test_timestamped_log_writes_sparse_index(timestamped_log):
+    # NOTE: entries point right after the last newline of the chunk
+    assert read_index(timestamped_log) == [
+        (7, 1, 100.0),
+        (28, 4, 103.0),
+        (49, 7, 106.0),
+        (70, 10, 109.0),
+    ]
+
+
+def test_find_range_by_time(timestamped_log):
+    start, length = find_range(timestamped_log, since=104.5, until=105.5)
+    # NOTE: lines on the edges are included as the index is sparse
+    assert b"".join(iter_log(timestamped_log, offset=start, length=length)) == (
+        b"line 4\nline 5\nline 6\n"
+    )
+    assert find_range(timestamped_log, since=107.5) == (49, None)
+    assert find_range(timestamped_log, until=99) == (0, 7)
+
+
+@pytest.mark.parametrize(
+    "from_line, offset",
+    [(1, 0), (2, 7), (4, 21), (6, 35), (10, 63), (12, 74)],
+)
+def test_find_range_from_line(timestamped_log, from_line, offset):
+    assert find_range(timestamped_log, from_line=from_line) == (offset, None)
+
+
+def test_find_range_without_index(log_file):
+    assert find_range(log_file, from_line=3) == (14, None)
+    with pytest.raises(ValueError, match="no timestamps"):
+        find_range(log_file, since=time.time())
+
+
+def test_logs_since(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    hap = hapless.create_hap("true")
+    log = TimestampedLog(hap.stdout_path, index_interval=0)
+    with patch("hapless.logfiles.time.time", side_effect=[100, 200]):
+        log.write(b"old\n")
+        log.write(b"new\n")
+    log.close()
+    hapless.logs(hap, since=150, raw=True)
+    assert capsys.readouterr().out == "new\n"
+
+
+def test_logs_since_without_timestamps(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    hap = hapless.create_hap("true")
+    hap.stdout_path.write_text("content\n")
+    with pytest.raises(SystemExit):
+        hapless.logs(hap, since=150)
+    assert "--log-timestamps" in capsys.readouterr().out
+
+
+def test_run_hap_with_timestamps(hapless: Hapless):
+    hapless.run_command(
+        "python -c 'for i in range(1000): print(i)'",
+        name="stamped",
+        log_options={"mode": "file", "timestamps": True},
+        blocking=True,
+    )
+    hap = hapless.get_hap("stamped")
+    assert hap.rc == 0
+    assert read_index(hap.stdout_path)
+    start, _ = find_range(hap.stdout_path, from_line=998, since=0)
+    assert b"".join(iter_log(hap.stdout_path, offset=start)) == b"997\n998\n999\n"
+
+
+def test_iter_timed_lines(timestamped_log):
+    os.utime(timestamped_log, (200, 200))
+    stamps = [ts for ts, _ in iter_timed_lines(timestamped_log)]
+    assert stamps == [100, 103, 103, 103, 106, 106, 106, 109, 109, 109, 200]
+
+
+def test_iter_timed_lines_without_index(log_file):
+    os.utime(log_file, (200, 200))
+    lines = list(iter_timed_lines(log_file, block_size=100))
+    assert len(lines) == 100000
+    assert lines[-1] == (200, b"line 99999")
+
+
+def _write_timed(path, entries):
+    log = TimestampedLog(path, index_interval=0)
+    with patch("hapless.logfiles.time.time", side_effect=[ts for ts, _ in entries]):
+        for _, line in entries:
+            log.write(line)
+    log.close()
+
+
+def test_merge_logs(tmp_path):
+    first, second, old = tmp_path / "first", tmp_path / "second", tmp_path / "old"
+    _write_timed(first, [(100, b"a1\n"), (103, b"a2\n"), (104, b"a3\n")])
+    _write_timed(second, [(101, b"b1\n"), (102, b"b2\n"), (105, b"b3\n")])
+    # NOTE: log without timestamps is placed by its modification time
+    old.write_bytes(b"c1\nc2\n")
+    os.utime(old, (102.5, 102.5))
+    os.utime(first, (300, 300))
+    os.utime(second, (300, 300))
+
+    assert list(merge_logs([first, second, old])) == [
+        (0, b"a1"),
+        (1, b"b1"),
+        (1, b"b2"),
+        (2, b"c1"),
+        (2, b"c2"),
+        (0, b"a2"),
+        (0, b"a3"),
+        (1, b"b3"),
+    ]
+
+
+def test_merge_logs_of_haps(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    build = hapless.create_hap("true", name="build")
+    test = hapless.create_hap("true", name="test")
+    _write_timed(build.stdout_path, [(100, b"compiling\n")])
+    _write_timed(test.stdout_path, [(102, b"running\n")])
+    _write_timed(test.stderr_path, [(101, b"warning\n")])
+    for path in (build.stdout_path, test.stdout_path, test.stderr_path):
+        os.utime(path, (200, 200))
+    hapless.merge_logs([build, test])
+    assert capsys.readouterr().out.splitlines() == [
+        "build | compiling",
+        "test  ! warning",
+        "test  | running",
+    ]
+
+
+def test_merge_logs_after_haps_are_loaded(tmp_path, capsys):
+    hapless = Hapless(hapless_dir=tmp_path)
+    early = hapless.create_hap("true", name="early")
+    late = hapless.create_hap("true", name="late")
+    early.stdout_path.write_bytes(b"first\n")
+    late.stdout_path.write_bytes(b"second\n")
+    os.utime(early.stdout_path, (100, 100))
+    os.utime(late.stdout_path, (200, 200))
+
+    # Loading the hap, e.g. to show its logs, keeps the files untouched
+    early = hapless.get_hap(early.hid)
+    assert early.stdout_path.stat().st_mtime == 100
+    hapless.merge_logs([early, late])
+    assert capsys.readouterr().out.splitlines() == [
+        "early | first",
+        "late  | second",
+    ]
+
+
+@pytest.mark.parametrize("waitid", [True, False])
+def test_has_exited_keeps_child_unreaped(monkeypatch, waitid):
+    if not waitid:
+        monkeypatch.delattr(os, "waitid", raising=False)
+    proc = subprocess.Popen(["sleep", "0.2"])
+    assert not _has_exited(proc.pid)
+    deadline = time.monotonic() + 5
+    while not _has_exited(proc.pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert _has_exited(proc.pid)
+    # Exit status is still there to be collected
+    _, status = os.waitpid(proc.pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_pump_output_stops_with_chatty_descendant(tmp_path):
+    proc = subprocess.Popen(
+        ["sh", "-c", "(while true; do echo tick; sleep 0.1; done) & echo done"],
+        stdout=subprocess.PIPE,
+        start_new_session=True,
+    )
+    log = RingLog(tmp_path / "stdout.log", size=1024)
+    pump = threading.Thread(target=pump_output, args=(proc, {proc.stdout: log}))
+    try:
+        pump.start()
+        pump.join(timeout=5)
+        assert not pump.is_alive()
+    finally:
+        # Background child still holds the pipe
+        os.killpg(proc.pid, signal.SIGKILL)
+        pump.join()
+    assert proc.wait() == 0
+    assert b"done\n" in b"".join(iter_log(tmp_path / "stdout.log"))
@@ -0,0 +1,101 @@
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from hapless.main import Hapless
+from hapless.names import NameIndex
+
+
+def test_lookup_does_not_scan_haps(hapless: Hapless):
+    hapless.create_hap("true", name="hap-one")
+    hap = hapless.create_hap("true", name="hap-two")
+
+    with patch.object(
+        hapless, "_get_hap_names_map", side_effect=AssertionError
+    ) as names_map_mock, patch.object(
+        hapless, "_get_hap_dirs", side_effect=AssertionError
+    ) as hap_dirs_mock:
+        found = hapless.get_hap("hap-two")
+        missing = hapless.get_hap("hap-three")
+
+        names_map_mock.assert_not_called()
+        hap_dirs_mock.assert_not_called()
+
+    assert found is not None
+    assert found.hid == hap.hid
+    assert missing is None
+
+
+def test_index_is_rebuilt_when_missing(hapless: Hapless):
+    hap = hapless.create_hap("true", name="hap-rebuild")
+    shutil.rmtree(hapless.dir / NameIndex.DIRNAME)
+
+    found = hapless.get_hap("hap-rebuild")
+    assert found is not None
+    assert found.hid == hap.hid
+    assert os.readlink(hapless.dir / NameIndex.DIRNAME / "hap-rebuild") == hap.hid
+
+
+def test_corrupted_entry_is_rebuilt(hapless: Hapless):
+    hap = hapless.create_hap("true", name="hap-corrupted")
+    entry = hapless.dir / NameIndex.DIRNAME / "hap-corrupted"
+    entry.unlink()
+    entry.write_text("garbage")
+
+    found = hapless.get_hap("hap-corrupted")
+    assert found is not None
+    assert found.hid == hap.hid
+    assert entry.is_symlink()
+
+
+def test_stale_entry_is_rebuilt(hapless: Hapless):
+    hap1 = hapless.create_hap("true", name="hap-stale")
+    # Remove hap bypassing hapless, so index still points to the removed hap
+    shutil.rmtree(hap1.path)
+    hap2 = hapless.create_hap("true", hid=hap1.hid, name="hap-other")
+
+    assert hapless.get_hap("hap-stale") is None
+    found = hapless.get_hap("hap-other")
+    assert found is not None
+    assert found.hid == hap2.hid
+
+
+def test_claim_respects_hap_being_created(hapless: Hapless):
+    names = hapless._names
+    names.claim("hap-new", "1")
+    # Owner has created its directory and is in the middle of writing its name
+    (hapless.dir / "1").mkdir()
+    (hapless.dir / "1" / "name").write_text("")
+
+    with pytest.raises(FileExistsError):
+        names.claim("hap-new", "2")
+    assert names.get("hap-new") == "1"
+
+
+def test_rename_updates_index(hapless: Hapless):
+    hap = hapless.create_hap("true", name="hap-before")
+    hapless.rename_hap(hap, "hap-after")
+
+    assert not (hapless.dir / NameIndex.DIRNAME / "hap-before").exists()
+    found = hapless.get_hap("hap-after")
+    assert found is not None
+    assert found.hid == hap.hid
+
+
+def test_clean_updates_index(hapless: Hapless):
+    hap = hapless.create_hap("true", name="hap-done")
+    hapless.run_hap(hap, blocking=True)
+    hapless.clean()
+
+    assert not (hapless.dir / NameIndex.DIRNAME / "hap-done").exists()
+    assert hapless.get_hap("hap-done") is None
+
+
+@pytest.mark.parametrize("name", ["..", "with/slash", "100%", "a" * 300])
+def test_unusual_names(hapless: Hapless, name: str):
+    hap = hapless.create_hap("true", name=name)
+    found = hapless.get_hap(name)
+    assert found is not None
+    assert found.hid == hap.hid
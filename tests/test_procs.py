@@ -0,0 +1,140 @@
+import os
+import subprocess
+import time
+from unittest.mock import patch
+
+import psutil
+import pytest
+
+from hapless.hap import Status, load_snapshots
+from hapless.main import Hapless
+from hapless.procs import (
+    ResourceMonitor,
+    get_process_tree,
+    get_tree_usage,
+    probe_processes,
+    probe_tree_usage,
+)
+
+
+@pytest.fixture
+def sleeper():
+    proc = subprocess.Popen(["sleep", "10"])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+@pytest.mark.parametrize("procfs", [True, False])
+def test_probe_processes(procfs: bool, sleeper):
+    missing_pid = 2**22 + 1
+    with patch("hapless.procs.PROC_DIR", "/proc" if procfs else "/nonexistent"):
+        procs = probe_processes([os.getpid(), sleeper.pid, missing_pid])
+
+    assert set(procs) == {os.getpid(), sleeper.pid}
+    info = procs[sleeper.pid]
+    proc = psutil.Process(sleeper.pid)
+    assert info.ppid == os.getpid()
+    assert info.stopped is False
+    assert info.username == proc.username()
+    assert info.create_time == pytest.approx(proc.create_time(), abs=0.1)
+
+
+def test_probe_stopped_process(sleeper):
+    proc = psutil.Process(sleeper.pid)
+    proc.suspend()
+    # Signal is delivered asynchronously
+    while proc.status() != psutil.STATUS_STOPPED:
+        time.sleep(0.01)
+
+    procs = probe_processes([sleeper.pid])
+    assert procs[sleeper.pid].stopped is True
+
+
+def test_snapshots_are_probed_in_one_pass(hapless: Hapless, sleeper):
+    haps = [hapless.create_hap("sleep 10") for _ in range(3)]
+    for hap in haps:
+        hap.bind(sleeper.pid)
+    finished = hapless.create_hap("true")
+    hapless.run_hap(finished, blocking=True)
+
+    with patch(
+        "hapless.hap.probe_processes", wraps=probe_processes
+    ) as probe_mock, patch("psutil.Process") as process_mock:
+        snapshots = load_snapshots([*haps, finished])
+
+        # Process of the finished hap is not looked up at all
+        probe_mock.assert_called_once_with([sleeper.pid] * 3)
+        process_mock.assert_not_called()
+
+    assert [s.status for s in snapshots] == [Status.RUNNING] * 3 + [Status.SUCCESS]
+    assert snapshots[0].proc.ppid == os.getpid()
+
+
+def test_reused_pid_is_not_running(hapless: Hapless, sleeper):
+    hap = hapless.create_hap("sleep 10")
+    hap.bind(sleeper.pid)
+    # Pretend the pid has been recorded long before the process was created
+    create_time = psutil.Process(sleeper.pid).create_time()
+    os.utime(hap._pid_file, (create_time - 60, create_time - 60))
+
+    snapshot = hap.snapshot()
+    assert snapshot.proc is None
+    assert snapshot.status == Status.FAILED
+
+    reloaded = hapless.get_hap(hap.hid)
+    assert reloaded.proc is None
+    assert reloaded.status == Status.FAILED
+
+
+@pytest.mark.parametrize("task_children", [True, False])
+def test_process_tree_usage(task_children: bool):
+    proc = subprocess.Popen(["sh", "-c", "sleep 10 & sleep 10; wait"])
+    exists = os.path.exists
+    try:
+        with patch(
+            "hapless.procs.os.path.exists",
+            side_effect=lambda path: exists(path) if task_children else False,
+        ):
+            # Shell forks its children asynchronously
+            tree = get_process_tree(proc.pid)
+            while len(tree) < 3:
+                time.sleep(0.01)
+                tree = get_process_tree(proc.pid)
+            usage = get_tree_usage(proc.pid)
+    finally:
+        proc.kill()
+        proc.wait()
+
+    assert tree[0] == proc.pid
+    assert len(tree) == 3
+    assert usage is not None
+    cpu_time, rss, threads = usage
+    assert cpu_time >= 0
+    assert rss > 0
+    assert threads == 3
+    assert get_tree_usage(proc.pid) is None
+
+
+def test_probe_tree_usage():
+    proc = subprocess.Popen(["sh", "-c", "sleep 10 & sleep 10; wait"])
+    try:
+        usage = probe_tree_usage([proc.pid])
+        while usage[proc.pid].children < 2:
+            time.sleep(0.01)
+            usage = probe_tree_usage([proc.pid])
+        infos = probe_processes([proc.pid]).values()
+        monitor = ResourceMonitor()
+        first = monitor.probe(infos)[proc.pid]
+        second = monitor.probe(infos)[proc.pid]
+    finally:
+        proc.kill()
+        proc.wait()
+
+    tree = usage[proc.pid]
+    assert tree.children == 2
+    assert tree.rss > 0
+    assert tree.uss is None or 0 < tree.uss <= tree.rss
+    assert first.cpu_percent >= 0
+    assert second.cpu_percent >= 0
+    assert probe_tree_usage([proc.pid]) == {}
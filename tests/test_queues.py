@@ -0,0 +1,97 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from hapless import cli
+from hapless.hap import Status
+from hapless.main import Hapless
+from hapless.queues import LAUNCH_TIMEOUT, JobQueue, get_queue_positions
+
+
+def test_queue_order_and_concurrency(hapless: Hapless):
+    queue = hapless.get_queue("build")
+    queue.set_concurrency(2)
+    haps = [
+        hapless.create_hap("true", run_options={"queue": "build", "priority": p})
+        for p in (0, 0, 5, -1)
+    ]
+    queue.push(haps)
+    assert queue.pending() == [haps[2].hid, haps[0].hid, haps[1].hid, haps[3].hid]
+
+    statuses = {hap.hid: Status.UNBOUND for hap in haps}
+    assert queue.claim(statuses.get) == [haps[2].hid, haps[0].hid]
+    statuses[haps[2].hid] = Status.RUNNING
+    # Dispatched haps take the slots until they finish
+    assert queue.claim(statuses.get) == []
+
+    statuses[haps[0].hid] = Status.SUCCESS
+    assert queue.claim(statuses.get) == [haps[1].hid]
+    assert sorted(queue.running()) == sorted([haps[2].hid, haps[1].hid])
+    assert get_queue_positions(hapless.dir)[haps[3].hid].position == 1
+
+
+def test_queue_skips_removed_and_requeues_lost_haps(tmp_path):
+    queue = JobQueue(tmp_path, "q")
+    queue.set_concurrency(1)
+    first, second = "1", "2"
+    queue._pending_dir.joinpath(f"0_1_{first}").touch()
+    queue._pending_dir.joinpath(f"0_2_{second}").touch()
+
+    statuses = {second: Status.UNBOUND}
+    assert queue.claim(statuses.get) == [second]
+    assert queue.pending() == []
+
+    # Hap has been claimed, but the process starting it has died
+    stale = time.time() - LAUNCH_TIMEOUT - 1
+    os.utime(queue._running_dir / second, (stale, stale))
+    assert queue.claim(statuses.get) == [second]
+
+
+def test_finished_hap_starts_next_one(hapless: Hapless):
+    hapless.get_queue("q").set_concurrency(1)
+    specs = [{"cmd": "true"}, {"cmd": "true"}, {"cmd": "true"}]
+    with patch.object(hapless, "_launch") as launch_mock:
+        haps = hapless.run_many(specs, run_options={"queue": "q"})
+        assert [c.args[0].hid for c in launch_mock.call_args_list] == [haps[0].hid]
+
+        hapless._wrap_subprocess(haps[0])
+        assert haps[0].rc == 0
+        assert [c.args[0].hid for c in launch_mock.call_args_list] == [
+            haps[0].hid,
+            haps[1].hid,
+        ]
+    assert hapless.get_queue("q").pending() == [haps[2].hid]
+
+
+def test_queued_haps_use_wrapper(hapless: Hapless):
+    hap = hapless.create_hap("true", run_options={"queue": "q"})
+    assert hapless._needs_wrapper(hap)
+
+
+def test_run_queue_invocation(runner):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(
+            cli.cli,
+            ["run", "--queue", "nightly", "--concurrency", "16", "--", "make"],
+        )
+        assert result.exit_code == 0
+        assert run_command_mock.call_args.kwargs["run_options"] == {"queue": "nightly"}
+    assert runner.hapless.get_queue("nightly").concurrency == 16
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--concurrency", "2"],
+        ["--priority", "1"],
+        ["--queue", "q", "--check"],
+        ["--queue", "q", "--max-in-flight", "2"],
+        ["--queue", "../q"],
+        ["--queue", "q", "--concurrency", "0"],
+    ],
+)
+def test_run_queue_invalid_usage(runner, args):
+    result = runner.invoke(cli.cli, ["run", *args, "--", "make"])
+    assert result.exit_code == 2
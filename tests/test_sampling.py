@@ -0,0 +1,102 @@
+import subprocess
+import time
+from unittest.mock import patch
+
+import pytest
+
+from hapless import cli
+from hapless.main import Hapless
+from hapless.sampling import SAMPLE, Sampler, Samples, sparkline, summarize
+
+
+def test_summarize():
+    summary = summarize([float(value) for value in range(100, 0, -1)])
+    assert summary == {"min": 1, "avg": 50.5, "max": 100, "p95": 95}
+    assert summarize([7]) == {"min": 7, "avg": 7, "max": 7, "p95": 7}
+
+
+def test_sparkline():
+    assert sparkline([0, 1, 2, 3, 4, 5, 6, 7]) == "▁▂▃▄▅▆▇█"
+    assert sparkline([5, 5, 5]) == "▁▁▁"
+    # NOTE: values are averaged into buckets to fit the width
+    assert sparkline([0, 0, 7, 7, 0, 0], width=3) == "▁█▁"
+
+
+def test_read_samples_skips_partial_record(tmp_path):
+    path = tmp_path / "samples"
+    path.write_bytes(SAMPLE.pack(100.0, 12.5, 4096, 3) + b"\x00" * 5)
+    samples = Samples.read(path)
+    assert len(samples) == 1
+    assert list(samples.cpu) == [12.5]
+    assert list(samples.rss) == [4096]
+    assert list(samples.threads) == [3]
+    assert not Samples.read(tmp_path / "missing")
+
+
+def test_sampler_records_process_tree(tmp_path):
+    proc = subprocess.Popen(["sh", "-c", "sleep 10 & sleep 10; wait"])
+    path = tmp_path / "samples"
+    sampler = Sampler(proc.pid, path, interval=0.05)
+    sampler.start()
+    try:
+        time.sleep(0.3)
+    finally:
+        sampler.stop()
+        proc.kill()
+        proc.wait()
+
+    samples = Samples.read(path)
+    assert len(samples) >= 2
+    # Shell with its two children
+    assert samples.threads[-1] == 3
+    assert samples.rss[-1] > 0
+    assert all(cpu >= 0 for cpu in samples.cpu)
+
+
+def test_sampler_stops_once_process_is_gone(tmp_path):
+    proc = subprocess.Popen(["true"])
+    proc.wait()
+    sampler = Sampler(proc.pid, tmp_path / "samples", interval=0.01)
+    sampler.start()
+    sampler.join(timeout=1)
+    assert not sampler.is_alive()
+
+
+def test_run_hap_with_sampling(hapless: Hapless, capsys):
+    hapless.run_command(
+        "sleep 0.3",
+        name="sampled",
+        run_options={"sample_interval": 0.05},
+        blocking=True,
+    )
+    hap = hapless.get_hap("sampled")
+    assert hap.rc == 0
+    assert hap.run_options == {"sample_interval": 0.05}
+    assert len(Samples.read(hap.samples_path)) >= 2
+
+    Hapless(hapless_dir=hapless.dir, quiet=False).show_samples(hap)
+    out = capsys.readouterr().out
+    assert "CPU %" in out
+    assert "Memory" in out
+
+
+def test_show_samples_without_samples(hapless: Hapless):
+    hap = hapless.create_hap("true")
+    with pytest.raises(SystemExit) as e:
+        hapless.show_samples(hap)
+    assert e.value.code == 1
+
+
+def test_run_with_sample_interval(runner):
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(
+            cli.cli, ["run", "--sample-interval", "5", "--", "script"]
+        )
+        assert result.exit_code == 0
+        run_command_mock.assert_called_once_with(
+            "script",
+            name=None,
+            check=False,
+            log_options=None,
+            run_options={"sample_interval": 5.0},
+        )
@@ -0,0 +1,175 @@
+import os
+import sys
+from unittest.mock import ANY, patch
+
+import pytest
+
+from hapless import cli
+from hapless.main import Hapless
+from hapless.scheduling import (
+    apply_run_options,
+    format_cpus,
+    get_available_cpus,
+    get_preexec_fn,
+    parse_cpus,
+    parse_ionice,
+)
+
+linux_only = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="Scheduling attributes of Linux"
+)
+
+
+def test_parse_and_format_cpus():
+    assert parse_cpus("0-3,6") == [0, 1, 2, 3, 6]
+    assert parse_cpus("2, 1,1") == [1, 2]
+    assert format_cpus([0, 1, 2, 3, 6, 8, 9]) == "0-3,6,8-9"
+    for value in ("", "a", "3-1", "1-"):
+        with pytest.raises(ValueError):
+            parse_cpus(value)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("best-effort:7", (2, 7)),
+        ("be", (2, 4)),
+        ("rt:0", (1, 0)),
+        ("3", (3, 0)),
+        ("idle:5", (3, 0)),
+    ],
+)
+def test_parse_ionice(value, expected):
+    assert parse_ionice(value) == expected
+
+
+@pytest.mark.parametrize("value", ["fast", "be:8", "2:x", "4"])
+def test_parse_ionice_invalid(value):
+    with pytest.raises(ValueError):
+        parse_ionice(value)
+
+
+def test_preexec_fn_only_when_needed():
+    assert get_preexec_fn(None) is None
+    assert get_preexec_fn({"sample_interval": 1.0}) is None
+    assert get_preexec_fn({"nice": 5}) is not None
+
+
+def test_failures_are_reported(capfd):
+    with patch("os.setpriority", side_effect=PermissionError("not permitted")):
+        apply_run_options({"nice": -10})
+    assert capfd.readouterr().err == "hapless: cannot set nice: not permitted\n"
+
+
+@linux_only
+def test_run_options_applied_to_hap(hapless: Hapless):
+    cpu = get_available_cpus()[-1]
+    hap = hapless.create_hap(
+        "grep Cpus_allowed_list /proc/self/status; nice; ulimit -t; ulimit -v; "
+        "cat /proc/self/oom_score_adj",
+        run_options={
+            "cpus": [cpu],
+            "nice": 5,
+            "ionice": "idle",
+            "oom_score_adj": 500,
+            "max_memory": 1 << 30,
+            "max_cpu_time": 60,
+        },
+    )
+    hapless.run_hap(hap, blocking=True)
+
+    assert hap.rc == 0
+    assert hap.stdout_path.read_text().split() == [
+        "Cpus_allowed_list:",
+        f"{cpu}",
+        "5",
+        "60",
+        f"{1 << 20}",
+        "500",
+    ]
+    assert hap.stderr_path.read_text() == ""
+
+
+def test_spread_assigns_cpus_round_robin(hapless: Hapless):
+    specs = [{"cmd": f"echo {num}"} for num in range(5)]
+    haps = hapless.create_haps(specs, run_options={"cpus": [2, 5]}, spread=True)
+    assert [hap.run_options["cpus"] for hap in haps] == [[2], [5], [2], [5], [2]]
+
+    with patch("hapless.main.get_available_cpus", return_value=[0, 1, 2]):
+        haps = hapless.create_haps(specs[:4], run_options={"nice": 3}, spread=True)
+    assert [hap.run_options for hap in haps] == [
+        {"nice": 3, "cpus": [0]},
+        {"nice": 3, "cpus": [1]},
+        {"nice": 3, "cpus": [2]},
+        {"nice": 3, "cpus": [0]},
+    ]
+
+
+def test_run_scheduling_invocation(runner):
+    cpus = get_available_cpus()
+    with patch.object(runner.hapless, "run_command") as run_command_mock:
+        result = runner.invoke(
+            cli.cli,
+            [
+                "run",
+                "--cpus",
+                f"{cpus[0]}",
+                "--nice",
+                "10",
+                "--ionice",
+                "be:7",
+                "--oom-score-adj",
+                "-100",
+                "--max-memory",
+                "2G",
+                "--max-cpu-time",
+                "30",
+                "--",
+                "make",
+            ],
+        )
+        assert result.exit_code == 0
+        run_command_mock.assert_called_once_with(
+            "make",
+            name=None,
+            check=False,
+            log_options=None,
+            run_options={
+                "cpus": [cpus[0]],
+                "nice": 10,
+                "ionice": "best-effort:7",
+                "oom_score_adj": -100,
+                "max_memory": 2 << 30,
+                "max_cpu_time": 30,
+            },
+        )
+
+
+def test_run_spread_invocation(runner):
+    with patch.object(runner.hapless, "run_many") as run_many_mock:
+        result = runner.invoke(
+            cli.cli, ["run", "--matrix", "n=1,2", "--spread", "--", "echo", "{n}"]
+        )
+        assert result.exit_code == 0
+        run_many_mock.assert_called_once_with(
+            ANY,
+            stagger=0.0,
+            max_in_flight=None,
+            log_options=None,
+            run_options=None,
+            spread=True,
+        )
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--spread", "--", "echo"],
+        ["--cpus", f"{os.cpu_count() or 1}0", "--", "echo"],
+        ["--ionice", "fast", "--", "echo"],
+        ["--nice", "20", "--", "echo"],
+    ],
+)
+def test_run_scheduling_invalid_usage(runner, args):
+    result = runner.invoke(cli.cli, ["run", *args])
+    assert result.exit_code == 2
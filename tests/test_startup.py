@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("rich", "structlog", "environ", "humanize", "sqlite3")
+
+
+def imported_modules(*args: str) -> set:
+    code = (
+        "import atexit, sys; "
+        "atexit.register(lambda: print(' '.join(sys.modules), file=sys.stderr)); "
+        "from hapless.cli import cli; cli(sys.argv[1:])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, *args],
+        capture_output=True,
+        text=True,
+    )
+    return set(result.stderr.split())
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--version"],
+        ["is-running", "hap-missing"],
+        ["count", "--status", "running"],
+    ],
+)
+def test_cheap_commands_skip_heavy_imports(args):
+    modules = imported_modules(*args)
+    assert "hapless.cli" in modules
+    assert not modules.intersection(HEAVY_MODULES)
+
+
+def test_package_import_is_lazy():
+    modules = imported_modules("--help")
+    assert "hapless.main" not in modules
+    assert "hapless.formatters" not in modules
+
+
+def test_cli_import_skips_hap_machinery():
+    modules = imported_modules("--version")
+    assert not modules.intersection(
+        (
+            "psutil",
+            "hapless.hap",
+            "hapless.logfiles",
+            "hapless.scheduling",
+            "hapless.admission",
+            "hapless.bulk",
+        )
+    )
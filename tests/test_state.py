@@ -0,0 +1,190 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from hapless import config
+from hapless.hap import Status
+from hapless.main import Hapless
+from hapless.state import StateIndex
+from hapless.utils import wait_created
+
+
+@pytest.fixture
+def hapless_sqlite(tmp_path: Path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    hapless = Hapless(hapless_dir=tmp_path, quiet=True, backend=config.BACKEND_SQLITE)
+    yield hapless
+    hapless._index.close()
+
+
+def test_unknown_backend(tmp_path: Path):
+    with pytest.raises(ValueError) as e:
+        Hapless(hapless_dir=tmp_path, backend="redis")
+
+    assert str(e.value) == "Unknown state backend: redis"
+
+
+def test_index_uses_wal_mode(tmp_path: Path):
+    index = StateIndex(tmp_path)
+    (journal_mode,) = index.conn.execute("PRAGMA journal_mode").fetchone()
+    assert journal_mode == "wal"
+    assert index.path == tmp_path / "state.db"
+    index.close()
+
+
+def test_create_hap_is_indexed(hapless_sqlite: Hapless):
+    hap = hapless_sqlite.create_hap("echo indexed", name="hap-indexed")
+    record = hapless_sqlite._index.get(hap.hid)
+    assert record is not None
+    assert record["hid"] == hap.hid
+    assert record["name"] == "hap-indexed"
+    assert record["cmd"] == "echo indexed"
+    assert record["status"] == Status.UNBOUND.value
+    assert record["pid"] is None
+
+
+def test_listing_is_served_from_index(hapless_sqlite: Hapless):
+    hapless_sqlite.create_hap("true", name="hap1")
+    hapless_sqlite.create_hap("true", name="hap2")
+
+    haps = hapless_sqlite.get_haps()
+    assert [hap.name for hap in haps] == ["hap1", "hap2"]
+    assert all(hap._record is not None for hap in haps)
+    assert [hap.cmd for hap in haps] == ["true", "true"]
+
+
+def test_snapshot_is_served_from_index(hapless_sqlite: Hapless):
+    hap = hapless_sqlite.create_hap("false", name="hap-snapshot")
+    hapless_sqlite.run_hap(hap, blocking=True)
+
+    (indexed,) = hapless_sqlite.get_haps()
+    with patch("os.scandir", wraps=os.scandir) as scandir_mock:
+        snapshot = indexed.snapshot()
+        scandir_mock.assert_not_called()
+
+    assert snapshot.serialize() == hap.snapshot().serialize()
+    assert snapshot.status == Status.FAILED
+
+
+def test_run_updates_index(hapless_sqlite: Hapless):
+    hap = hapless_sqlite.create_hap("false", name="hap-failing")
+    hapless_sqlite.run_hap(hap, blocking=True)
+
+    record = hapless_sqlite._index.get(hap.hid)
+    assert record["pid"] is not None
+    assert record["rc"] == 1
+    assert record["status"] == Status.FAILED.value
+    assert record["start_time"] is not None
+    assert record["end_time"] is not None
+
+    (listed,) = hapless_sqlite.get_haps()
+    assert listed.status == Status.FAILED
+    assert listed.rc == 1
+
+
+def test_rename_and_lookup_by_name(hapless_sqlite: Hapless):
+    hap = hapless_sqlite.create_hap("true", name="hap-name@2")
+    assert hapless_sqlite.get_hap("hap-name").hid == hap.hid
+
+    hapless_sqlite.rename_hap(hap, "hap-new-name")
+    assert hapless_sqlite.get_hap("hap-name") is None
+    renamed = hapless_sqlite.get_hap("hap-new-name")
+    assert renamed is not None
+    assert renamed.raw_name == "hap-new-name@2"
+
+
+def test_clean_removes_index_records(hapless_sqlite: Hapless):
+    hap = hapless_sqlite.create_hap("true", name="hap-clean")
+    hapless_sqlite.run_hap(hap, blocking=True)
+
+    hapless_sqlite.clean()
+    assert hapless_sqlite._index.get(hap.hid) is None
+    assert hapless_sqlite.get_haps() == []
+
+
+def test_migration_imports_existing_state(tmp_path: Path):
+    hapless_fs = Hapless(hapless_dir=tmp_path, quiet=True)
+    hapless_fs.create_hap("true", name="hap-old1")
+    hapless_fs.create_hap("true", name="hap-old2")
+
+    hapless_sqlite = Hapless(
+        hapless_dir=tmp_path, quiet=True, backend=config.BACKEND_SQLITE
+    )
+    records = hapless_sqlite._index.all()
+    assert [record["name"] for record in records] == ["hap-old1", "hap-old2"]
+    hapless_sqlite._index.close()
+
+
+def test_index_is_reconciled_with_directories(hapless_sqlite: Hapless):
+    hap1 = hapless_sqlite.create_hap("true", name="hap-removed")
+    # Created bypassing the index
+    Hapless(hapless_dir=hapless_sqlite.dir, quiet=True).create_hap(
+        "true", name="hap-unindexed"
+    )
+    shutil.rmtree(hap1.path)
+
+    haps = hapless_sqlite.get_haps()
+    assert [hap.name for hap in haps] == ["hap-unindexed"]
+    assert hapless_sqlite._index.get(hap1.hid) is None
+    assert hapless_sqlite.get_hap("hap-removed") is None
+    assert hapless_sqlite.get_hap("hap-unindexed") is not None
+
+
+def test_missing_record_is_indexed_again(hapless_sqlite: Hapless):
+    hap = hapless_sqlite.create_hap("true", name="hap-lost")
+    hapless_sqlite._index.delete([hap.hid])
+
+    hap.set_return_code(0)
+    record = hapless_sqlite._index.get(hap.hid)
+    assert record["name"] == "hap-lost"
+    assert record["rc"] == 0
+
+
+def test_return_code_is_indexed_after_cli_run(tmp_path: Path):
+    env = {
+        **os.environ,
+        "HAPLESS_DIR": f"{tmp_path}",
+        "HAPLESS_STATE_BACKEND": config.BACKEND_SQLITE,
+    }
+    subprocess.run(
+        [sys.executable, "-m", "hapless.cli", "run", "-n", "s1", "--", "sleep", "0.5"],
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    # Wrapper updates the index right after writing the return code
+    assert wait_created(tmp_path / "1" / "rc", timeout=5)
+    index = StateIndex(tmp_path)
+    deadline = time.monotonic() + 5
+    while index.get("1")["rc"] is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    record = index.get("1")
+    index.close()
+    assert record["status"] == Status.SUCCESS.value
+    assert record["rc"] == 0
+
+
+def test_index_is_usable_on_both_sides_of_fork(tmp_path: Path):
+    index = StateIndex(tmp_path)
+    index.upsert({"hid": "1", "name": "hap-1", "raw_name": "", "status": "unbound"})
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            index.update("1", rc=0)
+            code = 0
+        finally:
+            os._exit(code)
+    # Connection is closed before forking and reopened on the next use
+    assert index._conn is None
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert index.get("1")["rc"] == 0
+    index.close()
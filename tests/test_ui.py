@@ -119,6 +119,45 @@ def test_workdir_is_displayed_in_verbose_mode(
     assert f"{tmp_path}" in captured.out
 
 
+def test_run_options_are_displayed_in_verbose_mode(hapless_with_ui: Hapless, capsys):
+    run_options = {"cpus": [0, 1, 2, 5], "ionice": "idle", "max_memory": 1 << 30}
+    hap = hapless_with_ui.create_hap("true", run_options=run_options)
+    hapless_with_ui.show(hap, formatter=TableFormatter(verbose=True))
+
+    captured = capsys.readouterr()
+    assert "0-2,5" in captured.out
+    assert "IO priority:" in captured.out
+    assert "1.0 GiB" in captured.out
+
+
+def test_exit_record_is_displayed_in_verbose_mode(hapless_with_ui: Hapless, capsys):
+    hapless = hapless_with_ui
+    hap = hapless.create_hap("kill -TERM $$")
+    hap.set_return_code(
+        -15,
+        {
+            "max_rss": 3 << 20,
+            "user_time": 1.5,
+            "system_time": 0.25,
+            "voluntary_switches": 7,
+            "involuntary_switches": 2,
+            "signal": 15,
+            "started": 100.0,
+            "finished": 190.0,
+        },
+    )
+    hapless.show(hap, formatter=TableFormatter())
+    assert "Peak memory:" not in capsys.readouterr().out
+
+    hapless.show(hap, formatter=TableFormatter(verbose=True))
+    captured = capsys.readouterr()
+    assert "3.0 MiB" in captured.out
+    assert "1.50s user, 0.25s system" in captured.out
+    assert "7 voluntary, 2 involuntary" in captured.out
+    assert "SIGTERM" in captured.out
+    assert "2 minutes" in captured.out
+
+
 def test_launching_message(hapless_with_ui: Hapless, capsys):
     hapless = hapless_with_ui
     hap = hapless.create_hap("true")
@@ -217,3 +256,64 @@ def test_check_fast_failure_quick_but_success(hapless_with_ui: Hapless, capsys):
     assert f"Hap finished successfully in less than {timeout} seconds" in captured.out
     assert "Hap exited too quickly" not in captured.out
     assert "Hap is healthy" not in captured.out
+
+
+def test_watch_stats_refreshes_until_interrupted(hapless_with_ui: Hapless, capsys):
+    hap = hapless_with_ui.create_hap("true", name="watched")
+    with patch("hapless.ui.time.sleep", side_effect=[None, KeyboardInterrupt]) as sleep:
+        hapless_with_ui.watch_stats(TableFormatter(verbose=True), interval=2.5)
+
+    sleep.assert_called_with(2.5)
+    captured = capsys.readouterr()
+    assert hap.name in captured.out
+    assert "0 active / 1 total" in captured.out
+
+
+def test_watch_stats_without_haps(hapless_with_ui: Hapless, capsys):
+    with patch("hapless.ui.time.sleep", side_effect=KeyboardInterrupt):
+        hapless_with_ui.watch_stats(TableFormatter())
+
+    assert "No haps are currently running" in capsys.readouterr().out
+
+
+def test_resources_columns(hapless_with_ui: Hapless, capsys):
+    hap = hapless_with_ui.create_hap("true", name="measured")
+    hapless_with_ui.show(hap, TableFormatter(resources=True))
+    assert "Children:" not in capsys.readouterr().out
+
+    hapless_with_ui.stats([hap], TableFormatter(resources=True))
+    captured = capsys.readouterr()
+    assert "CPU %" in captured.out
+    assert "USS" in captured.out
+
+
+def test_queued_status(hapless_with_ui: Hapless, capsys):
+    hapless = hapless_with_ui
+    hapless.get_queue("q").set_concurrency(1)
+    with patch.object(hapless, "_launch"):
+        haps = hapless.run_many([{"cmd": "true"}] * 3, run_options={"queue": "q"})
+    capsys.readouterr()
+
+    hapless.stats(haps, TableFormatter())
+    captured = capsys.readouterr().out
+    assert "queued 1/2" in captured
+    assert "queued 2/2" in captured
+    assert "q: 2 queued" in captured
+
+    hapless.show(haps[2], TableFormatter())
+    assert "q (2 of 2)" in capsys.readouterr().out
+
+
+def test_waiting_status(hapless_with_ui: Hapless, capsys):
+    hapless = hapless_with_ui
+    hap = hapless.create_hap("true", run_options={"when_load_below": 4})
+    hap.set_held_reason("load 6.00 is not below 4")
+
+    hapless.stats([hap], TableFormatter())
+    assert "waiting" in capsys.readouterr().out
+
+    hapless.show(hap, TableFormatter(verbose=True))
+    captured = capsys.readouterr().out
+    assert "Held back:" in captured
+    assert "load 6.00 is not below 4" in captured
+    assert "Start when load:" in captured
@@ -0,0 +1,39 @@
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 20
+COMMANDS = [
+    ["--version"],
+    ["is-running", "hap-missing"],
+    ["count", "--status", "running"],
+    ["status"],
+]
+CODE = "import sys; from hapless.cli import cli; cli(sys.argv[1:])"
+
+
+def measure(argv, runs: int = RUNS):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), statistics.median(timings)
+
+
+def main():
+    """
+    Measure cold startup of the cli for a few commands.
+    Run with `python -X importtime -c "import hapless.cli"` to see the details.
+    """
+    best, median = measure([sys.executable, "-c", "pass"])
+    print(f"{'python interpreter':<32} min {best:6.1f} ms  median {median:6.1f} ms")
+    for args in COMMANDS:
+        best, median = measure([sys.executable, "-c", CODE, *args])
+        title = f"hap {' '.join(args)}"
+        print(f"{title:<32} min {best:6.1f} ms  median {median:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()